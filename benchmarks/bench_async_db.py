@@ -0,0 +1,89 @@
+"""
+Event loop stalls under a mixed read/write load: CloudDatabase called directly on the
+loop, as the CloudServer handlers used to, against the AsyncCloudDatabase facade.
+A heartbeat task measures how late the loop wakes it up.
+
+    python benchmarks/bench_async_db.py --operations 20000 --durability strict --value-size 65536
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import percentile
+from pycloudkit import AsyncCloudDatabase, CloudDatabase
+
+KEYS = 5000
+INTERVAL = 0.001
+
+
+async def heartbeat(lags: list, done: asyncio.Event) -> None:
+    while not done.is_set():
+        expected = time.perf_counter() + INTERVAL
+        await asyncio.sleep(INTERVAL)
+        lags.append(max(time.perf_counter() - expected, 0.0))
+
+
+async def run(database, facade, operations: int, concurrency: int, write_ratio: float, value: bytes) -> dict:
+    lags: list = []
+    done = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, done))
+    counter = iter(range(operations))
+
+    async def worker() -> None:
+        for i in counter:
+            key = f"key{random.randrange(KEYS)}"
+            write = random.random() < write_ratio
+            if facade is None:
+                database.set(key, {"value": i, "data": value}) if write else database.get(key)
+                await asyncio.sleep(0)
+            elif write:
+                await facade.set(key, {"value": i, "data": value})
+            else:
+                await facade.get(key)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await beat
+    return {
+        "ops_per_s": round(operations / elapsed, 1),
+        "loop_lag_p50_ms": round(percentile(lags, 50) * 1000, 3),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 3),
+        "loop_lag_max_ms": round(max(lags, default=0.0) * 1000, 3),
+    }
+
+
+def bench(mode: str, operations: int, concurrency: int, write_ratio: float, durability: str, value_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        database = CloudDatabase(os.path.join(directory, "cloud.db"), durability=durability, journal_mode="WAL", cache_size=1024 * 1024)
+        value = os.urandom(value_size)
+        database.set_many({f"key{i}": {"value": i, "data": value} for i in range(KEYS)})
+        database.cache.clear()
+        facade = AsyncCloudDatabase(database) if mode == "facade" else None
+        try:
+            result = asyncio.run(run(database, facade, operations, concurrency, write_ratio, value))
+        finally:
+            if facade is not None:
+                facade.close()
+            database.close()
+    return {"mode": mode, "durability": durability, "write_ratio": write_ratio, "value_size": value_size, **result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--durability", default="strict")
+    parser.add_argument("--value-size", type=int, default=100, help="Bytes of payload per value")
+    args = parser.parse_args()
+    print(json.dumps([bench(mode, args.operations, args.concurrency, args.write_ratio, args.durability, args.value_size) for mode in ("direct", "facade")], indent=2))
+
+
+if __name__ == "__main__":
+    main()
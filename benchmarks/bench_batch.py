@@ -0,0 +1,81 @@
+"""
+Compare per-key set/get/delete with the batched mset/mget/mdelete calls.
+
+    python benchmarks/bench_batch.py --keys 10000 --batch 1000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from common import free_port, run_in_thread
+from pycloudkit import CloudClient, CloudServer
+
+
+async def per_key(client: CloudClient, keys: list, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(call):
+        async with semaphore:
+            await call
+
+    timings = {}
+    for name, make in (("set", lambda key: client.set(key, {"value": key})),
+                       ("get", lambda key: client.get(key)),
+                       ("delete", lambda key: client.delete(key))):
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(make(key)) for key in keys))
+        timings[name] = round(time.perf_counter() - started, 4)
+    return timings
+
+
+async def batched(client: CloudClient, keys: list, batch: int) -> dict:
+    chunks = [keys[i:i + batch] for i in range(0, len(keys), batch)]
+    timings = {}
+    started = time.perf_counter()
+    for chunk in chunks:
+        await client.mset({key: {"value": key} for key in chunk})
+    timings["set"] = round(time.perf_counter() - started, 4)
+    started = time.perf_counter()
+    for chunk in chunks:
+        values = await client.mget(chunk)
+        assert len(values) == len(chunk)
+    timings["get"] = round(time.perf_counter() - started, 4)
+    started = time.perf_counter()
+    for chunk in chunks:
+        await client.mdelete(chunk)
+    timings["delete"] = round(time.perf_counter() - started, 4)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16, help="In-flight per-key requests")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    server = CloudServer("127.0.0.1", free_port(), os.path.join(directory, "bench.db"))
+    run_in_thread(server)
+    client = CloudClient(server.host, server.port, pool_size=args.concurrency)
+    keys = [f"key-{i}" for i in range(args.keys)]
+
+    async def run() -> dict:
+        with contextlib.redirect_stdout(io.StringIO()):
+            single = await per_key(client, keys, args.concurrency)
+        multi = await batched(client, keys, args.batch)
+        return {"keys": args.keys, "batch": args.batch, "per_key_s": single, "batched_s": multi,
+                "speedup": {name: round(single[name] / multi[name], 1) for name in single}}
+
+    result = asyncio.run(run())
+    server.stop()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Encode/decode microbenchmarks: the binary codec against the legacy
+to_string()/eval() text path and the safe text codec.
+
+    python benchmarks/bench_codec.py --number 2000
+"""
+import argparse
+import json
+import timeit
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit import AnyCloudObject
+from pycloudkit.cloud.src.codec import binary_codec, text_codec
+
+SAMPLES = {
+    "int": 123456789,
+    "short_str": "hello world",
+    "long_str": "x" * 100_000,
+    "bytes": bytes(range(256)) * 256,
+    "list_of_ints": list(range(1000)),
+    "nested": {"user": {"id": 42, "name": "alice", "tags": ["a", "b", "c"], "scores": [1.5, 2.5, 3.5]},
+               "items": [{"id": i, "value": f"item-{i}", "ok": i % 2 == 0} for i in range(200)]},
+}
+
+
+def bench(number: int) -> dict:
+    results = {}
+    for name, value in SAMPLES.items():
+        legacy_text = AnyCloudObject(value).to_string()
+        binary = binary_codec.encode(value)
+        assert binary_codec.decode(binary) == value
+        row = {
+            "legacy_bytes": len(legacy_text.encode("utf-8")),
+            "binary_bytes": len(binary),
+            "legacy_encode_us": timeit.timeit(lambda: AnyCloudObject(value).to_string(), number=number) / number * 1e6,
+            "binary_encode_us": timeit.timeit(lambda: binary_codec.encode(value), number=number) / number * 1e6,
+            "legacy_eval_decode_us": timeit.timeit(lambda: eval(legacy_text), number=number) / number * 1e6,
+            "text_codec_decode_us": timeit.timeit(lambda: text_codec.decode(legacy_text), number=number) / number * 1e6,
+            "binary_decode_us": timeit.timeit(lambda: binary_codec.decode(binary), number=number) / number * 1e6,
+        }
+        results[name] = {key: round(item, 2) for key, item in row.items()}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
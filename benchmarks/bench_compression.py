@@ -0,0 +1,53 @@
+"""
+Response compression: bytes on the wire and time per response for a JSON body,
+compressed for every request, served from the cache of compressed forms (ETag),
+and sent uncompressed.
+
+    python benchmarks/bench_compression.py --size-kb 256 --number 200
+"""
+import argparse
+import json
+import time
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit import Compressor, ResponseType
+
+ACCEPT = {"Accept-Encoding": "gzip, deflate"}
+
+
+def body(size: int) -> bytes:
+    rows = [{"key": f"key-{i}", "value": i, "tags": ["a", "b"]} for i in range(size // 40)]
+    return json.dumps(rows).encode()[:size]
+
+
+def timed(compressor: Compressor, response: ResponseType, headers: dict, number: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(number):
+        sent = compressor.compress(response, headers, "/bench")
+    return (time.perf_counter() - start) / number * 1e6, len(sent.body)
+
+
+def bench(size: int, number: int, level: int) -> dict:
+    data = body(size)
+    compressor = Compressor(level=level)
+    plain = ResponseType(200, {"Content-Type": "application/json"}, data)
+    tagged = ResponseType(200, {"Content-Type": "application/json", "ETag": '"v1"'}, data)
+    row = {"body_bytes": len(data), "level": level}
+    for name, response, headers in (("identity", plain, {}), ("compressed", plain, ACCEPT), ("cached", tagged, ACCEPT)):
+        micros, sent = timed(compressor, response, headers, number)
+        row[f"{name}_us"] = round(micros, 1)
+        row[f"{name}_bytes"] = sent
+    return row
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-kb", type=int, default=64)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    args = parser.parse_args()
+    print(json.dumps([bench(args.size_kb * 1024, args.number, level) for level in args.levels], indent=2))
+
+
+if __name__ == "__main__":
+    main()
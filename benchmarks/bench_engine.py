@@ -0,0 +1,51 @@
+"""
+Compare requests/sec and latency of the asyncio engine against the
+http.server engine.
+
+    python benchmarks/bench_engine.py --requests 5000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+
+from common import drive, free_port, raw_request, run_in_thread, summarize
+from pycloudkit import AsyncServer, RequestType, ResponseType
+
+
+def make_server(engine: str, delay: float) -> AsyncServer:
+    server = AsyncServer("127.0.0.1", free_port(), engine=engine)
+
+    @server.route("/ping")
+    async def ping(request: RequestType) -> ResponseType:
+        if delay:
+            await asyncio.sleep(delay)
+        return ResponseType(200, {"Content-Type": "text/plain"}, b"pong")
+
+    return server
+
+
+def bench(engine: str, requests: int, concurrency: int, delay: float) -> dict:
+    server = make_server(engine, delay)
+    run_in_thread(server)
+
+    async def call(_: int) -> None:
+        status, _body = await raw_request(server.host, server.port, "GET", "/ping?key=value")
+        assert status == 200
+
+    latencies, elapsed = asyncio.run(drive(concurrency, requests, call))
+    server.stop()
+    return {"engine": engine, "handler_delay_s": delay, **summarize(latencies, elapsed)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--delay", type=float, default=0.0, help="Simulated handler latency in seconds")
+    args = parser.parse_args()
+    results = [bench(engine, args.requests, args.concurrency, args.delay) for engine in ("http.server", "asyncio")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Handler call overhead: signature inspection on every call, as RequestHandler.handle
+used to do, against the call compiled at registration, with and without middleware.
+
+    python benchmarks/bench_handler.py --number 100000
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import time
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit import RequestHandler, RequestType, ResponseType
+
+RESPONSE = ResponseType(200, {}, b"OK")
+
+
+async def handler(request):
+    return RESPONSE
+
+
+async def before(request):
+    return None
+
+
+async def after(request, response):
+    return None
+
+
+async def inspected(func, request):
+    if not inspect.iscoroutinefunction(func):
+        raise ValueError("func must be a coroutine function")
+    if len(inspect.signature(func).parameters) != 1 and len(inspect.signature(func).parameters) != 0:
+        raise ValueError("func must have 1 or 0 parameters")
+    if len(inspect.signature(func).parameters) == 1:
+        return await func(request)
+    return await func()
+
+
+async def timed(call, number: int) -> float:
+    request = RequestType(200, {}, b"", "/", {})
+    start = time.perf_counter()
+    for _ in range(number):
+        await call(request)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def bench(number: int) -> dict:
+    compiled = RequestHandler(handler, path="/")
+    wrapped = compiled.with_middleware([before], [after])
+    row = {
+        "inspect_per_call_us": await timed(lambda request: inspected(handler, request), number),
+        "compiled_us": await timed(compiled.handle, number),
+        "compiled_with_middleware_us": await timed(wrapped.handle, number),
+    }
+    return {key: round(item, 3) for key, item in row.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench(args.number)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
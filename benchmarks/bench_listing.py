@@ -0,0 +1,67 @@
+"""
+Explorer directory listing: the previous listdir + repeated bytes concatenation renderer
+against the scandir listing engine, cold (scan and render) and warm (cached rows).
+
+    python benchmarks/bench_listing.py --entries 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit.src.utils import encode_path
+from pycloudkit.templates.explorer import listing
+from pycloudkit.templates.explorer.listing import ICON, listing_cache, render_listing
+
+
+def legacy_render(absolute_path: str, rootpath: str) -> bytes:
+    with open(os.path.join(os.path.dirname(listing.__file__), "explorer.html"), "rb") as file:
+        content = file.read()
+    for name in os.listdir(absolute_path):
+        relative = os.path.relpath(os.path.join(absolute_path, name), rootpath)
+        content += f'<button onclick="redirect(\'{encode_path(relative)}\')">{ICON}{relative}</button><br/>'.encode()
+    return content
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(counts: list, legacy_max: int) -> list:
+    results = []
+    for count in counts:
+        with tempfile.TemporaryDirectory() as root:
+            directory = os.path.join(root, "dir")
+            os.mkdir(directory)
+            for index in range(count):
+                open(os.path.join(directory, f"file-{index:06d}.txt"), "w").close()
+            row = {"entries": count}
+            if count <= legacy_max:
+                row["legacy_ms"] = timed(lambda: legacy_render(directory, root), 1)
+
+            def cold() -> None:
+                listing_cache.clear()
+                render_listing(directory, root)
+
+            row["cold_ms"] = timed(cold, 3)
+            row["warm_first_page_ms"] = timed(lambda: render_listing(directory, root), 20)
+            row["warm_last_page_ms"] = timed(lambda: render_listing(directory, root, page=count // 1000 + 1), 20)
+            results.append({key: round(value, 3) for key, value in row.items()})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=20000, help="Skip the quadratic legacy renderer above this size")
+    args = parser.parse_args()
+    print(json.dumps(bench(args.entries, args.legacy_max), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Instrumentation overhead: dispatching a request through a router with and without
+request metrics, and rendering the /metrics page.
+
+    python benchmarks/bench_metrics.py --number 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+from http import HTTPMethod
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit import MetricsRegistry, RequestHandler, RequestMetrics, ResponseType, Router, dispatch
+
+RESPONSE = ResponseType(200, {}, b"OK")
+
+
+async def handler(request):
+    return RESPONSE
+
+
+def router(metrics) -> Router:
+    handlers = [RequestHandler(handler, HTTPMethod.GET, path) for path in ("/", "/objects/{key}")]
+    return Router(handlers, metrics=metrics)
+
+
+async def timed(routes: Router, path: str, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await dispatch(routes, HTTPMethod.GET, path, {}, b"")
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def bench(number: int) -> dict:
+    registry = MetricsRegistry()
+    plain, instrumented = router(None), router(RequestMetrics(registry))
+    row = {}
+    for name, path in (("static", "/"), ("pattern", "/objects/abc"), ("unmatched", "/missing")):
+        row[f"{name}_us"] = await timed(plain, path, number)
+        row[f"{name}_with_metrics_us"] = await timed(instrumented, path, number)
+    start = time.perf_counter()
+    for _ in range(100):
+        registry.render()
+    row["render_us"] = (time.perf_counter() - start) / 100 * 1e6
+    return {key: round(item, 3) for key, item in row.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(bench(args.number)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
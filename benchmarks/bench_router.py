@@ -0,0 +1,71 @@
+"""
+Route lookup: a linear scan of the handlers against the compiled Router,
+for a growing number of static and parameterised routes.
+
+    python benchmarks/bench_router.py --number 20000
+"""
+import argparse
+import json
+import timeit
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from typing import List, Optional
+
+from pycloudkit import Router, RequestHandler
+
+
+async def handler(request):
+    return "OK"
+
+
+def find_handler(handlers: List[RequestHandler], path: str, method: str) -> Optional[RequestHandler]:
+    """
+    The linear scan the servers looked handlers up with before the Router, the baseline.
+    """
+    any_handler = None
+    for item in handlers:
+        if item.path == path and item.method == method:
+            return item
+        elif item.path == 'any' and item.method == method:
+            any_handler = item
+    return any_handler
+
+
+def build(count: int) -> list:
+    handlers = []
+    for index in range(count):
+        handlers.append(RequestHandler(handler, "GET", f"/static/{index}"))
+        handlers.append(RequestHandler(handler, "POST", f"/static/{index}"))
+        handlers.append(RequestHandler(handler, "GET", f"/pattern{index}/{{key}}/meta"))
+    return handlers
+
+
+def bench(number: int) -> dict:
+    results = {}
+    for count in (10, 100, 1000):
+        handlers = build(count)
+        router = Router(handlers)
+        last_static = f"/static/{count - 1}"
+        last_pattern = f"/pattern{count - 1}/abc/meta"
+        assert router.resolve("POST", last_static)[0] is find_handler(handlers, last_static, "POST")
+        assert router.resolve("GET", last_pattern)[1] == {"key": "abc"}
+        row = {
+            "linear_static_us": timeit.timeit(lambda: find_handler(handlers, last_static, "POST"), number=number) / number * 1e6,
+            "linear_miss_us": timeit.timeit(lambda: find_handler(handlers, "/missing", "GET"), number=number) / number * 1e6,
+            "router_static_us": timeit.timeit(lambda: router.resolve("POST", last_static), number=number) / number * 1e6,
+            "router_pattern_us": timeit.timeit(lambda: router.resolve("GET", last_pattern), number=number) / number * 1e6,
+            "router_miss_us": timeit.timeit(lambda: router.resolve("GET", "/missing"), number=number) / number * 1e6,
+        }
+        results[f"{len(handlers)} routes"] = {key: round(item, 3) for key, item in row.items()}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
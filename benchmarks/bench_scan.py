@@ -0,0 +1,63 @@
+"""
+Walking every key of a large database: one SELECT of the whole table, as listing keys
+used to require, against scan() pages. Reports the time and the peak Python memory of each.
+
+    python benchmarks/bench_scan.py --keys 1000000 --page-size 1000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit import CloudDatabase
+
+
+def measure(walk) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = walk()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"keys": count, "seconds": round(elapsed, 3), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def bench(keys: int, page_size: int, value_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        database = CloudDatabase(os.path.join(directory, "scan.db"), durability="group")
+        for i in range(0, keys, 10000):
+            database.set_many({f"key-{j:09d}": "x" * value_size for j in range(i, min(i + 10000, keys))})
+        database.flush()
+        database.cache.clear()
+
+        def dump() -> int:
+            rows = database.database.execute("SELECT key, value FROM objects").fetchall()
+            return len({key: database.decode(value) for key, value in rows})
+
+        def scan() -> int:
+            count, cursor = 0, None
+            while True:
+                page, cursor = database.scan(limit=page_size, cursor=cursor)
+                count += len(page)
+                if cursor is None:
+                    return count
+
+        result = {"dump": measure(dump), "scan": measure(scan)}
+        database.close()
+    return {"keys": keys, "page_size": page_size, "value_size": value_size, **result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--value-size", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(bench(args.keys, args.page_size, args.value_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Startup and bulk transfer of a large database: opening it, warming the cache with load(),
+exporting a snapshot, importing it into an empty database, opening the snapshot and looking
+keys up in it, and an online backup. Reports seconds per step as JSON.
+
+    python benchmarks/bench_snapshot.py --keys 1000000 --value-size 100
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit import CloudDatabase, SnapshotReader
+
+
+def timed(func) -> tuple:
+    started = time.perf_counter()
+    result = func()
+    return round(time.perf_counter() - started, 3), result
+
+
+def bench(keys: int, value_size: int, lookups: int, changelog_size: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "source.db")
+        database = CloudDatabase(path, durability="group")
+        for i in range(0, keys, 10000):
+            database.set_many({f"key-{j:09d}": {"id": j, "data": "x" * value_size} for j in range(i, min(i + 10000, keys))})
+        database.close()
+
+        results["open_seconds"], database = timed(lambda: CloudDatabase(path, durability="group"))
+        results["load_seconds"], _ = timed(database.load)
+        results["load_first_reads_seconds"], _ = timed(lambda: [database.get(f"key-{j:09d}") for j in range(0, keys, max(keys // lookups, 1))])
+        snapshot = os.path.join(directory, "source.snap")
+        results["export_seconds"], _ = timed(lambda: database.export_snapshot(snapshot))
+        results["snapshot_mb"] = round(os.path.getsize(snapshot) / 2 ** 20, 1)
+        results["backup_seconds"], _ = timed(lambda: database.backup(os.path.join(directory, "backup.db")))
+        database.close()
+
+        target = CloudDatabase(os.path.join(directory, "target.db"), durability="group", changelog_size=changelog_size)
+        results["import_seconds"], _ = timed(lambda: target.import_snapshot(snapshot))
+        target.close()
+
+        results["snapshot_open_seconds"], reader = timed(lambda: SnapshotReader(snapshot))
+        sample = [f"key-{random.randrange(keys):09d}" for _ in range(lookups)]
+        seconds, _ = timed(lambda: [reader.get(key) for key in sample])
+        results["snapshot_lookup_us"] = round(seconds / lookups * 1e6, 2)
+        reader.close()
+    return {"keys": keys, "value_size": value_size, "changelog_size": changelog_size, **results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=200000)
+    parser.add_argument("--value-size", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--changelog-size", type=int, default=0, help="Change log of the import target, 0 disables it")
+    args = parser.parse_args()
+    print(json.dumps(bench(args.keys, args.value_size, args.lookups, args.changelog_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
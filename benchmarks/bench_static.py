@@ -0,0 +1,112 @@
+"""
+Serving a large file to concurrent clients: reading it into a bytes body, as the explorer
+used to, against streaming it with serve_file. Reports throughput and the peak RSS of
+the server process, which is started in a subprocess so the client does not count.
+
+    python benchmarks/bench_static.py --size-mb 256 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import free_port, wait_for_port
+from pycloudkit import AsyncServer, RequestType, ResponseType, serve_file
+
+
+def serve(mode: str, port: int, path: str, engine: str) -> None:
+    server = AsyncServer("127.0.0.1", port, engine=engine)
+
+    @server.route("/file")
+    async def file(request: RequestType) -> ResponseType:
+        if mode == "buffered":
+            with open(path, "rb") as source:
+                return ResponseType(200, {"Content-Type": "application/octet-stream"}, source.read())
+        return serve_file(path, request.headers)
+
+    @server.route("/rss")
+    async def rss(request: RequestType) -> ResponseType:
+        return ResponseType(200, {}, str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+    server.start()
+
+
+async def download(port: int) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /file HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    received = 0
+    while True:
+        data = await reader.read(1 << 20)
+        if not data:
+            break
+        received += len(data)
+    writer.close()
+    return received
+
+
+async def fetch(port: int, path: str) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode())
+    data = await reader.read()
+    writer.close()
+    return data.split(b"\r\n\r\n", 1)[1]
+
+
+def bench(mode: str, path: str, size: int, concurrency: int, engine: str) -> dict:
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, "--serve", mode, "--port", str(port), "--path", path, "--engine", engine],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port("127.0.0.1", port)
+        idle_kb = int(asyncio.run(fetch(port, "/rss")))
+
+        async def run() -> list:
+            return await asyncio.gather(*(download(port) for _ in range(concurrency)))
+
+        start = time.perf_counter()
+        received = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        assert all(count > size for count in received)
+        peak_kb = int(asyncio.run(fetch(port, "/rss")))
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "mode": mode,
+        "engine": engine,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(size * concurrency / elapsed / 1e6, 1),
+        "idle_rss_mb": round(idle_kb / 1024, 1),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--engine", default="asyncio")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.port, args.path, args.engine)
+    size = args.size_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(suffix=".bin") as file:
+        for _ in range(args.size_mb):
+            file.write(os.urandom(1024 * 1024))
+        file.flush()
+        results = [bench(mode, file.name, size, args.concurrency, args.engine) for mode in ("buffered", "streamed")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Percent-encoding and query parsing: the table-driven codec in pycloudkit.src.utils against the
+previous chained str.replace functions, for short and long keys and values. The legacy parser
+fails on values with "=" or a second "?", those cases are reported as null. The codec's round trips
+are checked by tests/test_utils.py.
+
+    python benchmarks/bench_uri.py --number 2000
+"""
+import argparse
+import json
+import timeit
+
+import common  # noqa: F401  (puts the repository on sys.path)
+from pycloudkit.src.utils import decode_uri_component, encode_uri_component, parse_path
+
+SAMPLES = {
+    "short_key": "user:42",
+    "long_ascii": "abcdefghij" * 10_000,
+    "long_special": "{'name': 'a b', 'tags': [1, 2], 'mail': 'x@y.z', 'price': '$5+1'}; " * 1_500,
+    "long_unicode": "clé € 😀 " * 10_000,
+}
+
+
+def legacy_encode(value: str) -> str:
+    return value.replace('"', "%22").replace("'", "%27").replace(' ', "%20").replace("[", "%5B").replace("]", "%5D").replace(",", "%2C").replace("+", "%2B").replace(":", "%3A").replace(";","%3B").replace("@","%40").replace("$","%24").replace("{","%7B").replace("}","%7D")
+
+
+def legacy_decode(value: str) -> str:
+    return value.replace("%22", '"').replace("%27", "'").replace("%20", " ").replace("%5B", "[").replace("%5D", "]").replace("%2C", ",").replace("%3D", "=").replace("%2B", "+").replace("%3A", ":").replace("%3B", ";").replace("%40", "@").replace("%24", "$").replace("%7B", "{").replace("%7D", "}")
+
+
+def legacy_parse_path(path: str) -> tuple:
+    filename, params_str = legacy_decode(path).split('?')
+    params = {}
+    for param in params_str.split('&'):
+        key, value = param.split('=')
+        params[key] = value
+    return filename, params
+
+
+def per_call_us(func, value, number: int) -> float:
+    return round(timeit.timeit(lambda: func(value), number=number) / number * 1e6, 3)
+
+
+def legacy_or_none(func, value, number: int):
+    try:
+        func(value)
+    except ValueError:
+        return None
+    return per_call_us(func, value, number)
+
+
+def bench(number: int) -> dict:
+    results = {}
+    for name, value in SAMPLES.items():
+        encoded = encode_uri_component(value)
+        target = f"/set?key={encode_uri_component(name)}&value={encoded}"
+        legacy_target = f"/set?key={legacy_encode(name)}&value={legacy_encode(value)}"
+        results[name] = {
+            "length": len(value),
+            "encode_us": per_call_us(encode_uri_component, value, number),
+            "legacy_encode_us": per_call_us(legacy_encode, value, number),
+            "decode_us": per_call_us(decode_uri_component, encoded, number),
+            "legacy_decode_us": per_call_us(legacy_decode, legacy_encode(value), number),
+            "parse_path_us": per_call_us(parse_path, target, number),
+            "legacy_parse_path_us": legacy_or_none(legacy_parse_path, legacy_target, number),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=1000, help="Calls timed per function and sample")
+    args = parser.parse_args()
+    print(json.dumps(bench(args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Change delivery to watchers: the time from a set being acknowledged to every watcher
+receiving it, against polling /get in a loop on a new connection per poll.
+Reports latency percentiles and the requests the server handled per change.
+Pollers only see the values current at each poll, changes in between are missed.
+
+    python benchmarks/bench_watch.py --watchers 50 --changes 500 --poll-interval 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from common import free_port, percentile, raw_request, run_in_thread
+from pycloudkit import CloudClient, CloudServer
+
+
+def report(latencies: List[float], requests: float, changes: int) -> Dict[str, float]:
+    return {
+        "deliveries": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+        "requests_per_change": round(requests / changes, 1),
+    }
+
+
+def handled(server: CloudServer, path: str) -> float:
+    counter = server.request_metrics.requests
+    return sum(value for labels, value in counter.values.items() if labels[1] == path)
+
+
+async def watch(port: int, watchers: int, changes: int, interval: float) -> List[float]:
+    received: Dict[int, List[float]] = {}
+
+    async def watcher(client: CloudClient) -> None:
+        seen = 0
+        async for change in client.watch(key="counter"):
+            received.setdefault(change.value, []).append(time.perf_counter())
+            seen += 1
+            if seen == changes:
+                return
+
+    clients = [CloudClient("127.0.0.1", port, pool_size=1) for _ in range(watchers)]
+    tasks = [asyncio.create_task(watcher(client)) for client in clients]
+    writer = CloudClient("127.0.0.1", port, pool_size=1)
+    # Every watcher sends its first heartbeat once it is subscribed, give them time to connect
+    await asyncio.sleep(0.5 + watchers * 0.01)
+    sent: Dict[int, float] = {}
+    for value in range(changes):
+        await writer.set("counter", value)
+        sent[value] = time.perf_counter()
+        await asyncio.sleep(interval)
+    await asyncio.wait_for(asyncio.gather(*tasks), 30)
+    for client in clients + [writer]:
+        await client.close()
+    return [at - sent[value] for value, times in received.items() for at in times]
+
+
+async def poll(port: int, watchers: int, changes: int, interval: float, poll_interval: float) -> List[float]:
+    latencies: List[float] = []
+    sent: Dict[str, float] = {}
+    done = asyncio.Event()
+
+    async def poller() -> None:
+        last = None
+        while not done.is_set():
+            _, body = await raw_request("127.0.0.1", port, "GET", "/get?key=counter")
+            if body != last and body in sent:
+                latencies.append(time.perf_counter() - sent[body])
+                last = body
+            await asyncio.sleep(poll_interval)
+
+    tasks = [asyncio.create_task(poller()) for _ in range(watchers)]
+    writer = CloudClient("127.0.0.1", port, pool_size=1)
+    await asyncio.sleep(0.2)
+    for value in range(changes):
+        await writer.set("counter", value)
+        sent[str(value).encode("utf-8")] = time.perf_counter()
+        await asyncio.sleep(interval)
+    await asyncio.sleep(poll_interval * 2)
+    done.set()
+    await asyncio.gather(*tasks)
+    await writer.close()
+    return latencies
+
+
+def bench(args: argparse.Namespace) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("watch", "poll"):
+            server = CloudServer("127.0.0.1", free_port(), os.path.join(directory, f"{mode}.db"), engine=args.engine, max_requests=0, changelog_size=100000)
+            run_in_thread(server)
+            try:
+                if mode == "watch":
+                    latencies = asyncio.run(watch(server.port, args.watchers, args.changes, args.interval))
+                    requests = handled(server, "/watch")
+                else:
+                    latencies = asyncio.run(poll(server.port, args.watchers, args.changes, args.interval, args.poll_interval))
+                    requests = handled(server, "/get")
+            finally:
+                server.stop()
+            results[mode] = report(latencies, requests, args.changes)
+    return {"engine": args.engine, "watchers": args.watchers, "changes": args.changes, "interval": args.interval,
+            "poll_interval": args.poll_interval, **results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", default="asyncio", choices=["asyncio", "http.server"])
+    parser.add_argument("--watchers", type=int, default=20)
+    parser.add_argument("--changes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between two changes")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between two polls of a poller")
+    args = parser.parse_args()
+    print(json.dumps(bench(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
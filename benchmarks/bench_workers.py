@@ -0,0 +1,68 @@
+"""
+Read throughput of CloudServer with one process against several worker processes.
+Load comes from separate client processes, so the client does not compete with
+the server for the same core. Worker mode only helps on machines with several cores.
+
+    python benchmarks/bench_workers.py --workers 1 4 --clients 4 --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import free_port, run_in_thread
+from pycloudkit import CloudServer, CloudDatabase
+
+KEYS = 1000
+
+
+def client(port: int, requests: int, concurrency: int) -> int:
+    async def run() -> int:
+        async def connection(count: int) -> int:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for i in range(count):
+                writer.write(f"GET /get?key=key{i % KEYS} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+                await writer.drain()
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.split(b"Content-Length: ", 1)[1].split(b"\r\n", 1)[0])
+                await reader.readexactly(length)
+            writer.close()
+            return count
+        counts = await asyncio.gather(*(connection(requests // concurrency) for _ in range(concurrency)))
+        return sum(counts)
+    return asyncio.run(run())
+
+
+def bench(workers: int, clients: int, requests: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cloud.db")
+        database = CloudDatabase(path)
+        database.set_many({f"key{i}": {"value": i} for i in range(KEYS)})
+        database.close()
+        server = CloudServer("127.0.0.1", free_port(), path, workers=workers, max_requests=0)
+        run_in_thread(server)
+        try:
+            with multiprocessing.get_context("spawn").Pool(clients) as pool:
+                started = time.perf_counter()
+                served = sum(pool.starmap(client, [(server.port, requests // clients, concurrency)] * clients))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.stop()
+    return {"workers": workers, "clients": clients, "requests": served, "seconds": round(elapsed, 3), "rps": round(served / elapsed, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--clients", type=int, default=4, help="Client processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="Connections per client process")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps([bench(workers, args.clients, args.requests, args.concurrency) for workers in args.workers], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.02)
+    raise TimeoutError(f"Server on {host}:{port} did not start")
+
+
+def run_in_thread(server) -> threading.Thread:
+    """
+    Start an AsyncServer in a daemon thread and wait until it accepts connections.
+    """
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    wait_for_port(server.host, server.port)
+    return thread
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """
+    Throughput and latency percentiles (milliseconds) for a run.
+    """
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 4),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def raw_request(host: str, port: int, method: str, path: str, body: bytes = b"") -> Tuple[int, bytes]:
+    """
+    A minimal one-shot HTTP/1.1 request on a fresh connection.
+    Used to measure the server without client-side pooling effects.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+        data = await reader.read()
+    finally:
+        writer.close()
+    status = int(data.split(b" ", 2)[1])
+    return status, data.split(b"\r\n\r\n", 1)[1]
+
+
+async def drive(concurrency: int, total: int, call: Callable[[int], "asyncio.Future"]) -> Tuple[List[float], float]:
+    """
+    Run `total` calls of `call(i)` with `concurrency` workers.
+    Returns the per-call latencies and the wall time.
+    """
+    latencies: List[float] = []
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for i in counter:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
@@ -0,0 +1,173 @@
+"""
+Load test of the whole cloud stack: a local CloudServer driven by concurrent CloudClients
+with a mixed get/set/delete workload. Reports throughput and p50/p95/p99 latency per
+operation as JSON, for every combination of the given engines, codecs and durability modes.
+
+The workload is generated from --seed before the run, so the same arguments replay the
+same operations against the same keys. Clients run in separate processes (--processes)
+so they do not compete with the server for the interpreter.
+
+    python benchmarks/loadtest.py --engine asyncio http.server --durability strict group \\
+        --clients 16 --requests 20000 --mix get=80,set=15,delete=5 --distribution zipf
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from common import free_port, run_in_thread, summarize
+from pycloudkit import CloudClient, CloudDatabase, CloudServer, binary_codec, text_codec
+
+CODECS = {"binary": binary_codec, "text": text_codec}
+OPERATIONS = ("get", "set", "delete")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """
+    Parse "get=80,set=15,delete=5" into operation weights.
+    """
+    mix: Dict[str, float] = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name}, expected one of {', '.join(OPERATIONS)}")
+        mix[name] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("The mix needs a positive weight")
+    return mix
+
+
+def make_value(index: int, size: int) -> dict:
+    return {"id": index, "data": "x" * size}
+
+
+def key_weights(keys: int, distribution: str, zipf_s: float) -> List[float]:
+    """
+    Cumulative weights of the keys, key-0 is the most popular one under zipf.
+    """
+    if distribution == "uniform":
+        return list(range(1, keys + 1))
+    return list(itertools.accumulate(1.0 / rank ** zipf_s for rank in range(1, keys + 1)))
+
+
+def workload(seed: int, count: int, mix: Dict[str, float], keys: int, distribution: str, zipf_s: float) -> List[Tuple[str, int]]:
+    """
+    The (operation, key index) pairs one client runs, the same for the same seed.
+    """
+    rng = random.Random(seed)
+    operations = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    indexes = rng.choices(range(keys), cum_weights=key_weights(keys, distribution, zipf_s), k=count)
+    return list(zip(operations, indexes))
+
+
+def run_clients(port: int, plans: List[List[Tuple[str, int]]], value_size: int, wire: str) -> dict:
+    """
+    The body of a client process: one CloudClient per plan, all running concurrently.
+    Returns the latencies per operation, the error counts and the wall clock span of the run.
+    """
+    latencies: Dict[str, List[float]] = {name: [] for name in OPERATIONS}
+    errors: Dict[str, int] = {name: 0 for name in OPERATIONS}
+
+    async def client(plan: List[Tuple[str, int]]) -> None:
+        cloud = CloudClient("127.0.0.1", port, pool_size=1, wire=wire)
+        calls = {
+            "get": lambda index: cloud.get(f"key-{index}"),
+            "set": lambda index: cloud.set(f"key-{index}", make_value(index, value_size)),
+            "delete": lambda index: cloud.delete(f"key-{index}"),
+        }
+        try:
+            for name, index in plan:
+                started = time.perf_counter()
+                try:
+                    await calls[name](index)
+                except Exception:
+                    errors[name] += 1
+                    continue
+                latencies[name].append(time.perf_counter() - started)
+        finally:
+            await cloud.close()
+
+    async def run() -> Tuple[float, float]:
+        started = time.time()
+        await asyncio.gather(*(client(plan) for plan in plans))
+        return started, time.time()
+
+    started, finished = asyncio.run(run())
+    return {"latencies": latencies, "errors": errors, "started": started, "finished": finished}
+
+
+def bench(args: argparse.Namespace, engine: str, codec: str, durability: str) -> dict:
+    plans = [workload(args.seed * 1000003 + client, args.requests // args.clients, args.mix, args.keys, args.distribution, args.zipf_s)
+             for client in range(args.clients)]
+    # Clients are dealt round-robin to the processes
+    groups = [plans[index::args.processes] for index in range(args.processes)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "loadtest.db")
+        database = CloudDatabase(path, codec=CODECS[codec])
+        database.set_many({f"key-{index}": make_value(index, args.value_size) for index in range(args.keys)})
+        database.close()
+        server = CloudServer("127.0.0.1", free_port(), path, engine=engine, workers=args.workers, max_requests=0,
+                             durability=durability, codec=CODECS[codec])
+        run_in_thread(server)
+        try:
+            with multiprocessing.get_context("spawn").Pool(len(groups)) as pool:
+                results = pool.starmap(run_clients, [(server.port, group, args.value_size, args.wire) for group in groups if group])
+        finally:
+            server.stop()
+    elapsed = max(result["finished"] for result in results) - min(result["started"] for result in results)
+    latencies = {name: [value for result in results for value in result["latencies"][name]] for name in OPERATIONS}
+    errors = {name: sum(result["errors"][name] for result in results) for name in OPERATIONS}
+    return {
+        "config": {"engine": engine, "codec": codec, "durability": durability, "wire": args.wire, "workers": args.workers,
+                   "clients": args.clients, "processes": args.processes, "keys": args.keys, "value_size": args.value_size,
+                   "distribution": args.distribution, "zipf_s": args.zipf_s if args.distribution == "zipf" else None,
+                   "mix": args.mix, "seed": args.seed},
+        "total": summarize([value for values in latencies.values() for value in values], elapsed),
+        "operations": {name: summarize(values, elapsed) for name, values in latencies.items() if values},
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", nargs="+", default=["asyncio"], choices=["asyncio", "http.server"])
+    parser.add_argument("--codec", nargs="+", default=["binary"], choices=sorted(CODECS), help="Storage codec")
+    parser.add_argument("--durability", nargs="+", default=["strict"], choices=["strict", "group"])
+    parser.add_argument("--wire", default="binary", choices=["binary", "json"], help="Client body format")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent CloudClients")
+    parser.add_argument("--processes", type=int, default=1, help="Client processes the clients are spread over")
+    parser.add_argument("--requests", type=int, default=10000, help="Operations per run, split between the clients")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("get=80,set=15,delete=5"))
+    parser.add_argument("--keys", type=int, default=10000, help="Distinct keys, all stored before the run")
+    parser.add_argument("--value-size", type=int, default=100, help="Approximate value size in bytes")
+    parser.add_argument("--distribution", default="uniform", choices=["uniform", "zipf"])
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Exponent of the zipf distribution")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also write the results to this file")
+    args = parser.parse_args()
+    args.processes = max(1, min(args.processes, args.clients))
+
+    report = {
+        "environment": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "runs": [bench(args, engine, codec, durability)
+                 for engine, codec, durability in itertools.product(args.engine, args.codec, args.durability)],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,12 @@
 from .src.server import *
+from .src.engine import *
+from .src.workers import *
+from .src.router import *
+from .src.static import *
+from .src.compression import *
+from .src.metrics import *
+from .src.log import *
 from .src.request import *
 from .src.client import *
+from .src.pool import *
 from .cloud import *
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+# Rough per-entry cost of the key, the OrderedDict node and the value object headers
+ENTRY_OVERHEAD: int = 128
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache bounded by an approximate memory budget.
+    Entry sizes are supplied by the caller, usually the length of the encoded value.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Parameters:
+            max_bytes (int): The memory budget, 0 disables caching.
+        """
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+        self.entries: OrderedDict[Hashable, Tuple[Any, int]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        size += ENTRY_OVERHEAD
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
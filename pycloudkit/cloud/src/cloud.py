@@ -1,52 +1,880 @@
+import asyncio
+import json
+import logging
+import os
+import queue
 import sqlite3
-from typing import Any
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, AsyncIterator, Callable, ContextManager, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
 try:
     from pycloudkit.src.server import AsyncServer
+    from pycloudkit.src.engine import ENGINE_ASYNCIO
     from pycloudkit.src.client import AsyncClient
     from pycloudkit.src.request import *
+    from pycloudkit.src.metrics import MetricsRegistry, Histogram
+    from pycloudkit.src.compression import COMPRESSION_MIN_SIZE
+    from pycloudkit.src.protocol import MAX_BODY_SIZE
 except ImportError:
     raise ImportError("PyCloudKit is not installed")
 from .cloudtypes import *
+from .cache import LRUCache, MISSING, ENTRY_OVERHEAD
+from .wire import *
+from .snapshot import SnapshotReader, SnapshotWriter, SnapshotError, snapshot_codecs
+
+logger = logging.getLogger(__name__)
+
+# Stay below SQLITE_MAX_VARIABLE_NUMBER of older SQLite builds
+BATCH_VARIABLES: int = 500
+# Values the cache keeps decoded, other values are kept encoded and decoded on every read
+IMMUTABLE_TYPES = frozenset({str, bytes, int, float, complex, bool, type(None)})
+
+# Keys returned by one scan() page at most
+MAX_SCAN_LIMIT: int = 10000
+# Expired keys deleted per sweeper transaction, bounds the time the sweeper holds the lock
+SWEEP_BATCH: int = 1000
+# Rows written per transaction by import_snapshot, writers get the lock in between
+IMPORT_BATCH: int = 10000
+# Pages copied per step by backup() when the database does not use WAL, writes go on between steps
+BACKUP_PAGES: int = 1024
+
+# Change log rows read by one watch query
+WATCH_BATCH: int = 1000
+# Seconds between heartbeats of idle watch streams, they carry the position to resume from
+WATCH_HEARTBEAT: float = 15.0
+# Seconds between change log polls when other processes write the database too
+WATCH_POLL_INTERVAL: float = 0.1
+# CloudClient.watch reconnects after this many seconds without a line, a few missed heartbeats
+WATCH_IDLE_TIMEOUT: float = 45.0
+# Delays between reconnects of CloudClient.watch, doubled after every failed attempt
+WATCH_RETRY_DELAY: float = 0.1
+WATCH_MAX_RETRY_DELAY: float = 5.0
+
+CONTENT_TYPE_NDJSON = "application/x-ndjson"
+CONTENT_TYPE_EVENT_STREAM = "text/event-stream"
+
+DURABILITY_STRICT = 'strict'
+DURABILITY_GROUP = 'group'
+
+CHANGE_SET = 'set'
+CHANGE_DELETE = 'delete'
+CHANGE_EXPIRE = 'expire'
+CHANGE_CLEAR = 'clear'
+# Watch stream messages that are not changes
+EVENT_HEARTBEAT = 'heartbeat'
+EVENT_ERROR = 'error'
+
+
+def prefix_end(prefix: str) -> Optional[str]:
+    """
+    The smallest string above every string that starts with prefix, None if there is none.
+    Python orders strings by code point like SQLite orders UTF-8 keys by bytes.
+    """
+    while prefix:
+        last = ord(prefix[-1]) + 1
+        if 0xD800 <= last <= 0xDFFF:
+            # Surrogates can not be stored
+            last = 0xE000
+        if last <= 0x10FFFF:
+            return prefix[:-1] + chr(last)
+        prefix = prefix[:-1]
+    return None
+
+
+def check_ttl(ttl: Optional[float]) -> Optional[float]:
+    """
+    The expiry time of a key set now with ttl seconds to live, None for keys that do not expire.
+    Raises ValueError unless ttl is None or a positive number.
+    """
+    if ttl is None:
+        return None
+    if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or not ttl > 0:
+        raise ValueError("ttl must be a positive number of seconds")
+    return time.time() + ttl
+
+
+class Expiring:
+    """
+    A cached value of a key with a TTL.
+    """
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: Any, expires_at: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+
+
+class Change:
+    """
+    An entry of the change log: a key set, deleted or expired, or all keys cleared.
+    """
+    __slots__ = ("seq", "op", "key", "value")
+
+    def __init__(self, seq: int, op: str, key: Optional[str] = None, value: Any = None) -> None:
+        self.seq = seq
+        self.op = op
+        self.key = key
+        self.value = value
+
+    def message(self) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"seq": self.seq, "op": self.op}
+        if self.key is not None:
+            message["key"] = self.key
+        if self.op == CHANGE_SET:
+            message["value"] = self.value
+        return message
+
+    def __repr__(self) -> str:
+        return f"Change(seq={self.seq}, op={self.op!r}, key={self.key!r}, value={self.value!r})"
+
+
+class ChangeLogTrimmed(Exception):
+    """
+    Raised when changes after a sequence number were already dropped from the change log.
+    """
+    def __init__(self, since: int, oldest: int) -> None:
+        super().__init__(f"Changes after {since} are no longer in the change log, the oldest is {oldest}")
+        self.since = since
+        self.oldest = oldest
+
+
+def _wake(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeSignal:
+    """
+    Wakes coroutines waiting for new changes, on any event loop, when changes are committed.
+    """
+    def __init__(self) -> None:
+        # The last change committed by this process
+        self.seq: int = 0
+        self.closed: bool = False
+        self.lock = threading.Lock()
+        self.waiters: Dict["asyncio.Future", asyncio.AbstractEventLoop] = {}
+
+    def notify(self, seq: int) -> None:
+        with self.lock:
+            self.seq = max(self.seq, seq)
+            waiters, self.waiters = self.waiters, {}
+        for future, loop in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The request that waited is gone with its loop
+                pass
+
+    async def wait(self, seq: int, timeout: float) -> None:
+        """
+        Wait until a change after seq is committed, the signal is closed, or timeout seconds passed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            if self.seq > seq or self.closed:
+                return
+            self.waiters[future] = loop
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.lock:
+                self.waiters.pop(future, None)
+
+    def open(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        """
+        Wake every waiter and make watchers end their streams.
+        """
+        self.closed = True
+        self.notify(self.seq)
+
+
+def read_changes(connection: sqlite3.Connection, since: int, limit: int) -> List[Tuple[int, str, Optional[str], Optional[bytes]]]:
+    """
+    Up to limit change log rows after since, in order.
+    Raises ChangeLogTrimmed if rows right after since were dropped.
+    """
+    rows = connection.execute("SELECT seq, op, key, value FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)).fetchall()
+    if rows and rows[0][0] > since + 1:
+        oldest = connection.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+        if oldest is not None and oldest > since + 1:
+            raise ChangeLogTrimmed(since, oldest)
+    return rows
+
+
+def read_last_change(connection: sqlite3.Connection) -> int:
+    row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row is not None else 0
+
+
+def watched(key: Optional[str], prefix: str, watched_key: Optional[str]) -> bool:
+    """
+    Whether a change to key concerns a watcher of watched_key, or of prefix without watched_key.
+    Clearing, with key None, concerns every watcher.
+    """
+    if key is None:
+        return True
+    if watched_key is not None:
+        return key == watched_key
+    return key.startswith(prefix)
+
+
+def encode_event(message: Dict[str, Any], event_stream: bool) -> bytes:
+    """
+    A watch stream message as a line of JSON, or as a server-sent event whose id is the
+    sequence number, so that EventSource resumes with Last-Event-ID after a reconnect.
+    """
+    if not event_stream:
+        return json_wire.dumps(message) + b"\n"
+    if message["op"] == EVENT_HEARTBEAT:
+        # An id without data moves the resume position without dispatching an event
+        return b"id: %d\n: heartbeat\n\n" % message["seq"]
+    if "seq" in message:
+        return b"id: %d\ndata: %s\n\n" % (message["seq"], json_wire.dumps(message))
+    return b"data: %s\n\n" % json_wire.dumps(message)
+
+
+class Encoded:
+    """
+    A cached value in its stored form, decoded on every read so callers never share a mutable object.
+    """
+    __slots__ = ("stored",)
+
+    def __init__(self, stored: bytes | str) -> None:
+        self.stored = stored
+
+
+def scan_query(prefix: str, start: Optional[str], cursor: Optional[str], limit: int, keys_only: bool) -> Tuple[str, List[Any]]:
+    """
+    The SELECT of one scan page, a single range on the primary key index.
+    """
+    if not 1 <= limit <= MAX_SCAN_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_SCAN_LIMIT}")
+    conditions: List[str] = ["(expires_at IS NULL OR expires_at > ?)"]
+    params: List[Any] = [time.time()]
+    # One lower bound only, so SQLite seeks to it instead of filtering the rows before it
+    lower = max(prefix, start) if start is not None else prefix
+    if cursor is not None and cursor >= lower:
+        conditions.append("key > ?")
+        params.append(cursor)
+    elif lower:
+        conditions.append("key >= ?")
+        params.append(lower)
+    upper = prefix_end(prefix) if prefix else None
+    if upper is not None:
+        conditions.append("key < ?")
+        params.append(upper)
+    params.append(limit)
+    return f"SELECT {'key' if keys_only else 'key, value'} FROM objects WHERE {' AND '.join(conditions)} ORDER BY key LIMIT ?", params
 
 
 class CloudDatabase:
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, durability: Literal['strict', 'group'] = DURABILITY_STRICT, flush_size: int = 1000, flush_interval: float = 0.05, synchronous: Optional[str] = None, journal_mode: Optional[str] = None, cache_size: int = 64 * 1024 * 1024, codec: Codec = binary_codec, shared: bool = False, metrics: Optional[MetricsRegistry] = None, sweep_interval: float = 1.0, changelog_size: int = 0) -> None:
+        """
+        Parameters:
+            path (str): The SQLite database file.
+            durability (str): 'strict' commits every write before it is acknowledged,
+                'group' buffers writes and commits them together by size or interval.
+            flush_size (int): In group mode, commit once this many writes are pending.
+            flush_interval (float): In group mode, commit pending writes at least this often (seconds).
+            synchronous (Optional[str]): The SQLite synchronous pragma, FULL for strict and NORMAL for group by default.
+            journal_mode (Optional[str]): The SQLite journal_mode pragma, WAL for group by default.
+            cache_size (int): Memory budget of the read cache in bytes, measured on encoded values.
+            codec (Codec): Encodes values into the BLOBs stored in SQLite.
+            shared (bool): The file is written by other processes too, e.g. CloudServer workers.
+                Uses WAL by default and drops the read cache whenever another connection committed.
+            metrics (Optional[MetricsRegistry]): Record query and commit latencies and cache counters there.
+            sweep_interval (float): Longest time in seconds between two runs of the expired key sweeper,
+                which also picks up keys with a TTL set by other processes.
+            changelog_size (int): Log every change with a sequence number for watchers, keeping the last
+                changelog_size changes to resume from. 0 disables the change log.
+        """
+        if durability not in (DURABILITY_STRICT, DURABILITY_GROUP):
+            raise ValueError(f"Unknown durability mode: {durability}")
         self.path: str = path
-        self.data: dict[str, AnyCloudObject] = {}
-        self.database = sqlite3.connect(self.path)
+        self.durability: str = durability
+        self.flush_size: int = flush_size
+        self.flush_interval: float = flush_interval
+        self.codec: Codec = codec
+        self.shared: bool = shared
+        if journal_mode is None and (durability == DURABILITY_GROUP or shared):
+            journal_mode = "WAL"
+        if synchronous is None:
+            synchronous = "FULL" if durability == DURABILITY_STRICT else "NORMAL"
+        self.journal_mode: Optional[str] = journal_mode
+        self.synchronous: str = synchronous
+        self.sweep_interval: float = sweep_interval
+        self.changelog_size: int = changelog_size
+        self.signal: ChangeSignal = ChangeSignal()
+        # Expired keys removed by the sweeper and by reads
+        self.expired: Dict[str, int] = {"sweep": 0, "read": 0}
+        # Decoded objects, stored values are read from SQLite on a miss
+        self.cache: LRUCache = LRUCache(cache_size)
+        self.lock = threading.RLock()
+        self.query_seconds: Optional[Histogram] = None
+        self.commit_seconds: Optional[Histogram] = None
+        if metrics is not None:
+            self.instrument(metrics)
+        self._open()
+
+    def instrument(self, metrics: MetricsRegistry) -> None:
+        """
+        Record SQLite query and commit latencies and the read cache counters in a registry.
+        """
+        self.query_seconds = metrics.histogram("pycloudkit_db_query_seconds", "Time spent in SQLite statements, by operation.", ("operation",))
+        self.commit_seconds = metrics.histogram("pycloudkit_db_commit_seconds", "Time spent committing transactions.")
+        stats = self.cache.stats
+        metrics.callback_counter("pycloudkit_cache_requests_total", "Read cache lookups, by result.", lambda: {("hit",): stats()["hits"], ("miss",): stats()["misses"]}, ("result",))
+        metrics.callback_counter("pycloudkit_cache_evictions_total", "Objects evicted from the read cache.", lambda: {(): stats()["evictions"]})
+        metrics.callback_gauge("pycloudkit_cache_entries", "Objects in the read cache.", lambda: {(): stats()["entries"]})
+        metrics.callback_gauge("pycloudkit_cache_bytes", "Encoded size of the objects in the read cache.", lambda: {(): stats()["bytes"]})
+        metrics.callback_counter("pycloudkit_expired_keys_total", "Expired keys removed, by the sweeper or by the read that found them.", lambda: {(reason,): count for reason, count in self.expired.items()}, ("reason",))
+
+    def _timer(self, operation: str) -> ContextManager:
+        if self.query_seconds is None:
+            return nullcontext()
+        return self.query_seconds.time((operation,))
+
+    def _open(self) -> None:
+        # The connection is shared by the server threads, access is serialized by the lock
+        self.database = sqlite3.connect(self.path, check_same_thread=False)
         self.cursor = self.database.cursor()
-        self.cursor.execute("CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, value TEXT)")
+        if self.journal_mode is not None:
+            self.cursor.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        self.cursor.execute(f"PRAGMA synchronous = {self.synchronous}")
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        if "expires_at" not in [row[1] for row in self.cursor.execute("PRAGMA table_info(objects)")]:
+            # Databases created before TTLs existed
+            try:
+                self.cursor.execute("ALTER TABLE objects ADD COLUMN expires_at REAL")
+            except sqlite3.OperationalError:
+                # Added by another process in the meantime
+                pass
+        # Only keys with a TTL are indexed, the sweeper finds the next ones to expire without a table scan
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS objects_expires_at ON objects (expires_at) WHERE expires_at IS NOT NULL")
+        # AUTOINCREMENT never reuses a sequence number, even after the log was trimmed
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL, key TEXT, value BLOB)")
         self.database.commit()
+        # The last change written through this connection, and where the log was last trimmed
+        self.change_seq: int = read_last_change(self.database)
+        self._trimmed: int = self.change_seq
+        self.signal.notify(self.change_seq)
+        self.signal.open()
+        self.data_version: int = self.cursor.execute("PRAGMA data_version").fetchone()[0]
+        self.pending: int = 0
+        # Number of commits of pending writes, lets AsyncCloudDatabase tell when a write became visible
+        self.commits: int = 0
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if self.durability == DURABILITY_GROUP:
+            self._flusher = threading.Thread(target=self._flush_loop, name="CloudDatabase-flush", daemon=True)
+            self._flusher.start()
+        # The sweeper starts with the first key that has a TTL
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweep_wakeup = threading.Event()
+        self._next_expiry: Optional[float] = None
+        next_expiry = self.cursor.execute("SELECT MIN(expires_at) FROM objects WHERE expires_at IS NOT NULL").fetchone()[0]
+        if next_expiry is not None:
+            self._schedule(next_expiry)
+
+    def reopen(self) -> None:
+        """
+        Open a new connection after close(), e.g. in a forked worker process.
+        Connections must not be carried across fork(), and the cache may be stale.
+        """
+        with self.lock:
+            self.cache.clear()
+            self._open()
+
+    def _sync_cache(self) -> None:
+        """
+        Drop the cache if another connection committed since the last check.
+        """
+        with self.lock:
+            version = self.cursor.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.data_version:
+                self.data_version = version
+                self.cache.clear()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _schedule(self, expires_at: float) -> None:
+        """
+        Make sure the sweeper runs once expires_at has passed.
+        """
+        with self.lock:
+            if self._next_expiry is not None and self._next_expiry <= expires_at:
+                return
+            self._next_expiry = expires_at
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="CloudDatabase-sweeper", daemon=True)
+                self._sweeper.start()
+            else:
+                self._sweep_wakeup.set()
+
+    def _sweep_loop(self) -> None:
+        while not self._closed.is_set():
+            next_expiry = self.sweep()
+            # Sleeps until the next key expires, or sweep_interval for keys set by other processes
+            delay = self.sweep_interval if next_expiry is None else min(max(next_expiry - time.time(), 0.0), self.sweep_interval)
+            self._sweep_wakeup.wait(delay)
+
+    def sweep(self, limit: int = SWEEP_BATCH) -> Optional[float]:
+        """
+        Delete up to limit expired keys, the longest expired first, using the expires_at index.
+        Returns when the next key expires, None if no key has a TTL.
+        """
+        now = time.time()
+        with self.lock:
+            with self._timer("sweep"):
+                keys = [row[0] for row in self.database.execute("SELECT key FROM objects WHERE expires_at <= ? ORDER BY expires_at LIMIT ?", (now, limit))]
+            if keys:
+                self._expire(keys, now, "sweep")
+            self._next_expiry = self.database.execute("SELECT MIN(expires_at) FROM objects WHERE expires_at IS NOT NULL").fetchone()[0]
+            self._sweep_wakeup.clear()
+            return self._next_expiry
+
+    def _expire(self, keys: List[str], now: float, reason: str) -> None:
+        with self._write(len(keys), "expire"):
+            # A key set again since it was found expired is kept
+            self._delete(keys, CHANGE_EXPIRE, "DELETE FROM objects WHERE key = ? AND expires_at <= ?", (now,))
+        self.expired[reason] += len(keys)
+
+    def _delete(self, keys: List[str], op: str, query: str = "DELETE FROM objects WHERE key = ?", params: Tuple = ()) -> None:
+        """
+        Delete keys and log the ones that existed, called with the lock held.
+        """
+        if not self.changelog_size:
+            self.cursor.executemany(query, [(key,) + params for key in keys])
+        else:
+            deleted = []
+            for key in keys:
+                self.cursor.execute(query, (key,) + params)
+                if self.cursor.rowcount > 0:
+                    deleted.append((op, key, None))
+            self._log(deleted)
+        for key in keys:
+            self.cache.discard(key)
+
+    def _log(self, rows: List[Tuple[str, Optional[str], Optional[bytes]]]) -> None:
+        """
+        Append (op, key, encoded value) rows to the change log, in the transaction of the write
+        that made them, and drop the oldest rows beyond changelog_size now and then.
+        """
+        if not self.changelog_size or not rows:
+            return
+        if len(rows) == 1:
+            self.cursor.execute("INSERT INTO changes (op, key, value) VALUES (?, ?, ?)", rows[0])
+            self.change_seq = self.cursor.lastrowid
+        else:
+            # lastrowid is not set by executemany
+            self.cursor.executemany("INSERT INTO changes (op, key, value) VALUES (?, ?, ?)", rows)
+            self.change_seq = self.cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        if self.change_seq - self._trimmed >= max(self.changelog_size // 10, 1):
+            self.cursor.execute("DELETE FROM changes WHERE seq <= ?", (self.change_seq - self.changelog_size,))
+            self._trimmed = self.change_seq
+
+    def _cached(self, key: str) -> Any:
+        """
+        The cached value of a key, MISSING if it is not cached or expired.
+        """
+        value = self.cache.get(key)
+        if type(value) is Expiring:
+            if value.expires_at <= time.time():
+                self.cache.discard(key)
+                return MISSING
+            value = value.value
+        if type(value) is Encoded:
+            return self.decode(value.stored)
+        return value
+
+    def _cache(self, key: str, stored: bytes | str, expires_at: Optional[float], value: Any = MISSING) -> None:
+        """
+        Cache a key from its stored form. A decoded value is cached as it is only if it is immutable,
+        so changing an object after set or get never changes what later reads return.
+        """
+        entry = value if type(value) in IMMUTABLE_TYPES else Encoded(stored)
+        self.cache.put(key, entry if expires_at is None else Expiring(entry, expires_at), len(stored))
+
+    @contextmanager
+    def _write(self, count: int = 1, operation: str = "write") -> Iterator[None]:
+        """
+        Run a write under the lock and commit it according to the durability mode.
+        A write that fails is rolled back to a savepoint, the pending writes of other callers
+        sharing its transaction in group mode are kept.
+        """
+        with self.lock:
+            change_seq = self.change_seq
+            if not self.database.in_transaction:
+                # Releasing a savepoint that opened the transaction would commit it
+                self.cursor.execute("BEGIN")
+            self.cursor.execute("SAVEPOINT write")
+            try:
+                with self._timer(operation):
+                    yield
+            except Exception:
+                if self.durability == DURABILITY_STRICT:
+                    self.database.rollback()
+                else:
+                    self.cursor.execute("ROLLBACK TO write")
+                    self.cursor.execute("RELEASE write")
+                self.change_seq = change_seq
+                raise
+            self.cursor.execute("RELEASE write")
+            self.pending += count
+            if self.durability == DURABILITY_STRICT or self.pending >= self.flush_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Commit all pending writes.
+        """
+        with self.lock:
+            if self.pending:
+                if self.commit_seconds is None:
+                    self.database.commit()
+                else:
+                    with self.commit_seconds.time():
+                        self.database.commit()
+                self.pending = 0
+                self.commits += 1
+                if self.change_seq > self.signal.seq:
+                    self.signal.notify(self.change_seq)
+
+    def close(self) -> None:
+        """
+        Flush pending writes and close the database.
+        """
+        self._closed.set()
+        self._sweep_wakeup.set()
+        self.signal.close()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._sweeper is not None:
+            self._sweeper.join()
+        with self.lock:
+            self.flush()
+            self.database.close()
+
+    def decode(self, stored: bytes | str) -> Any:
+        """
+        Decode a stored value. Rows written before values were stored as BLOBs hold legacy text.
+        """
+        if isinstance(stored, str):
+            return text_codec.decode(stored)
+        return self.codec.decode(stored)
+
+    def migrate(self, batch_size: int = 1000) -> int:
+        """
+        Re-encode legacy text rows as BLOBs with the database codec.
+        Returns the number of migrated rows.
+        """
+        migrated = 0
+        with self.lock:
+            while True:
+                self.cursor.execute("SELECT key, value FROM objects WHERE typeof(value) = 'text' LIMIT ?", (batch_size,))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    return migrated
+                with self._write(len(rows), "migrate"):
+                    self.cursor.executemany("UPDATE objects SET value = ? WHERE key = ?", [(self.codec.encode(text_codec.decode(value)), key) for key, value in rows])
+                migrated += len(rows)
 
     def load(self) -> None:
-        self.cursor.execute("SELECT key, value FROM objects")
-        for key, value in self.cursor.fetchall():
-            self.data[key] = AnyCloudObject(from_string(value))
-
-    def get(self, key: str) -> str:
-        self.cursor.execute("SELECT value FROM objects WHERE key = ?", (key,))
-        fetched = self.cursor.fetchone()
-        if fetched is None:
-            return "No such key"
-        return from_string(fetched[0])
-
-    def set(self, key: str, value: Any) -> None:
-        self.data[key] = AnyCloudObject(value)
-        self.cursor.execute("INSERT OR REPLACE INTO objects VALUES (?, ?)", (key, self.data[key].to_string()))
-        self.database.commit()
+        """
+        Warm the cache with stored objects until its memory budget is used up.
+        Values are decoded on their first read, objects that do not fit are loaded lazily from SQLite.
+        """
+        with self.lock:
+            cursor = self.database.execute("SELECT key, value, expires_at FROM objects WHERE expires_at IS NULL OR expires_at > ?", (time.time(),))
+            for key, value, expires_at in cursor:
+                if self.cache.size + len(value) + ENTRY_OVERHEAD > self.cache.max_bytes:
+                    break
+                self._cache(key, value, expires_at)
+            cursor.close()
+
+    def _uses_wal(self) -> bool:
+        return self.path != ":memory:" and self.database.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+
+    def backup(self, path: str, pages: int = BACKUP_PAGES) -> None:
+        """
+        Copy the database into a new SQLite file with the SQLite backup API while it stays in use.
+        In WAL mode the copy is read in one step on a connection of its own, which never blocks writers.
+        Otherwise pages pages are copied per step through this connection, writes go on between
+        the steps and the backup API carries them into the copy.
+        """
+        self.flush()
+        target = sqlite3.connect(path)
+        try:
+            if self._uses_wal():
+                source = sqlite3.connect(f"file:{urllib.parse.quote(self.path)}?mode=ro", uri=True)
+                try:
+                    with self._timer("backup"):
+                        source.backup(target)
+                finally:
+                    source.close()
+                return
+
+            def progress(status: int, remaining: int, total: int) -> None:
+                # Lets writers in between two steps
+                self.lock.release()
+                try:
+                    time.sleep(0)
+                finally:
+                    self.lock.acquire()
+            with self.lock, self._timer("backup"):
+                self.database.backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+
+    def export_snapshot(self, path: str) -> int:
+        """
+        Write the keys that have not expired into a snapshot file, see SnapshotReader.
+        Rows are streamed in key order from a consistent view of the database, values are copied
+        as they are stored without decoding them. Writers are not blocked, a backup is exported
+        unless the database uses WAL. Returns the number of keys written.
+        """
+        if self._uses_wal():
+            self.flush()
+            source = sqlite3.connect(f"file:{urllib.parse.quote(self.path)}?mode=ro", uri=True)
+            try:
+                return self._export(source, path)
+            finally:
+                source.close()
+        copy = f"{path}.{os.getpid()}.backup"
+        try:
+            self.backup(copy)
+            source = sqlite3.connect(copy)
+            try:
+                return self._export(source, path)
+            finally:
+                source.close()
+        finally:
+            for suffix in ("", "-journal"):
+                if os.path.exists(copy + suffix):
+                    os.remove(copy + suffix)
+
+    def _export(self, source: sqlite3.Connection, path: str) -> int:
+        with self._timer("export"), SnapshotWriter(path, self.codec) as writer:
+            # A single statement reads one snapshot of the table from its first row to its last
+            for key, stored, expires_at in source.execute("SELECT key, value, expires_at FROM objects WHERE expires_at IS NULL OR expires_at > ? ORDER BY key", (time.time(),)):
+                writer.write(key, stored, expires_at)
+        return len(writer.offsets)
+
+    def import_snapshot(self, path: str, replace: bool = False) -> int:
+        """
+        Bulk load a snapshot written by export_snapshot, streamed from the memory-mapped file
+        in transactions of IMPORT_BATCH keys. Values written with the database codec are copied
+        without decoding them. Existing keys are overwritten, replace deletes all keys first.
+        Expired keys are skipped. Returns the number of keys imported.
+        Raises SnapshotError for files that are not valid snapshots.
+        """
+        imported = 0
+        with SnapshotReader(path) as reader:
+            if reader.codec_name == self.codec.name:
+                convert = None
+            elif reader.codec is not None:
+                convert = lambda stored: stored if isinstance(stored, str) else self.codec.encode(reader.codec.decode(stored))
+            else:
+                raise SnapshotError(f"Snapshot values are encoded with the unknown codec {reader.codec_name}")
+            if replace:
+                self.clear()
+            now = time.time()
+            batch: List[Tuple[str, bytes | str, Optional[float]]] = []
+            for key, stored, expires_at in reader.records():
+                if expires_at is not None and expires_at <= now:
+                    continue
+                batch.append((key, stored if convert is None else convert(stored), expires_at))
+                if len(batch) == IMPORT_BATCH:
+                    imported += self._import(batch)
+                    batch = []
+            if batch:
+                imported += self._import(batch)
+        return imported
+
+    def _import(self, rows: List[Tuple[str, bytes | str, Optional[float]]]) -> int:
+        with self._write(len(rows), "import"):
+            self.cursor.executemany("INSERT OR REPLACE INTO objects (key, value, expires_at) VALUES (?, ?, ?)", rows)
+            self._log([(CHANGE_SET, key, stored) for key, stored, _ in rows])
+            for key, _, _ in rows:
+                self.cache.discard(key)
+            expiries = [expires_at for _, _, expires_at in rows if expires_at is not None]
+            if expiries:
+                self._schedule(min(expiries))
+        return len(rows)
+
+    def get(self, key: str, default: Any = "No such key") -> Any:
+        if self.shared:
+            self._sync_cache()
+        value = self._cached(key)
+        if value is not MISSING:
+            return value
+        with self.lock:
+            with self._timer("get"):
+                self.cursor.execute("SELECT value, expires_at FROM objects WHERE key = ?", (key,))
+                fetched = self.cursor.fetchone()
+            if fetched is None:
+                return default
+            stored, expires_at = fetched
+            now = time.time()
+            if expires_at is not None and expires_at <= now:
+                self._expire([key], now, "read")
+                return default
+            value = self.decode(stored)
+            self._cache(key, stored, expires_at, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Set a key, which expires after ttl seconds if ttl is given.
+        Setting a key without ttl removes its TTL. Raises ValueError for a ttl that is not positive.
+        """
+        expires_at = check_ttl(ttl)
+        encoded = self.codec.encode(value)
+        with self._write(operation="set"):
+            self.cursor.execute("INSERT OR REPLACE INTO objects (key, value, expires_at) VALUES (?, ?, ?)", (key, encoded, expires_at))
+            self._log([(CHANGE_SET, key, encoded)])
+            self._cache(key, encoded, expires_at, value)
+            if expires_at is not None:
+                self._schedule(expires_at)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Get several keys at once. Missing keys are left out of the result.
+        """
+        result: Dict[str, Any] = {}
+        missing: List[str] = []
+        if self.shared:
+            self._sync_cache()
+        for key in keys:
+            value = self._cached(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                result[key] = value
+        if not missing:
+            return result
+        expired: List[str] = []
+        with self.lock:
+            now = time.time()
+            with self._timer("get_many"):
+                for i in range(0, len(missing), BATCH_VARIABLES):
+                    chunk = missing[i:i + BATCH_VARIABLES]
+                    self.cursor.execute(f"SELECT key, value, expires_at FROM objects WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                    for key, value, expires_at in self.cursor.fetchall():
+                        if expires_at is not None and expires_at <= now:
+                            expired.append(key)
+                            continue
+                        result[key] = self.decode(value)
+                        self._cache(key, value, expires_at, result[key])
+            if expired:
+                self._expire(expired, now, "read")
+        return result
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        Set several keys in a single transaction, which expire after ttl seconds if ttl is given.
+        """
+        expires_at = check_ttl(ttl)
+        rows = [(key, self.codec.encode(value), expires_at) for key, value in items.items()]
+        with self._write(len(rows), "set_many"):
+            self.cursor.executemany("INSERT OR REPLACE INTO objects (key, value, expires_at) VALUES (?, ?, ?)", rows)
+            self._log([(CHANGE_SET, key, encoded) for key, encoded, _ in rows])
+            for key, encoded, _ in rows:
+                self._cache(key, encoded, expires_at, items[key])
+            if expires_at is not None and rows:
+                self._schedule(expires_at)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        """
+        Delete several keys in a single transaction. Missing keys are ignored.
+        """
+        keys = list(keys)
+        with self._write(len(keys), "delete_many"):
+            self._delete(keys, CHANGE_DELETE)
+
+    def scan(self, prefix: str = "", start: Optional[str] = None, limit: int = 1000, cursor: Optional[str] = None, keys_only: bool = False) -> Tuple[List[Any], Optional[str]]:
+        """
+        One page of keys in key order, read from the primary key index.
+        Parameters:
+            prefix (str): Only keys that start with prefix.
+            start (Optional[str]): Only keys from start on.
+            limit (int): The page size, at most MAX_SCAN_LIMIT.
+            cursor (Optional[str]): The cursor returned with the previous page.
+            keys_only (bool): Return keys instead of (key, value) pairs.
+        Returns the page and the cursor of the next page, None after the last page.
+        Raises ValueError for an invalid limit.
+        """
+        query, params = scan_query(prefix, start, cursor, limit, keys_only)
+        with self.lock, self._timer("scan"):
+            rows = self.database.execute(query, params).fetchall()
+        return self._page(rows, limit, keys_only)
+
+    def _page(self, rows: List[Tuple], limit: int, keys_only: bool) -> Tuple[List[Any], Optional[str]]:
+        page = [row[0] for row in rows] if keys_only else [(key, self.decode(value)) for key, value in rows]
+        return page, rows[-1][0] if len(rows) == limit else None
 
     def exists(self, key: str) -> bool:
-        return key in self.data
+        if self.shared:
+            self._sync_cache()
+        if self._cached(key) is not MISSING:
+            return True
+        with self.lock, self._timer("exists"):
+            self.cursor.execute("SELECT 1 FROM objects WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time()))
+            return self.cursor.fetchone() is not None
 
     def delete(self, key: str) -> None:
-        del self.data[key]
-        self.cursor.execute("DELETE FROM objects WHERE key = ?", (key,))
-        self.database.commit()
+        with self._write(operation="delete"):
+            self._delete([key], CHANGE_DELETE)
 
     def clear(self) -> None:
-        self.data.clear()
-        self.cursor.execute("DELETE FROM objects")
-        self.database.commit()
+        with self._write(operation="clear"):
+            self.cursor.execute("DELETE FROM objects")
+            self._log([(CHANGE_CLEAR, None, None)])
+            self.cache.clear()
+
+    def changes(self, since: int = 0, prefix: str = "", key: Optional[str] = None, limit: int = WATCH_BATCH) -> Tuple[List[Change], int]:
+        """
+        The logged changes after sequence number since to key, or to the keys that start with prefix.
+        Parameters:
+            since (int): The sequence number of the last change already seen.
+            prefix (str): Only changes to keys that start with prefix.
+            key (Optional[str]): Only changes to this key.
+            limit (int): Log rows read at most, before they are filtered.
+        Returns the changes and the sequence number to pass as since for the next ones.
+        Raises ChangeLogTrimmed if changes after since were already dropped from the log.
+        """
+        with self.lock, self._timer("changes"):
+            rows = read_changes(self.database, since, limit)
+        return self._filter_changes(rows, since, prefix, key)
+
+    def _filter_changes(self, rows: List[Tuple], since: int, prefix: str, key: Optional[str]) -> Tuple[List[Change], int]:
+        changes = [Change(seq, op, changed, self.decode(value) if value is not None else None)
+                   for seq, op, changed, value in rows if watched(changed, prefix, key)]
+        return changes, rows[-1][0] if rows else since
+
+    def last_change(self) -> int:
+        """
+        The sequence number of the last logged change, 0 if there is none.
+        """
+        with self.lock:
+            return read_last_change(self.database)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Hit, miss and eviction counters of the read cache.
+        """
+        return self.cache.stats()
 
     def __getitem__(self, key: str) -> Any:
         return self.get(key)
@@ -58,74 +886,694 @@ class CloudDatabase:
         self.delete(key)
 
 
+class AsyncCloudDatabase:
+    """
+    An asyncio facade over CloudDatabase that keeps SQLite off the event loop.
+    Writes go through a queue to a single writer thread that owns the CloudDatabase connection.
+    Reads are answered from the cache, or run on a pool of read-only connections,
+    which in WAL mode never wait for the writer.
+    Keys with writes that readers can not see yet (queued, or not yet committed in group mode)
+    are read through the writer queue instead, so every read sees the writes before it.
+    With a shared database, reads always run on the readers and never use the cache, which
+    would have to be checked against the other processes' commits before every read.
+    """
+    def __init__(self, database: CloudDatabase, readers: int = 4) -> None:
+        """
+        Parameters:
+            database (CloudDatabase): The database, only the writer thread uses it afterwards.
+            readers (int): The number of read-only connections, 0 sends reads through the writer.
+        """
+        self.database: CloudDatabase = database
+        if database.path == ":memory:":
+            readers = 0
+        self.readers: int = readers
+        self.lock = threading.Lock()
+        # Keys with writes waiting in the queue, mapped to the number of writes
+        self.queued: Dict[str, int] = {}
+        # Keys written but not committed yet, mapped to the commit count at which they become visible
+        self.unflushed: Dict[str, int] = {}
+        # Same as queued and unflushed, for clear()
+        self.clears_queued: int = 0
+        self.clear_visible: int = 0
+        # Changes whenever the writer starts or finishes an operation, guards cache fills by readers
+        self.sequence: int = 0
+        self.queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="CloudDatabase-writer", daemon=True)
+        self._writer.start()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._pool: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(readers, thread_name_prefix="CloudDatabase-reader") if readers else None
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            func, args, keys, clears, future = item
+            with self.lock:
+                self.sequence += 1
+            try:
+                with self.database.lock:
+                    result = func(*args)
+                    visible = self.database.commits + 1 if self.database.pending else 0
+            except BaseException as error:
+                self._written(keys, clears, 0)
+                future.set_exception(error)
+                continue
+            self._written(keys, clears, visible)
+            future.set_result(result)
+
+    def _written(self, keys: Iterable[str], clears: int, visible: int) -> None:
+        with self.lock:
+            self.sequence += 1
+            for key in keys:
+                count = self.queued.pop(key) - 1
+                if count:
+                    self.queued[key] = count
+                if visible:
+                    self.unflushed[key] = visible
+            self.clears_queued -= clears
+            if clears and visible:
+                self.clear_visible = visible
+            if self.unflushed and len(self.unflushed) >= self.database.flush_size:
+                commits = self.database.commits
+                self.unflushed = {key: at for key, at in self.unflushed.items() if at > commits}
+
+    def _submit(self, func: Callable, *args: Any, keys: Iterable[str] = (), clears: int = 0) -> "asyncio.Future":
+        future: Future = Future()
+        with self.lock:
+            for key in keys:
+                self.queued[key] = self.queued.get(key, 0) + 1
+            self.clears_queued += clears
+        self.queue.put((func, args, keys, clears, future))
+        return asyncio.wrap_future(future)
+
+    def _dirty(self, key: str) -> bool:
+        # Called with the lock held
+        commits = self.database.commits
+        if self.clears_queued or self.clear_visible > commits or key in self.queued:
+            return True
+        visible = self.unflushed.get(key)
+        if visible is None:
+            return False
+        if visible > commits:
+            return True
+        del self.unflushed[key]
+        return False
+
+    def _settled(self) -> bool:
+        """
+        Whether readers see every write, so that reads of unknown keys such as scans can use them.
+        """
+        with self.lock:
+            commits = self.database.commits
+            if self.queued or self.clears_queued or self.clear_visible > commits:
+                return False
+            if self.unflushed:
+                self.unflushed = {key: at for key, at in self.unflushed.items() if at > commits}
+            return not self.unflushed
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{urllib.parse.quote(self.database.path)}?mode=ro", uri=True, check_same_thread=False)
+            self._local.connection = connection
+            with self.lock:
+                self._connections.append(connection)
+        return connection
+
+    def _read(self, keys: List[str], sequence: int) -> Dict[str, Any]:
+        connection = self._reader()
+        result: Dict[str, Any] = {}
+        rows: List[Tuple[str, bytes, Optional[float]]] = []
+        with self.database._timer("read"):
+            for i in range(0, len(keys), BATCH_VARIABLES):
+                chunk = keys[i:i + BATCH_VARIABLES]
+                rows += connection.execute(f"SELECT key, value, expires_at FROM objects WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+        # Readers can not delete, expired keys are left to the sweeper
+        now = time.time()
+        rows = [row for row in rows if row[2] is None or row[2] > now]
+        for key, value, _ in rows:
+            result[key] = self.database.decode(value)
+        if self.database.shared:
+            return result
+        with self.lock:
+            # A write that started after the read was dispatched may already be in the cache
+            if self.sequence == sequence:
+                for key, value, expires_at in rows:
+                    self.database._cache(key, value, expires_at, result[key])
+        return result
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Get several keys at once. Missing keys are left out of the result.
+        """
+        result: Dict[str, Any] = {}
+        missing: List[str] = []
+        dirty: List[str] = []
+        shared = self.database.shared
+        with self.lock:
+            sequence = self.sequence
+            for key in keys:
+                if self._dirty(key):
+                    dirty.append(key)
+                    continue
+                value = MISSING if shared else self.database._cached(key)
+                if value is MISSING:
+                    missing.append(key)
+                else:
+                    result[key] = value
+        if missing and self._pool is None:
+            dirty += missing
+            missing = []
+        pending = []
+        if dirty:
+            pending.append(self._submit(self.database.get_many, dirty))
+        if missing:
+            pending.append(asyncio.get_running_loop().run_in_executor(self._pool, self._read, missing, sequence))
+        for values in await asyncio.gather(*pending):
+            result.update(values)
+        return result
+
+    async def get(self, key: str, default: Any = "No such key") -> Any:
+        return (await self.get_many([key])).get(key, default)
+
+    async def scan(self, prefix: str = "", start: Optional[str] = None, limit: int = 1000, cursor: Optional[str] = None, keys_only: bool = False) -> Tuple[List[Any], Optional[str]]:
+        """
+        One page of keys in key order, see CloudDatabase.scan.
+        Runs on a reader unless writes are still pending, then on the writer so it sees them.
+        """
+        query, params = scan_query(prefix, start, cursor, limit, keys_only)
+        if self._pool is None or not self._settled():
+            return await self._submit(self.database.scan, prefix, start, limit, cursor, keys_only)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._scan, query, params, limit, keys_only)
+
+    def _scan(self, query: str, params: List[Any], limit: int, keys_only: bool) -> Tuple[List[Any], Optional[str]]:
+        with self.database._timer("scan"):
+            rows = self._reader().execute(query, params).fetchall()
+        return self.database._page(rows, limit, keys_only)
+
+    async def changes(self, since: int = 0, prefix: str = "", key: Optional[str] = None, limit: int = WATCH_BATCH) -> Tuple[List[Change], int]:
+        """
+        The committed changes after since, see CloudDatabase.changes. Runs on a reader.
+        """
+        if self._pool is None:
+            return await self._submit(self.database.changes, since, prefix, key, limit)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._changes, since, prefix, key, limit)
+
+    def _changes(self, since: int, prefix: str, key: Optional[str], limit: int) -> Tuple[List[Change], int]:
+        with self.database._timer("changes"):
+            rows = read_changes(self._reader(), since, limit)
+        return self.database._filter_changes(rows, since, prefix, key)
+
+    async def last_change(self) -> int:
+        """
+        The sequence number of the last committed change.
+        """
+        if self._pool is None:
+            return await self._submit(self.database.last_change)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, lambda: read_last_change(self._reader()))
+
+    async def exists(self, key: str) -> bool:
+        return bool(await self.get_many([key]))
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._submit(self.database.set, key, value, ttl, keys=(key,))
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        await self._submit(self.database.set_many, items, ttl, keys=tuple(items))
+
+    async def delete(self, key: str) -> None:
+        await self._submit(self.database.delete, key, keys=(key,))
+
+    async def delete_many(self, keys: Iterable[str]) -> None:
+        keys = tuple(keys)
+        await self._submit(self.database.delete_many, keys, keys=keys)
+
+    async def clear(self) -> None:
+        await self._submit(self.database.clear, clears=1)
+
+    async def flush(self) -> None:
+        await self._submit(self.database.flush)
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.database.cache_stats()
+
+    def close(self) -> None:
+        """
+        Finish queued writes and close the reader connections. The CloudDatabase stays open.
+        """
+        self.queue.put(None)
+        self._writer.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+        with self.lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+
 class CloudServer(AsyncServer):
-    def __init__(self, host: str, port: int, database_path: str) -> None:
-        super().__init__(host, port)
-        self.database = CloudDatabase(database_path)
-        self.database.load()
+    def __init__(self, host: str, port: int, database_path: str, engine: str = ENGINE_ASYNCIO, keep_alive_timeout: Optional[float] = 5.0, max_requests: int = 1000, workers: int = 1, reuse_port: bool = False, shutdown_timeout: float = 10.0, readers: int = 4, metrics_path: Optional[str] = "/metrics", compression: bool = True, compression_min_size: int = COMPRESSION_MIN_SIZE, max_body_size: int = MAX_BODY_SIZE, **database_options: Any) -> None:
+        """
+        Parameters:
+            workers (int): Serve from this many worker processes, each with its own connection to the database file.
+            readers (int): Read-only connections per process, reads run on them off the event loop.
+            database_options: Passed to CloudDatabase, e.g. durability='group', or changelog_size to serve /watch.
+        """
+        super().__init__(host, port, engine, keep_alive_timeout, max_requests, workers, reuse_port, shutdown_timeout, metrics_path, compression, compression_min_size, max_body_size)
+        database_options.setdefault("shared", workers > 1)
+        if database_options["shared"]:
+            # Workers read from SQLite, a cache would be dropped on every commit of another worker
+            database_options.setdefault("cache_size", 0)
+        if metrics_path is not None:
+            database_options.setdefault("metrics", self.metrics)
+        # Readers only run alongside the writer in WAL mode
+        database_options.setdefault("journal_mode", "WAL")
+        self.readers: int = readers
+        # Seconds between heartbeats of idle watch streams
+        self.watch_heartbeat: float = WATCH_HEARTBEAT
+        self.database = CloudDatabase(database_path, **database_options)
+        self.async_database = AsyncCloudDatabase(self.database, readers)
         self.handlers.append(RequestHandler(self.get_GET, HTTPMethod.GET, "/get"))
         self.handlers.append(RequestHandler(self.set_GET, HTTPMethod.GET, "/set"))
         self.handlers.append(RequestHandler(self.get_POST, HTTPMethod.POST, "/get"))
         self.handlers.append(RequestHandler(self.set_POST, HTTPMethod.POST, "/set"))
         self.handlers.append(RequestHandler(self.delete, HTTPMethod.GET, "/delete"))
+        self.handlers.append(RequestHandler(self.delete_POST, HTTPMethod.POST, "/delete"))
+        self.handlers.append(RequestHandler(self.mget, HTTPMethod.POST, "/mget"))
+        self.handlers.append(RequestHandler(self.mset, HTTPMethod.POST, "/mset"))
+        self.handlers.append(RequestHandler(self.mdelete, HTTPMethod.POST, "/mdelete"))
+        self.handlers.append(RequestHandler(self.scan, HTTPMethod.GET, "/scan"))
+        self.handlers.append(RequestHandler(self.scan, HTTPMethod.POST, "/scan"))
+        self.handlers.append(RequestHandler(self.watch, HTTPMethod.GET, "/watch"))
+        self.handlers.append(RequestHandler(self.watch, HTTPMethod.POST, "/watch"))
+        self.handlers.append(RequestHandler(self.stats, HTTPMethod.GET, "/stats"))
 
     def start(self) -> None:
+        self.database.signal.open()
         super().start()
-        
+
+    def __pre_stop__(self) -> None:
+        # Watch streams would otherwise hold their connections open until the shutdown timeout
+        self.database.signal.close()
+
+    def __post_stop__(self) -> None:
+        self.database.flush()
+
+    def __pre_fork__(self) -> None:
+        # The supervisor does not serve, workers open their own connections
+        self.async_database.close()
+        self.database.close()
+
+    def __post_fork__(self) -> None:
+        self.database.reopen()
+        self.async_database = AsyncCloudDatabase(self.database, self.readers)
+
+    def read_message(self, request: RequestType) -> Optional[Dict[str, Any]]:
+        """
+        Decode a structured request body according to its Content-Type.
+        Returns None for legacy bodies, raises ValueError for malformed ones.
+        """
+        wire = request_wire(request.headers.get("Content-Type"))
+        if wire is None:
+            return None
+        message = wire.loads(request.body)
+        if not isinstance(message, dict):
+            raise ValueError("Request body must be an object")
+        return message
+
+    def reply(self, request: RequestType, message: Any, status_code: int = 200) -> ResponseType:
+        """
+        Encode a response in the format the client accepts, falling back to the request format.
+        """
+        wire = response_wire(request.headers.get("Accept")) or request_wire(request.headers.get("Content-Type")) or json_wire
+        return ResponseType(status_code, {"Content-Type": wire.content_type}, body=wire.dumps(message))
+
+    def bad_request(self, request: RequestType, message: str) -> ResponseType:
+        if response_wire(request.headers.get("Accept")) or request_wire(request.headers.get("Content-Type")):
+            return self.reply(request, {"error": message}, 400)
+        return ResponseType(404, {}, body=message)
+
+    async def get_value(self, request: RequestType, key: str) -> ResponseType:
+        if response_wire(request.headers.get("Accept")) is None:
+            return ResponseType(200, {}, body=str(await self.async_database.get(key)).encode("utf-8"))
+        value = await self.async_database.get(key, MISSING)
+        if value is MISSING:
+            return self.reply(request, {"error": "No such key"}, 404)
+        return self.reply(request, {"key": key, "value": value})
+
     async def get_GET(self, request: RequestType) -> ResponseType:
         if request.params.get("key") is None:
-            return ResponseType(404, {}, "Bad request, please specify key")
-        key = request.params["key"]
-        return ResponseType(200, {}, body=str(self.database.get(key)).encode("utf-8"))
+            return self.bad_request(request, "Bad request, please specify key")
+        return await self.get_value(request, request.params["key"])
 
     async def set_GET(self, request: RequestType) -> ResponseType:
         if request.params.get("key") is None or request.params.get("value") is None:
             return ResponseType(404, {}, body="Bad request, please specify key and value")
         key = request.params["key"]
         value = request.params["value"]
-        self.database.set(key, from_string(decode_string(value)))
+        try:
+            ttl = float(request.params["ttl"]) if request.params.get("ttl") else None
+            await self.async_database.set(key, from_string(value), ttl)
+        except ValueError:
+            return ResponseType(404, {}, body="Bad request, ttl must be a positive number of seconds")
         return ResponseType(200, {}, body="OK")
-    
+
     async def get_POST(self, request: RequestType) -> ResponseType:
-        body_dict = load_body_json(request.body)
-        if body_dict.get("key") is None:
-            return ResponseType(404, body="Bad request, please specify key")
-        key = body_dict["key"]
-        return ResponseType(200, {}, body=self.database.get(key).encode("utf-8"))
+        try:
+            message = self.read_message(request)
+        except ValueError:
+            return self.bad_request(request, "Bad request, invalid body")
+        if message is None:
+            try:
+                message = load_body_json(request.body)
+            except ValueError:
+                return ResponseType(400, {}, body="Bad request, invalid body")
+        if not isinstance(message.get("key"), str):
+            return self.bad_request(request, "Bad request, please specify key")
+        return await self.get_value(request, message["key"])
 
     async def set_POST(self, request: RequestType) -> ResponseType:
-        body_dict = load_body_json(request.body)
-        if body_dict.get("key") is None or body_dict.get("value") is None:
-            return ResponseType(404, body="Bad request, please specify key and value")
-        key = body_dict["key"]
-        value = body_dict["value"]
-        self.database.set(key, from_string(value))
+        try:
+            message = self.read_message(request)
+        except ValueError:
+            return self.bad_request(request, "Bad request, invalid body")
+        if message is None:
+            # Legacy body: a Python literal dict holding the value in text form
+            try:
+                message = load_body_json(request.body)
+            except ValueError:
+                return ResponseType(400, {}, body="Bad request, invalid body")
+            if message.get("value") is None:
+                return ResponseType(404, {}, body="Bad request, please specify key and value")
+            if not isinstance(message["value"], str):
+                return ResponseType(400, {}, body="Bad request, value must be text")
+            try:
+                message["value"] = from_string(message["value"])
+            except ValueError:
+                return ResponseType(400, {}, body="Bad request, invalid value")
+        if not isinstance(message.get("key"), str) or "value" not in message:
+            return self.bad_request(request, "Bad request, please specify key and value")
+        try:
+            await self.async_database.set(message["key"], message["value"], message.get("ttl"))
+        except ValueError as error:
+            return self.bad_request(request, f"Bad request, {error}")
         return ResponseType(200, {}, body="OK")
 
     async def delete(self, request: RequestType) -> ResponseType:
         if request.params.get("key") is None:
-            return ResponseType(404, body="Bad request, please specify key")
+            return ResponseType(404, {}, body="Bad request, please specify key")
         key = request.params["key"]
-        self.database.delete(key)
+        await self.async_database.delete(key)
+        return ResponseType(200, {}, body="OK")
+
+    async def delete_POST(self, request: RequestType) -> ResponseType:
+        try:
+            message = self.read_message(request) or {}
+        except ValueError:
+            return self.bad_request(request, "Bad request, invalid body")
+        if not isinstance(message.get("key"), str):
+            return self.bad_request(request, "Bad request, please specify key")
+        await self.async_database.delete(message["key"])
+        return ResponseType(200, {}, body="OK")
+
+    def read_batch(self, request: RequestType) -> Dict[str, Any]:
+        """
+        Decode the body of a batch request, a structured body or JSON without a Content-Type.
+        Raises ValueError for malformed ones.
+        """
+        message = self.read_message(request)
+        if message is None:
+            message = json_wire.loads(request.body)
+            if not isinstance(message, dict):
+                raise ValueError("Request body must be an object")
+        return message
+
+    def batch_error(self, request: RequestType, message: str) -> ResponseType:
+        # Batch endpoints have no legacy clients expecting 404
+        return self.reply(request, {"error": message}, 400)
+
+    async def mget(self, request: RequestType) -> ResponseType:
+        try:
+            keys = self.read_batch(request).get("keys")
+        except ValueError:
+            return self.batch_error(request, "Bad request, invalid body")
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            return self.batch_error(request, "Bad request, keys must be a list of strings")
+        return self.reply(request, await self.async_database.get_many(keys))
+
+    async def mset(self, request: RequestType) -> ResponseType:
+        try:
+            message = self.read_batch(request)
+        except ValueError:
+            return self.batch_error(request, "Bad request, invalid body")
+        items = message.get("items")
+        if not isinstance(items, dict) or not all(isinstance(key, str) for key in items):
+            return self.batch_error(request, "Bad request, items must map string keys to values")
+        try:
+            await self.async_database.set_many(items, message.get("ttl"))
+        except ValueError as error:
+            return self.batch_error(request, f"Bad request, {error}")
+        return ResponseType(200, {}, body="OK")
+
+    async def mdelete(self, request: RequestType) -> ResponseType:
+        try:
+            keys = self.read_batch(request).get("keys")
+        except ValueError:
+            return self.batch_error(request, "Bad request, invalid body")
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            return self.batch_error(request, "Bad request, keys must be a list of strings")
+        await self.async_database.delete_many(keys)
         return ResponseType(200, {}, body="OK")
 
+    async def scan(self, request: RequestType) -> ResponseType:
+        """
+        One page of a key scan. Takes prefix, start, cursor, limit and keys_only from a
+        structured body or the query string, answers {"items": [...], "cursor": ...}.
+        """
+        try:
+            message = self.read_message(request) if request.body else None
+        except ValueError:
+            return self.bad_request(request, "Bad request, invalid body")
+        if message is None:
+            message = dict(request.params)
+            try:
+                message["limit"] = int(message.get("limit", 1000))
+            except ValueError:
+                return self.bad_request(request, "Bad request, limit must be a number")
+            message["keys_only"] = message.get("keys_only", "").lower() in ("1", "true", "yes")
+        prefix, start, cursor = message.get("prefix", ""), message.get("start"), message.get("cursor")
+        limit, keys_only = message.get("limit", 1000), message.get("keys_only", False)
+        if not isinstance(prefix, str) or not all(value is None or isinstance(value, str) for value in (start, cursor)):
+            return self.bad_request(request, "Bad request, prefix, start and cursor must be strings")
+        if not isinstance(limit, int) or not isinstance(keys_only, bool):
+            return self.bad_request(request, "Bad request, invalid limit or keys_only")
+        try:
+            page, cursor = await self.async_database.scan(prefix, start, limit, cursor, keys_only)
+        except ValueError as error:
+            return self.bad_request(request, f"Bad request, {error}")
+        items = page if keys_only else [[key, value] for key, value in page]
+        return self.reply(request, {"items": items, "cursor": cursor})
+
+    async def watch(self, request: RequestType) -> ResponseType:
+        """
+        Stream the changes to a key, or to the keys that start with a prefix, as they are committed.
+        Takes key, prefix and since from a structured body or the query string. since, or a
+        Last-Event-ID header, resumes after the change with that sequence number, by default the
+        stream starts with the changes after the request. Answers newline-delimited JSON,
+        or server-sent events to clients that accept text/event-stream.
+        """
+        try:
+            message = self.read_message(request) if request.body else None
+        except ValueError:
+            return self.bad_request(request, "Bad request, invalid body")
+        if message is None:
+            message = dict(request.params)
+            since = message.get("since") or request.headers.get("Last-Event-ID")
+            try:
+                message["since"] = int(since) if since else None
+            except ValueError:
+                return self.bad_request(request, "Bad request, since must be a number")
+        key, prefix, since = message.get("key"), message.get("prefix", ""), message.get("since")
+        if not isinstance(prefix, str) or not (key is None or isinstance(key, str)):
+            return self.bad_request(request, "Bad request, key and prefix must be strings")
+        if since is not None and (isinstance(since, bool) or not isinstance(since, int) or since < 0):
+            return self.bad_request(request, "Bad request, since must be a sequence number")
+        if not self.database.changelog_size:
+            return self.bad_request(request, "Bad request, the change log is disabled")
+        if since is None:
+            since = await self.async_database.last_change()
+        try:
+            changes, position = await self.async_database.changes(since, prefix, key)
+        except ChangeLogTrimmed as error:
+            return self.reply(request, {"error": str(error)}, 410)
+        event_stream = CONTENT_TYPE_EVENT_STREAM in (request.headers.get("Accept") or "")
+        headers = {"Content-Type": CONTENT_TYPE_EVENT_STREAM if event_stream else CONTENT_TYPE_NDJSON, "Cache-Control": "no-cache"}
+        return ResponseType(200, headers, body=self.stream_changes(since, changes, position, prefix, key, event_stream))
+
+    async def stream_changes(self, since: int, changes: List[Change], position: int, prefix: str, key: Optional[str], event_stream: bool) -> AsyncIterator[bytes]:
+        """
+        The body of a watch response, starting with the changes read up to position.
+        A heartbeat carrying since comes first, so the client can resume before it saw a change,
+        then another one whenever the stream was idle for watch_heartbeat seconds.
+        """
+        signal = self.database.signal
+        # Commits of other processes do not wake the signal, their changes are polled for
+        poll = WATCH_POLL_INTERVAL if self.database.shared else self.watch_heartbeat
+        yield encode_event({"seq": since, "op": EVENT_HEARTBEAT}, event_stream)
+        beat = time.monotonic() + self.watch_heartbeat
+        while not signal.closed:
+            if changes:
+                yield b"".join([encode_event(change.message(), event_stream) for change in changes])
+                beat = time.monotonic() + self.watch_heartbeat
+            else:
+                await signal.wait(position, min(poll, max(beat - time.monotonic(), 0.0)))
+            if time.monotonic() >= beat:
+                yield encode_event({"seq": position, "op": EVENT_HEARTBEAT}, event_stream)
+                beat = time.monotonic() + self.watch_heartbeat
+            try:
+                changes, position = await self.async_database.changes(position, prefix, key)
+            except ChangeLogTrimmed as error:
+                yield encode_event({"op": EVENT_ERROR, "status": 410, "error": str(error)}, event_stream)
+                return
+
+    async def stats(self) -> ResponseType:
+        body = json.dumps({"cache": self.async_database.cache_stats(), "expired": dict(self.database.expired)})
+        return ResponseType(200, {"Content-Type": "application/json"}, body=body.encode("utf-8"))
+
+
+class CloudError(Exception):
+    """
+    Raised by CloudClient when the server rejects a request.
+    """
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
 class CloudClient(AsyncClient):
-    def __init__(self, host: str, port: int) -> None:
-        super().__init__(host, port)
-
-    async def set(self, key: str, value: Any) -> None:
-        obj = AnyCloudObject(value)
-        print(f"Set {key} to {obj.to_string()}")
-        body: str = make_json("{\"key\": \"$0\", \"value\": \"$1\"}", [key, obj.to_string()])
-        print(f"Body: {body}")
-        await super().post(f"/set", body.encode("utf-8"))
-
-    async def get(self, key: str) -> Any:
-        objstr = (await super().get(f"/get?key={key}")).decode("utf-8")
-        print(f"Get {key} from {objstr}")
-        obj = AnyCloudObject(from_string(decode_string(objstr)))
-        return obj.value
-    
+    def __init__(self, host: str, port: int, pool_size: int = 10, timeout: Optional[float] = None, wire: Literal['binary', 'json'] = 'binary') -> None:
+        """
+        Parameters:
+            wire (str): The body format, 'binary' round-trips every value exactly, 'json' is interoperable.
+        """
+        super().__init__(host, port, pool_size, timeout)
+        self.wire: WireFormat = get_wire(wire)
+        self.headers: Dict[str, str] = {"Content-Type": self.wire.content_type, "Accept": self.wire.content_type}
+
+    async def call(self, path: str, message: Dict[str, Any]) -> ResponseType:
+        """
+        POST a structured message and return the response.
+        Raises CloudError for responses other than 200 and 404.
+        """
+        response = await super().request("POST", path, self.wire.dumps(message), self.headers)
+        if response.status_code not in (200, 404):
+            raise CloudError(response.status_code, to_bytes(response.body).decode("utf-8", "replace"))
+        return response
+
+    def load(self, response: ResponseType) -> Any:
+        return self.wire.loads(response.body)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Set the value of a key, which expires after ttl seconds if ttl is given.
+        """
+        logger.debug("Set %s to %r", key, value)
+        await self.call("/set", {"key": key, "value": value} if ttl is None else {"key": key, "value": value, "ttl": ttl})
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get the value of a key, or default if the key does not exist.
+        """
+        response = await self.call("/get", {"key": key})
+        if response.status_code == 404:
+            return default
+        value = self.load(response)["value"]
+        logger.debug("Get %s from %r", key, value)
+        return value
+
     async def delete(self, key: str) -> None:
-        await super().get(f"/delete?key={key}")
-        
\ No newline at end of file
+        await self.call("/delete", {"key": key})
+
+    async def mget(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Get several keys in one round trip. Missing keys are left out of the result.
+        """
+        return self.load(await self.call("/mget", {"keys": list(keys)}))
+
+    async def mset(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        Set several keys in one round trip, which expire after ttl seconds if ttl is given.
+        """
+        await self.call("/mset", {"items": items} if ttl is None else {"items": items, "ttl": ttl})
+
+    async def mdelete(self, keys: Iterable[str]) -> None:
+        """
+        Delete several keys in one round trip.
+        """
+        await self.call("/mdelete", {"keys": list(keys)})
+
+    async def scan(self, prefix: str = "", start: Optional[str] = None, page_size: int = 1000, keys_only: bool = False) -> AsyncIterator[Any]:
+        """
+        Iterate keys in key order, as (key, value) pairs or keys with keys_only.
+        Pages of page_size keys are fetched as the iteration reaches them, so only one is held in memory.
+        """
+        cursor = None
+        while True:
+            response = await self.call("/scan", {"prefix": prefix, "start": start, "cursor": cursor, "limit": page_size, "keys_only": keys_only})
+            if response.status_code != 200:
+                raise CloudError(response.status_code, to_bytes(response.body).decode("utf-8", "replace"))
+            message = self.load(response)
+            for item in message["items"]:
+                yield item if keys_only else tuple(item)
+            cursor = message["cursor"]
+            if cursor is None:
+                return
+
+    async def watch(self, key: Optional[str] = None, prefix: str = "", since: Optional[int] = None, idle_timeout: float = WATCH_IDLE_TIMEOUT) -> AsyncIterator[Change]:
+        """
+        Iterate the changes to a key, or to the keys that start with prefix, as the server commits them.
+        Runs on its own connection, outside the pool. A lost connection is reopened after a short delay
+        and the stream resumes after the last change seen, so no change is missed or repeated.
+        Parameters:
+            key (Optional[str]): Watch this key only.
+            prefix (str): Watch the keys that start with prefix, every key by default.
+            since (Optional[int]): Resume after the change with this sequence number, e.g. Change.seq of
+                an earlier watch. By default the changes after the call are returned.
+            idle_timeout (float): Reconnect after this many seconds without data from the server.
+        Raises CloudError if the server rejects the watch, with status 410 once the changes
+        to resume from are no longer in its change log.
+        """
+        delay = WATCH_RETRY_DELAY
+        while True:
+            connection = AsyncRequest(self.host, self.port, self.pool.timeout)
+            try:
+                response = await connection.stream("POST", "/watch", self.wire.dumps({"key": key, "prefix": prefix, "since": since}), self.headers)
+                if response.status_code != 200:
+                    body = b"".join([data async for data in response.body])
+                    raise CloudError(response.status_code, body.decode("utf-8", "replace"))
+                buffer = b""
+                while True:
+                    try:
+                        data = await asyncio.wait_for(anext(response.body), idle_timeout)
+                    except StopAsyncIteration:
+                        break
+                    lines = (buffer + data).split(b"\n")
+                    buffer = lines.pop()
+                    for line in lines:
+                        if not line:
+                            continue
+                        message = json_wire.loads(line)
+                        if message["op"] == EVENT_ERROR:
+                            raise CloudError(message["status"], message["error"])
+                        since = message["seq"]
+                        delay = WATCH_RETRY_DELAY
+                        if message["op"] != EVENT_HEARTBEAT:
+                            yield Change(message["seq"], message["op"], message.get("key"), message.get("value"))
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, HTTPParseError) as error:
+                logger.debug("Watch connection lost, reconnecting: %r", error)
+            finally:
+                connection._abort()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WATCH_MAX_RETRY_DELAY)
@@ -1,13 +1,14 @@
 from typing import Any, Union
 from abc import ABC
 from .utils import *
+from .codec import *
 
 class CloudObject(ABC):
     """
     CloudObject is an abstract class for all cloud objects.
-    It has a value attribute and two methods: to_string and from_string.
-    to_string converts the value into a string representation.
-    from_string converts the string representation into the value.
+    It has a value attribute and two pairs of methods.
+    to_string and from_string convert the value to and from the legacy text representation.
+    to_bytes and from_bytes convert the value to and from bytes with a codec, binary by default.
     """
     def __init__(self, value: Any) -> None:
         self.value = value
@@ -18,6 +19,12 @@ class CloudObject(ABC):
     def from_string(self, value: str) -> None:
         raise NotImplementedError
 
+    def to_bytes(self, codec: Codec = binary_codec) -> bytes:
+        return codec.encode(self.value)
+
+    def from_bytes(self, value: bytes, codec: Codec = binary_codec) -> None:
+        self.value = codec.decode(value)
+
 
 class PyCloudObject(CloudObject):
     """
@@ -33,7 +40,7 @@ class PyCloudObject(CloudObject):
         return str(self.value)
     
     def from_string(self, value: str) -> None:
-        self.value = eval(value)
+        self.value = text_codec.decode(value)
 
     def __repr__(self) -> str:
         return self.to_string()
@@ -47,17 +54,11 @@ class ClassCloudObject(CloudObject):
         super().__init__(value)
         
     def to_string(self) -> str:
-        _class = self.value.__class__
-        _dict = _class.__dict__
-        return f"{_class.__name__}({_dict})"
+        return text_codec.encode(self.value).decode("utf-8")
 
     def from_string(self, value: str) -> None:
-        _classstr = value.split('(')[0]
-        _dictstr = value.split('(')[1].rstrip(')')
-        _class = eval(f"{_classstr}")
-        _dict = eval(f"{_dictstr}")
-        self.value = _class(**_dict)
-        _class.__dict__ = _dict
+        # Only classes registered with register_class() are instantiated
+        self.value = text_codec.decode(value)
 
     def __repr__(self) -> str:
         return self.to_string()
@@ -79,4 +80,4 @@ class AnyCloudObject(CloudObject):
         raise NotImplementedError
 
     def from_string(self, value: str) -> None:
-        self.value = eval(value)
\ No newline at end of file
+        self.value = text_codec.decode(value)
\ No newline at end of file
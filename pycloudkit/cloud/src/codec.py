@@ -0,0 +1,382 @@
+import ast
+import re
+import struct
+import sys
+from array import array
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+
+FORMAT_VERSION: int = 1
+
+TAG_NONE = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT8 = 0x03
+TAG_INT32 = 0x04
+TAG_INT64 = 0x05
+TAG_BIGINT = 0x06
+TAG_FLOAT = 0x07
+TAG_STR = 0x08
+TAG_BYTES = 0x09
+TAG_BYTEARRAY = 0x0A
+TAG_LIST = 0x0B
+TAG_TUPLE = 0x0C
+TAG_DICT = 0x0D
+TAG_OBJECT = 0x0E
+TAG_INT_LIST = 0x0F
+TAG_FLOAT_LIST = 0x10
+
+# Lists at least this long holding only ints or only floats are stored as packed arrays
+PACKED_LIST_MIN: int = 8
+
+_int32 = struct.Struct("<i")
+_int64 = struct.Struct("<q")
+_float = struct.Struct("<d")
+
+
+class CodecError(ValueError):
+    pass
+
+
+class RegisteredClass:
+    """
+    How instances of a custom class are turned into a state value and back.
+    """
+    __slots__ = ("cls", "name", "to_state", "from_state")
+
+    def __init__(self, cls: type, name: str, to_state: Callable[[Any], Any], from_state: Callable[[Any], Any]) -> None:
+        self.cls = cls
+        self.name = name
+        self.to_state = to_state
+        self.from_state = from_state
+
+
+_classes_by_type: Dict[type, RegisteredClass] = {}
+_classes_by_name: Dict[str, RegisteredClass] = {}
+
+
+def _default_from_state(cls: type) -> Callable[[Any], Any]:
+    def from_state(state: Dict[str, Any]) -> Any:
+        obj = cls.__new__(cls)
+        obj.__dict__.update(state)
+        return obj
+    return from_state
+
+
+def register_class(cls: type, name: Optional[str] = None, to_state: Optional[Callable[[Any], Any]] = None, from_state: Optional[Callable[[Any], Any]] = None) -> type:
+    """
+    Register a custom class so its instances can be stored.
+    Only registered classes are ever instantiated when decoding.
+    Parameters:
+        cls (type): The class to register.
+        name (Optional[str]): The stored name, defaults to "module.QualName".
+        to_state (Optional[Callable]): Turns an instance into an encodable value, defaults to vars().
+        from_state (Optional[Callable]): Turns the decoded value back into an instance,
+            defaults to restoring __dict__ without calling __init__.
+    Can be used as a class decorator.
+    """
+    registered = RegisteredClass(
+        cls,
+        name or f"{cls.__module__}.{cls.__qualname__}",
+        to_state or vars,
+        from_state or _default_from_state(cls),
+    )
+    _classes_by_type[cls] = registered
+    _classes_by_name[registered.name] = registered
+    return cls
+
+
+def registered_class(cls: type) -> Optional[RegisteredClass]:
+    """
+    The registration of a class, None if it is not registered. Subclasses are not looked up.
+    """
+    return _classes_by_type.get(cls)
+
+
+def find_class(name: str) -> RegisteredClass:
+    registered = _classes_by_name.get(name)
+    if registered is None:
+        # Legacy text rows only carry the bare class name
+        matches = [item for item in _classes_by_name.values() if item.cls.__name__ == name]
+        if len(matches) != 1:
+            raise CodecError(f"Class {name} is not registered")
+        registered = matches[0]
+    return registered
+
+
+class Codec(ABC):
+    """
+    Turns stored values into bytes and back.
+    """
+    name: str = ""
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+_big_endian: bool = sys.byteorder == "big"
+_small_ints = [bytes((TAG_INT8, value & 0xFF)) for value in range(-0x80, 0x80)]
+_small_sizes = [bytes((size,)) for size in range(0x80)]
+
+
+def _size_bytes(size: int) -> bytes:
+    """
+    Encode a size as an unsigned LEB128 varint.
+    """
+    if size < 0x80:
+        return _small_sizes[size]
+    out = bytearray()
+    while size >= 0x80:
+        out.append((size & 0x7F) | 0x80)
+        size >>= 7
+    out.append(size)
+    return bytes(out)
+
+
+def _read_size(data: bytes, pos: int) -> Tuple[int, int]:
+    size = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return size, pos
+        shift += 7
+
+
+class BinaryCodec(Codec):
+    """
+    A compact tagged binary format for the types in py_object_union and registered classes.
+    Every value starts with a one byte tag, sizes are unsigned LEB128 varints.
+    The common types are checked first and inline, the codec sits on every read and write.
+    """
+    name = "binary"
+
+    def encode(self, value: Any) -> bytes:
+        out = bytearray((FORMAT_VERSION,))
+        self._encode(value, out)
+        return bytes(out)
+
+    def decode(self, data: bytes) -> Any:
+        if not data or data[0] != FORMAT_VERSION:
+            raise CodecError("Unknown binary format version")
+        data = bytes(data)
+        try:
+            value, pos = self._decode(data, 1)
+        except CodecError:
+            raise
+        except RecursionError:
+            raise CodecError("Value nested too deeply")
+        except (IndexError, struct.error, TypeError, ValueError, OverflowError) as error:
+            # ValueError covers UnicodeDecodeError, TypeError unhashable dict keys and bad object states
+            raise CodecError(f"Truncated or corrupt value: {error}")
+        if pos != len(data):
+            raise CodecError("Trailing bytes after value")
+        return value
+
+    def _encode(self, value: Any, out: bytearray) -> None:
+        kind = type(value)
+        if kind is str:
+            raw = value.encode("utf-8")
+            out.append(TAG_STR)
+            out += _size_bytes(len(raw))
+            out += raw
+        elif kind is int:
+            if -0x80 <= value < 0x80:
+                out += _small_ints[value + 0x80]
+            elif -0x80000000 <= value < 0x80000000:
+                out.append(TAG_INT32)
+                out += _int32.pack(value)
+            elif -0x8000000000000000 <= value < 0x8000000000000000:
+                out.append(TAG_INT64)
+                out += _int64.pack(value)
+            else:
+                raw = value.to_bytes((value.bit_length() + 8) // 8, "little", signed=True)
+                out.append(TAG_BIGINT)
+                out += _size_bytes(len(raw))
+                out += raw
+        elif kind is float:
+            out.append(TAG_FLOAT)
+            out += _float.pack(value)
+        elif kind is bool:
+            out.append(TAG_TRUE if value else TAG_FALSE)
+        elif value is None:
+            out.append(TAG_NONE)
+        elif kind is list or kind is tuple:
+            if kind is list and len(value) >= PACKED_LIST_MIN and self._encode_packed(value, out):
+                return
+            out.append(TAG_LIST if kind is list else TAG_TUPLE)
+            out += _size_bytes(len(value))
+            encode = self._encode
+            for item in value:
+                if type(item) is int and -0x80 <= item < 0x80:
+                    out += _small_ints[item + 0x80]
+                else:
+                    encode(item, out)
+        elif kind is dict:
+            out.append(TAG_DICT)
+            out += _size_bytes(len(value))
+            encode = self._encode
+            for key, item in value.items():
+                encode(key, out)
+                encode(item, out)
+        elif kind is bytes or kind is bytearray:
+            out.append(TAG_BYTES if kind is bytes else TAG_BYTEARRAY)
+            out += _size_bytes(len(value))
+            out += value
+        else:
+            self._encode_other(value, out)
+
+    def _encode_packed(self, value: list, out: bytearray) -> bool:
+        kinds = set(map(type, value))
+        if kinds == {int}:
+            tag, typecode = TAG_INT_LIST, "q"
+        elif kinds == {float}:
+            tag, typecode = TAG_FLOAT_LIST, "d"
+        else:
+            return False
+        try:
+            packed = array(typecode, value)
+        except OverflowError:
+            return False
+        if _big_endian:
+            packed.byteswap()
+        out.append(tag)
+        out += _size_bytes(len(value))
+        out += packed.tobytes()
+        return True
+
+    def _encode_other(self, value: Any, out: bytearray) -> None:
+        registered = _classes_by_type.get(type(value))
+        if registered is not None:
+            out.append(TAG_OBJECT)
+            self._encode(registered.name, out)
+            return self._encode(registered.to_state(value), out)
+        # Subclasses of builtin types are stored as their base type
+        for base in (bool, int, float, str, bytes, bytearray, list, tuple, dict):
+            if isinstance(value, base):
+                return self._encode(base(value), out)
+        raise CodecError(f"Can not encode {type(value).__name__}, register it with register_class()")
+
+    def _decode(self, data: bytes, pos: int) -> Tuple[Any, int]:
+        tag = data[pos]
+        pos += 1
+        if tag == TAG_STR or tag == TAG_BYTES or tag == TAG_BYTEARRAY:
+            size = data[pos]
+            if size < 0x80:
+                pos += 1
+            else:
+                size, pos = _read_size(data, pos)
+            end = pos + size
+            if end > len(data):
+                raise IndexError("value out of range")
+            if tag == TAG_STR:
+                return data[pos:end].decode("utf-8"), end
+            if tag == TAG_BYTES:
+                return data[pos:end], end
+            return bytearray(data[pos:end]), end
+        if tag == TAG_INT8:
+            value = data[pos]
+            return (value - 0x100 if value >= 0x80 else value), pos + 1
+        if tag == TAG_LIST or tag == TAG_TUPLE:
+            size, pos = _read_size(data, pos)
+            items = []
+            append = items.append
+            decode = self._decode
+            for _ in range(size):
+                if data[pos] == TAG_INT8:
+                    item = data[pos + 1]
+                    append(item - 0x100 if item >= 0x80 else item)
+                    pos += 2
+                else:
+                    item, pos = decode(data, pos)
+                    append(item)
+            return (items if tag == TAG_LIST else tuple(items)), pos
+        if tag == TAG_INT_LIST or tag == TAG_FLOAT_LIST:
+            size, pos = _read_size(data, pos)
+            end = pos + size * 8
+            if end > len(data):
+                raise IndexError("array out of range")
+            packed = array("q" if tag == TAG_INT_LIST else "d")
+            packed.frombytes(data[pos:end])
+            if _big_endian:
+                packed.byteswap()
+            return packed.tolist(), end
+        if tag == TAG_DICT:
+            size, pos = _read_size(data, pos)
+            result = {}
+            decode = self._decode
+            for _ in range(size):
+                key, pos = decode(data, pos)
+                result[key], pos = decode(data, pos)
+            return result, pos
+        if tag == TAG_FLOAT:
+            return _float.unpack_from(data, pos)[0], pos + 8
+        if tag == TAG_INT32:
+            return _int32.unpack_from(data, pos)[0], pos + 4
+        if tag == TAG_INT64:
+            return _int64.unpack_from(data, pos)[0], pos + 8
+        if tag == TAG_NONE:
+            return None, pos
+        if tag == TAG_TRUE:
+            return True, pos
+        if tag == TAG_FALSE:
+            return False, pos
+        if tag == TAG_BIGINT:
+            size, pos = _read_size(data, pos)
+            if pos + size > len(data):
+                raise IndexError("bigint out of range")
+            return int.from_bytes(data[pos:pos + size], "little", signed=True), pos + size
+        if tag == TAG_OBJECT:
+            name, pos = self._decode(data, pos)
+            state, pos = self._decode(data, pos)
+            return find_class(name).from_state(state), pos
+        raise CodecError(f"Unknown tag {tag:#x}")
+
+
+_class_text = re.compile(r"^([\w.]+)\((.*)\)$", re.DOTALL)
+# Types whose repr() is a constructor call rather than a literal
+_text_builtins: Dict[str, Callable[[Any], Any]] = {"bytearray": bytearray, "set": set, "frozenset": frozenset}
+
+
+class TextCodec(Codec):
+    """
+    The legacy text format: Python literals, and "ClassName({...})" for custom classes.
+    Decoding never evaluates code, values that are not literals are returned as text.
+    """
+    name = "text"
+
+    def encode(self, value: Any) -> bytes:
+        registered = _classes_by_type.get(type(value))
+        if registered is not None:
+            return f"{registered.cls.__name__}({registered.to_state(value)!r})".encode("utf-8")
+        if hasattr(value, "__dict__") and not callable(value):
+            return f"{type(value).__name__}({vars(value)!r})".encode("utf-8")
+        return repr(value).encode("utf-8")
+
+    def decode(self, data: bytes | str) -> Any:
+        text = data.decode("utf-8") if isinstance(data, (bytes, bytearray)) else data
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            pass
+        match = _class_text.match(text.strip())
+        if match is not None:
+            try:
+                state = ast.literal_eval(match.group(2))
+                if match.group(1) in _text_builtins:
+                    return _text_builtins[match.group(1)](state)
+                return find_class(match.group(1)).from_state(state)
+            except (ValueError, SyntaxError, TypeError):
+                pass
+        return text
+
+
+binary_codec = BinaryCodec()
+text_codec = TextCodec()
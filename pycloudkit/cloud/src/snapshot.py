@@ -0,0 +1,252 @@
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterator, Optional, Tuple
+from .codec import *
+from .cache import MISSING
+
+# File layout: header, records in key order, an index of record offsets, footer.
+#   header  MAGIC, format version (u16), codec name length (u8), codec name
+#   record  kind (u8), key length (u32), value length (u32), expires_at (f64, 0 if the key does not expire), key, value
+#   index   the offset of every record (u64)
+#   footer  record count (u64), index offset (u64), MAGIC
+# All numbers are little endian.
+MAGIC = b"PCKSNAP\x00"
+SNAPSHOT_VERSION: int = 1
+_HEADER = struct.Struct("<8sHB")
+_RECORD = struct.Struct("<BIId")
+_FOOTER = struct.Struct("<QQ8s")
+_OFFSET = struct.Struct("<Q")
+
+# Record kinds: a value encoded by the snapshot codec, or a legacy text row
+KIND_ENCODED = 0
+KIND_TEXT = 1
+
+# Buffer of the snapshot file while it is written
+WRITE_BUFFER: int = 1024 * 1024
+
+# Codecs a snapshot can be decoded with by name
+snapshot_codecs: Dict[str, Codec] = {binary_codec.name: binary_codec, text_codec.name: text_codec}
+
+
+class SnapshotError(ValueError):
+    """
+    Raised for files that are not snapshots, or snapshots that are truncated or corrupt.
+    """
+
+
+class SnapshotWriter:
+    """
+    Writes a snapshot a record at a time. Records must be written in key order.
+    The file is written next to its path and moved there once it is complete,
+    so a snapshot that failed half way never replaces an older one.
+    """
+    def __init__(self, path: str, codec: Codec = binary_codec) -> None:
+        self.path: str = path
+        self.temp_path: str = f"{path}.{os.getpid()}.tmp"
+        self.file = open(self.temp_path, "wb", buffering=WRITE_BUFFER)
+        name = codec.name.encode("utf-8")
+        self.file.write(_HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(name)) + name)
+        self.position: int = _HEADER.size + len(name)
+        # 8 bytes per key, the values are never held in memory
+        self.offsets: array = array("Q")
+
+    def write(self, key: str, stored: bytes | str, expires_at: Optional[float] = None) -> None:
+        """
+        Append a record with a value as stored by CloudDatabase, without decoding it.
+        """
+        encoded_key = key.encode("utf-8")
+        if isinstance(stored, str):
+            kind, stored = KIND_TEXT, stored.encode("utf-8")
+        else:
+            kind = KIND_ENCODED
+        self.offsets.append(self.position)
+        self.file.write(_RECORD.pack(kind, len(encoded_key), len(stored), expires_at or 0.0))
+        self.file.write(encoded_key)
+        self.file.write(stored)
+        self.position += _RECORD.size + len(encoded_key) + len(stored)
+
+    def close(self) -> int:
+        """
+        Write the index, sync the file and move it to its path. Returns the number of records.
+        """
+        offsets = self.offsets
+        if sys.byteorder == "big":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.write(_FOOTER.pack(len(self.offsets), self.position, MAGIC))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+        return len(self.offsets)
+
+    def abort(self) -> None:
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SnapshotReader:
+    """
+    A snapshot file mapped into memory. Opening it only reads the header and the footer,
+    whatever the number of keys. Keys are found by binary search over the index,
+    values are decoded when they are accessed and expired keys are skipped.
+    """
+    def __init__(self, path: str, codec: Optional[Codec] = None) -> None:
+        """
+        Parameters:
+            path (str): The snapshot file.
+            codec (Optional[Codec]): Decodes the values, found by the codec name in the snapshot by default.
+        """
+        self.path: str = path
+        self.file = open(path, "rb")
+        try:
+            size = os.fstat(self.file.fileno()).st_size
+            if size < _HEADER.size + _FOOTER.size:
+                raise SnapshotError(f"{path} is not a snapshot")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.file.close()
+            raise
+        try:
+            magic, version, name_length = _HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotError(f"Unsupported snapshot version {version}")
+            try:
+                self.codec_name: str = self.map[_HEADER.size:_HEADER.size + name_length].decode("utf-8")
+            except UnicodeDecodeError:
+                raise SnapshotError(f"{path} is truncated or corrupt") from None
+            self.records_offset: int = _HEADER.size + name_length
+            self.count, self.index_offset, magic = _FOOTER.unpack_from(self.map, size - _FOOTER.size)
+            if magic != MAGIC or self.index_offset + self.count * _OFFSET.size != size - _FOOTER.size:
+                raise SnapshotError(f"{path} is truncated or corrupt")
+        except BaseException:
+            self.close()
+            raise
+        self.codec: Optional[Codec] = codec or snapshot_codecs.get(self.codec_name)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _offset(self, index: int) -> int:
+        return _OFFSET.unpack_from(self.map, self.index_offset + index * _OFFSET.size)[0]
+
+    def _header(self, offset: int) -> Tuple[int, int, int, float]:
+        """
+        The kind, key length, value length and expires_at of the record at offset.
+        Raises SnapshotError if the record does not lie within the records section.
+        """
+        try:
+            kind, key_length, value_length, expires_at = _RECORD.unpack_from(self.map, offset)
+        except struct.error:
+            raise SnapshotError(f"{self.path} is truncated or corrupt") from None
+        if offset < self.records_offset or offset + _RECORD.size + key_length + value_length > self.index_offset:
+            raise SnapshotError(f"{self.path} is truncated or corrupt")
+        return kind, key_length, value_length, expires_at
+
+    def _key_bytes(self, offset: int) -> bytes:
+        _, key_length, _, _ = self._header(offset)
+        start = offset + _RECORD.size
+        return self.map[start:start + key_length]
+
+    def _record(self, offset: int) -> Tuple[str, bytes | str, Optional[float]]:
+        kind, key_length, value_length, expires_at = self._header(offset)
+        start = offset + _RECORD.size
+        stored = self.map[start + key_length:start + key_length + value_length]
+        try:
+            key = self.map[start:start + key_length].decode("utf-8")
+            if kind == KIND_TEXT:
+                stored = stored.decode("utf-8")
+        except UnicodeDecodeError:
+            raise SnapshotError(f"{self.path} is truncated or corrupt") from None
+        return key, stored, expires_at or None
+
+    def _find(self, key: str) -> Optional[int]:
+        target = key.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_bytes(self._offset(middle)) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            offset = self._offset(low)
+            if self._key_bytes(offset) == target:
+                return offset
+        return None
+
+    def decode(self, stored: bytes | str) -> Any:
+        if isinstance(stored, str):
+            return text_codec.decode(stored)
+        if self.codec is None:
+            raise SnapshotError(f"Unknown snapshot codec {self.codec_name}, pass the codec to decode it")
+        return self.codec.decode(stored)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        offset = self._find(key)
+        if offset is None:
+            return default
+        _, stored, expires_at = self._record(offset)
+        if expires_at is not None and expires_at <= time.time():
+            return default
+        return self.decode(stored)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def records(self) -> Iterator[Tuple[str, bytes | str, Optional[float]]]:
+        """
+        Every (key, stored value, expires_at) in key order, values as they were stored, expired ones included.
+        """
+        for index in range(self.count):
+            yield self._record(self._offset(index))
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Every (key, value) that has not expired, in key order, decoding one value at a time.
+        """
+        now = time.time()
+        for key, stored, expires_at in self.records():
+            if expires_at is None or expires_at > now:
+                yield key, self.decode(stored)
+
+    def keys(self) -> Iterator[str]:
+        now = time.time()
+        for key, _, expires_at in self.records():
+            if expires_at is None or expires_at > now:
+                yield key
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def close(self) -> None:
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
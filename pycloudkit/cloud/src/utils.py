@@ -1,4 +1,6 @@
+import ast
 from typing import Optional, Any, Union
+from .codec import text_codec
 
 py_object_union = Union[str, int, float, bool, list, dict, bytes, bytearray, tuple, None] 
 
@@ -8,23 +10,14 @@ def is_py_object(value: Any) -> bool:
 def is_class_object(value: Any) -> bool:
     return isinstance(value, object) and not is_py_object(value)
 
-def decode_string(value: str) -> str:
-    return value.replace("%22", '"').replace("%27", "'").replace("%20", " ").replace("%5B", "[").replace("%5D", "]").replace("%2C", ",").replace("%3D", "=").replace("%2B", "+").replace("%3A", ":").replace("%3B", ";").replace("%40", "@").replace("%24", "$").replace("%7B", "{").replace("%7D", "}")
-
-def encode_string(value: str) -> str:
-    return value.replace('"', "%22").replace("'", "%27").replace(' ', "%20").replace("[", "%5B").replace("]", "%5D").replace(",", "%2C").replace("=", "%3D").replace("+", "%2B").replace(":", "%3A").replace(";","%3B").replace("@","%40").replace("$","%24").replace("{","%7B").replace("}","%7D")
-
 def from_string(value: str) -> Any:
-    try:
-        return eval(value)
-    except:
-        return value
+    return text_codec.decode(value)
     
 def load_body_json(body: bytes | str) -> Optional[dict]:
     if isinstance(body, bytes):
         body = body.decode('utf-8')
     try:
-        body_json = eval(body)
+        body_json = ast.literal_eval(body)
         if not isinstance(body_json, dict):
             raise ValueError("Invalid JSON")
         return body_json
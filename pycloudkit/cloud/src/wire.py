@@ -0,0 +1,165 @@
+import base64
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from .codec import binary_codec, find_class, registered_class, CodecError
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_BINARY = "application/x-pycloudkit"
+
+
+class WireFormat(ABC):
+    """
+    Encodes request and response messages exchanged by CloudClient and CloudServer.
+    """
+    name: str = ""
+    content_type: str = ""
+
+    @abstractmethod
+    def dumps(self, message: Any) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class BinaryWire(WireFormat):
+    """
+    Messages in the binary codec format, every value round-trips exactly.
+    """
+    name = "binary"
+    content_type = CONTENT_TYPE_BINARY
+
+    def dumps(self, message: Any) -> bytes:
+        return binary_codec.encode(message)
+
+    def loads(self, data: bytes) -> Any:
+        return binary_codec.decode(data)
+
+
+def _to_json(value: Any) -> Any:
+    """
+    Convert a value into JSON types.
+    Types JSON can not express are wrapped in single-key objects whose key starts with "$".
+    """
+    kind = type(value)
+    if kind is str or kind is int or kind is float or kind is bool or value is None:
+        return value
+    if kind is list:
+        return [_to_json(item) for item in value]
+    if kind is dict:
+        if all(type(key) is str and not key.startswith("$") for key in value):
+            return {key: _to_json(item) for key, item in value.items()}
+        return {"$dict": [[_to_json(key), _to_json(item)] for key, item in value.items()]}
+    if kind is tuple:
+        return {"$tuple": [_to_json(item) for item in value]}
+    if kind is bytes:
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    if kind is bytearray:
+        return {"$bytearray": base64.b64encode(value).decode("ascii")}
+    registered = registered_class(kind)
+    if registered is not None:
+        return {"$object": [registered.name, _to_json(registered.to_state(value))]}
+    for base in (bool, int, float, str, bytes, bytearray, list, tuple, dict):
+        if isinstance(value, base):
+            return _to_json(base(value))
+    raise CodecError(f"Can not encode {kind.__name__}, register it with register_class()")
+
+
+def _from_json_object(obj: Dict[str, Any]) -> Any:
+    if len(obj) != 1:
+        return obj
+    key, item = next(iter(obj.items()))
+    if not key.startswith("$"):
+        return obj
+    if key == "$tuple":
+        return tuple(item)
+    if key == "$bytes":
+        return base64.b64decode(item, validate=True)
+    if key == "$bytearray":
+        return bytearray(base64.b64decode(item, validate=True))
+    if key == "$dict":
+        # Tuple keys were already restored by the hook, objects decode inner-first
+        return {pair[0]: pair[1] for pair in item}
+    if key == "$object":
+        return find_class(item[0]).from_state(item[1])
+    return obj
+
+
+class JSONWire(WireFormat):
+    """
+    Messages as standard JSON, decoded in a single json.loads pass.
+    """
+    name = "json"
+    content_type = CONTENT_TYPE_JSON
+
+    def dumps(self, message: Any) -> bytes:
+        return json.dumps(_to_json(message), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        """
+        Raises ValueError, or CodecError for "$" objects of the wrong shape.
+        """
+        try:
+            return json.loads(data, object_hook=_from_json_object)
+        except (TypeError, IndexError, KeyError, AttributeError, RecursionError) as error:
+            raise CodecError(f"Malformed message: {error!r}")
+
+
+binary_wire = BinaryWire()
+json_wire = JSONWire()
+wire_formats: Dict[str, WireFormat] = {
+    CONTENT_TYPE_BINARY: binary_wire,
+    CONTENT_TYPE_JSON: json_wire,
+}
+
+
+def get_wire(name: str) -> WireFormat:
+    """
+    Look up a wire format by name ('binary', 'json') or content type.
+    """
+    for wire in wire_formats.values():
+        if name in (wire.name, wire.content_type):
+            return wire
+    raise ValueError(f"Unknown wire format: {name}")
+
+
+def _media_type(value: str) -> str:
+    return value.split(";", 1)[0].strip().lower()
+
+
+def request_wire(content_type: Optional[str]) -> Optional[WireFormat]:
+    """
+    The wire format of a request body, None for legacy bodies without a known Content-Type.
+    """
+    if not content_type:
+        return None
+    return wire_formats.get(_media_type(content_type))
+
+
+def response_wire(accept: Optional[str]) -> Optional[WireFormat]:
+    """
+    Pick the response format from an Accept header, honouring q-values.
+    Returns None when the client did not ask for a structured format.
+    """
+    if not accept:
+        return None
+    best: Optional[WireFormat] = None
+    best_quality = 0.0
+    for item in accept.split(","):
+        media, _, params = item.partition(";")
+        wire = wire_formats.get(media.strip().lower())
+        if wire is None:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > best_quality:
+            best, best_quality = wire, quality
+    return best
@@ -1,14 +1,39 @@
 from .request import *
+from .pool import ConnectionPool
 
 class AsyncClient:
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(self, host: str, port: int, pool_size: int = 10, timeout: Optional[float] = None) -> None:
+        """
+        Parameters:
+            host (str): The server host.
+            port (int): The server port.
+            pool_size (int): Maximum number of keep-alive connections shared by concurrent calls.
+            timeout (Optional[float]): Connect and read timeout for each request.
+        """
         self.host: str = host
         self.port: int = port
-    
-    async def get(self, path: str) -> ResponseType:
-        async with AsyncRequest(self.host, self.port) as request:
+        self.pool: ConnectionPool = ConnectionPool(host, port, max_size=pool_size, timeout=timeout)
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> ResponseType:
+        """
+        Send a request and return the whole response, including status and headers.
+        """
+        async with self.pool.connection() as request:
+            return await request.request(method, path, body, headers)
+
+    async def get(self, path: str) -> bytes:
+        async with self.pool.connection() as request:
             return await request.get(path)
-        
-    async def post(self, path: str, data: bytes) -> ResponseType:
-        async with AsyncRequest(self.host, self.port) as request:
-            return await request.post(path, data)
\ No newline at end of file
+
+    async def post(self, path: str, data: bytes) -> bytes:
+        async with self.pool.connection() as request:
+            return await request.post(path, data)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
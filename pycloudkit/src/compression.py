@@ -0,0 +1,242 @@
+import asyncio
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from .types import *
+from .utils import to_bytes
+
+ENCODING_GZIP = 'gzip'
+ENCODING_DEFLATE = 'deflate'
+# Preferred first when the client accepts both with the same quality
+ENCODINGS: Tuple[str, ...] = (ENCODING_GZIP, ENCODING_DEFLATE)
+# Smaller bodies are sent as they are, the gain does not pay for the CPU time
+COMPRESSION_MIN_SIZE: int = 1024
+# Level 1 compresses dynamic responses several times faster than the zlib default at a similar ratio
+COMPRESSION_LEVEL: int = 1
+# Content types that are compressed already, or opaque downloads that usually are, matched by prefix
+SKIP_CONTENT_TYPES: Tuple[str, ...] = (
+    'image/', 'video/', 'audio/', 'font/woff', 'text/event-stream', 'application/octet-stream',
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-bzip2', 'application/x-xz',
+    'application/x-7z-compressed', 'application/x-rar-compressed', 'application/vnd.rar', 'application/zstd',
+    'application/x-zstd', 'application/x-lzma', 'application/x-lzip', 'application/x-lz4', 'application/x-compress',
+    'application/java-archive', 'application/pdf',
+)
+# Memory budget of the compressed forms of responses with an ETag
+COMPRESSION_CACHE_SIZE: int = 32 * 1024 * 1024
+# Larger files are sent as they are, with sendfile, instead of being compressed on the event loop
+COMPRESSION_MAX_FILE_SIZE: int = 1024 * 1024
+# Larger bodies are compressed on a thread of the default executor, so the event loop keeps serving
+COMPRESSION_OFFLOAD_SIZE: int = 256 * 1024
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the content coding for an Accept-Encoding header, None for identity.
+    Codings with q=0 are refused, "*" stands for the codings the header does not name.
+    """
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compressobj(encoding: str, level: int = COMPRESSION_LEVEL):
+    # wbits 31 writes a gzip header, 15 the zlib format HTTP calls deflate
+    return zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == ENCODING_GZIP else 15)
+
+
+def compress(data: bytes, encoding: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    stream = _compressobj(encoding, level)
+    return stream.compress(data) + stream.flush()
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """
+    Decode a gzip or deflate body. Other codings are returned as they are.
+    Raises zlib.error for corrupt data.
+    """
+    encoding = encoding.strip().lower()
+    if encoding in (ENCODING_GZIP, 'x-gzip'):
+        return zlib.decompress(data, 31)
+    if encoding == ENCODING_DEFLATE:
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            # Some servers send a raw deflate stream without the zlib wrapper
+            return zlib.decompress(data, -15)
+    return data
+
+
+def _header(headers: Dict[str, str], name: str) -> Optional[str]:
+    # Handlers build plain dicts, header names can be in any case
+    value = headers.get(name)
+    if value is not None:
+        return value
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers: Dict[str, str], *names: str) -> Dict[str, str]:
+    return {key: value for key, value in headers.items() if key.lower() not in names}
+
+
+class CompressionCache:
+    """
+    Compressed response bodies, keyed by path, ETag and coding.
+    Holds the most recently used entries up to max_bytes.
+    """
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_SIZE) -> None:
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+        self.entries: OrderedDict[Tuple[str, str, str], bytes] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            return data
+
+    def put(self, key: Tuple[str, str, str], data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+def _file_size(body: FileBody) -> int:
+    return body.length if body.length is not None else os.stat(body.path).st_size - body.offset
+
+
+class Compressor:
+    """
+    Compresses responses with gzip or deflate, negotiated from the request's Accept-Encoding.
+    Only complete 200 responses with an in-memory or file body are compressed. Bodies below
+    min_size, files above max_file_size, content types in skip_types and responses with a
+    Content-Encoding are sent as they are.
+    Compressed forms of responses with an ETag, e.g. from serve_file or the explorer, are cached.
+    """
+    def __init__(self, min_size: int = COMPRESSION_MIN_SIZE, level: int = COMPRESSION_LEVEL, skip_types: Tuple[str, ...] = SKIP_CONTENT_TYPES, cache_size: int = COMPRESSION_CACHE_SIZE, max_file_size: int = COMPRESSION_MAX_FILE_SIZE, offload_size: int = COMPRESSION_OFFLOAD_SIZE) -> None:
+        """
+        Parameters:
+            min_size (int): Bodies smaller than this many bytes are not compressed.
+            level (int): The zlib compression level, 1 (fast) to 9 (small).
+            skip_types (Tuple[str, ...]): Content type prefixes that are never compressed.
+            cache_size (int): Memory budget of the cached compressed bodies in bytes, 0 disables the cache.
+            max_file_size (int): File bodies larger than this many bytes are not compressed.
+            offload_size (int): compress_async compresses bodies of this many bytes and more off the event loop.
+        """
+        self.min_size: int = min_size
+        self.max_file_size: int = max_file_size
+        self.offload_size: int = offload_size
+        self.level: int = level
+        self.skip_types: Tuple[str, ...] = tuple(skip_types)
+        self.cache: CompressionCache = CompressionCache(cache_size)
+
+    def skipped(self, content_type: Optional[str]) -> bool:
+        return content_type is not None and content_type.lower().startswith(self.skip_types)
+
+    def compress(self, response: ResponseType, request_headers: Dict[str, str], path: str = "") -> ResponseType:
+        """
+        The response to send for a request, compressed if the client accepts it and it pays off.
+        The response passed in is never modified.
+        Parameters:
+            response (ResponseType): The response of the handler.
+            request_headers (Dict[str, str]): The request headers.
+            path (str): The request path, part of the cache key.
+        """
+        body = response.body
+        if response.status_code != 200 or not isinstance(body, (bytes, bytearray, str, FileBody)):
+            return response
+        headers = response.headers
+        if _header(headers, 'content-encoding') is not None or _header(headers, 'content-range') is not None:
+            return response
+        content_type = _header(headers, 'content-type')
+        if self.skipped(content_type):
+            return response
+        if isinstance(body, FileBody):
+            size = _file_size(body)
+        else:
+            size = len(body) if not isinstance(body, str) else len(body.encode('utf-8'))
+        if size < self.min_size or (isinstance(body, FileBody) and size > self.max_file_size):
+            return response
+        vary = _header(headers, 'vary')
+        headers = _without(headers, 'vary')
+        headers['Vary'] = 'Accept-Encoding' if not vary else vary if 'accept-encoding' in vary.lower() else vary + ', Accept-Encoding'
+        encoding = negotiate_encoding(request_headers.get('Accept-Encoding') or '')
+        if encoding is None:
+            return ResponseType(response.status_code, headers, body)
+        etag = _header(headers, 'etag')
+        key = (path, etag, encoding) if etag and self.cache.max_bytes else None
+        data = self.cache.get(key) if key is not None else None
+        if data is None:
+            raw = self.read_file(body, size) if isinstance(body, FileBody) else to_bytes(body)
+            data = compress(raw, encoding, self.level)
+            if len(data) >= len(raw):
+                return ResponseType(response.status_code, headers, body)
+            if key is not None:
+                self.cache.put(key, data)
+        headers = _without(headers, 'content-length', 'accept-ranges', 'etag')
+        headers['Content-Encoding'] = encoding
+        if etag:
+            # The compressed form is a different representation, a weak tag still matches If-None-Match
+            headers['ETag'] = etag if etag.startswith('W/') else 'W/' + etag
+        return ResponseType(response.status_code, headers, data)
+
+    async def compress_async(self, response: ResponseType, request_headers: Dict[str, str], path: str = "") -> ResponseType:
+        """
+        Like compress, for the event loop: bodies of offload_size bytes and more are read
+        and compressed on a thread of the default executor.
+        """
+        body = response.body
+        if response.status_code == 200 and isinstance(body, (bytes, bytearray, str)):
+            offload = len(body) >= self.offload_size
+        elif response.status_code == 200 and isinstance(body, FileBody):
+            offload = _file_size(body) >= self.offload_size
+        else:
+            offload = False
+        if not offload:
+            return self.compress(response, request_headers, path)
+        return await asyncio.get_running_loop().run_in_executor(None, self.compress, response, request_headers, path)
+
+    @staticmethod
+    def read_file(body: FileBody, size: int) -> bytes:
+        with open(body.path, 'rb') as file:
+            file.seek(body.offset)
+            return file.read(size)
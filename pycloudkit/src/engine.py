@@ -0,0 +1,225 @@
+import asyncio
+import os
+import logging
+import socket
+from http import HTTPMethod
+from typing import Dict, List, Optional, Tuple
+from .types import *
+from .protocol import *
+from .request import dispatch
+from .router import Router
+from .compression import Compressor
+
+logger = logging.getLogger(__name__)
+
+ENGINE_ASYNCIO = 'asyncio'
+ENGINE_HTTP_SERVER = 'http.server'
+
+
+class AsyncioEngine:
+    """
+    Serves the compiled routes on a single long-lived event loop
+    using asyncio streams and the in-tree HTTP/1.1 parser.
+    """
+    def __init__(self, host: str, port: int, router: Router, keep_alive_timeout: Optional[float] = 5.0, max_requests: int = 1000, sock: Optional[socket.socket] = None, shutdown_timeout: float = 10.0, compressor: Optional[Compressor] = None, max_body_size: int = MAX_BODY_SIZE) -> None:
+        """
+        Parameters:
+            host (str): The host to bind.
+            port (int): The port to bind.
+            router (Router): The compiled routes.
+            keep_alive_timeout (Optional[float]): Idle seconds before a persistent connection is closed, None to wait forever.
+            max_requests (int): Requests served per connection before it is closed, 0 for no limit.
+            sock (Optional[socket.socket]): An already listening socket to serve instead of binding host and port.
+            shutdown_timeout (float): Seconds requests in progress may take to finish once the engine is stopped.
+            compressor (Optional[Compressor]): Compresses responses for clients that accept it.
+            max_body_size (int): Larger request bodies are answered with 413, 0 for no limit.
+        """
+        self.host: str = host
+        self.port: int = port
+        self.router: Router = router
+        self.keep_alive_timeout: Optional[float] = keep_alive_timeout
+        self.max_requests: int = max_requests
+        self.sock: Optional[socket.socket] = sock
+        self.shutdown_timeout: float = shutdown_timeout
+        self.compressor: Optional[Compressor] = compressor
+        self.max_body_size: int = max_body_size
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._stop_requested: bool = False
+        # Connection tasks, mapped to whether they are in the middle of a request
+        self.connections: Dict[asyncio.Task, bool] = {}
+
+    async def serve(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        if self._stop_requested:
+            return
+        if self.sock is not None:
+            self.server = await asyncio.start_server(self.handle_connection, sock=self.sock)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        async with self.server:
+            await self._stopped.wait()
+            self.server.close()
+            await self.drain()
+
+    async def drain(self) -> None:
+        """
+        Close idle connections and give requests in progress shutdown_timeout seconds to finish.
+        """
+        for task, busy in list(self.connections.items()):
+            if not busy:
+                task.cancel()
+        if self.connections:
+            await asyncio.wait(list(self.connections), timeout=self.shutdown_timeout)
+        for task in list(self.connections):
+            task.cancel()
+
+    def run(self) -> None:
+        asyncio.run(self.serve())
+
+    def stop(self) -> None:
+        """
+        Stop serving. Safe to call from any thread and from signal handlers.
+        """
+        self._stop_requested = True
+        if self.loop is not None and self._stopped is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stopped.set)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve requests from one connection until the client closes it,
+        the idle timeout expires or the per-connection request limit is reached.
+        Pipelined requests are read and answered strictly in order.
+        """
+        served = 0
+        task = asyncio.current_task()
+        self.connections[task] = False
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(read_head(reader), self.keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPParseError as error:
+                    writer.write(serialize_response(error_response(error), keep_alive=False))
+                    await writer.drain()
+                    break
+                if head is None:
+                    break
+                served += 1
+                self.connections[task] = True
+                response, keep_alive = await self.respond(head, reader, writer)
+                if (self.max_requests and served >= self.max_requests) or self._stop_requested:
+                    keep_alive = False
+                head_only = head.method == "HEAD"
+                if is_streaming(response.body):
+                    keep_alive = await self.send_stream(writer, response, keep_alive, head.version, head_only)
+                else:
+                    writer.write(serialize_response(response, keep_alive=keep_alive, head_only=head_only))
+                    await writer.drain()
+                if not keep_alive:
+                    break
+                self.connections[task] = False
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    async def respond(self, head: RequestHead, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Tuple[ResponseType, bool]:
+        """
+        Read the body of a request and produce its response.
+        Returns the response and whether the connection can be kept open.
+        """
+        keep_alive = wants_keep_alive(head)
+        try:
+            if head.headers.get("Expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            body = await read_body(reader, head.headers, self.max_body_size)
+        except HTTPParseError as error:
+            # The stream position is unknown after a framing error
+            return error_response(error), False
+        try:
+            method = HTTPMethod(head.method)
+        except ValueError:
+            return ResponseType(501, {'Content-Type': 'text/plain'}, f"Method {head.method} not implemented".encode("utf-8")), keep_alive
+        try:
+            response = await dispatch(self.router, method, head.target, head.headers, body)
+            if self.compressor is not None:
+                response = await self.compressor.compress_async(response, head.headers, head.target)
+        except Exception:
+            logger.exception("Error handling %s %s", head.method, head.target)
+            return ResponseType(500, {'Content-Type': 'text/plain'}, b"Internal server error"), keep_alive
+        if response.headers.get("Connection", "").lower() == "close":
+            keep_alive = False
+        return response, keep_alive
+
+
+    async def send_stream(self, writer: asyncio.StreamWriter, response: ResponseType, keep_alive: bool, version: str, head_only: bool = False) -> bool:
+        """
+        Send a response whose body is a file or an iterable, a chunk at a time,
+        waiting for the socket to drain between chunks.
+        Only the head is sent for HEAD requests.
+        Returns whether the connection can be kept open.
+        """
+        body = response.body
+        if isinstance(body, FileBody):
+            try:
+                file = open(body.path, "rb")
+            except OSError:
+                logger.exception("Error opening %s", body.path)
+                writer.write(serialize_response(ResponseType(500, {'Content-Type': 'text/plain'}, b"Internal server error"), keep_alive=keep_alive, head_only=head_only))
+                await writer.drain()
+                return keep_alive
+            with file:
+                count = body.length if body.length is not None else max(os.fstat(file.fileno()).st_size - body.offset, 0)
+                writer.write(serialize_head(response, count, keep_alive))
+                await writer.drain()
+                if count and not head_only:
+                    # Uses os.sendfile when the transport supports it, reads the file in chunks otherwise
+                    await self.loop.sendfile(writer.transport, file, body.offset, count)
+            return keep_alive
+        # HTTP/1.0 clients do not understand chunked encoding, the end of the body is the end of the connection
+        chunked = version != "HTTP/1.0"
+        if head_only:
+            writer.write(serialize_head(response, None, keep_alive, chunked))
+            await writer.drain()
+            return keep_alive
+        keep_alive = keep_alive and chunked
+        writer.write(serialize_head(response, None, keep_alive, chunked))
+        try:
+            async for data in iterate_body(body):
+                if data:
+                    writer.write(encode_chunk(data) if chunked else data)
+                    await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception:
+            # The head is already sent, closing without the last chunk marks the body as incomplete
+            logger.exception("Error streaming a response body")
+            return False
+        if chunked:
+            writer.write(LAST_CHUNK)
+        await writer.drain()
+        return keep_alive
+
+
+def error_response(error: HTTPParseError) -> ResponseType:
+    return ResponseType(error.status_code, {'Content-Type': 'text/plain'}, str(error).encode("utf-8"))
+
+
+def wants_keep_alive(head: RequestHead) -> bool:
+    """
+    HTTP/1.1 connections are persistent unless the client asks to close,
+    HTTP/1.0 connections only if the client asks to keep them alive.
+    """
+    connection = head.headers.get("Connection", "").lower()
+    if head.version == "HTTP/1.0":
+        return "keep-alive" in connection
+    return "close" not in connection
@@ -3,9 +3,25 @@ import os
 class FileIsDirectoryError(Exception):
     pass
 
+class PathOutsideRootError(PermissionError):
+    """
+    Raised for a path that resolves outside the root directory it is looked up in.
+    """
+
 def getabsolutepath(path: str, root_path: str = '/') -> str:
     return os.path.join(root_path, path)
 
+def saferealpath(path: str, root_path: str) -> str:
+    """
+    The real path of path under root_path, with ".." segments and symbolic links resolved.
+    Raises PathOutsideRootError if it is not under root_path, e.g. for "../" or an absolute path.
+    """
+    root = os.path.realpath(root_path)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise PathOutsideRootError(f"Path {path} is outside of {root_path}")
+    return resolved
+
 def getcontent(path: str) -> bytes:
     if os.path.isdir(path):
         raise FileIsDirectoryError(f"File {path} is a directory")
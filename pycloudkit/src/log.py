@@ -0,0 +1,23 @@
+import logging
+from typing import Optional, Union
+
+# Every module logs to a child of this logger, e.g. "pycloudkit.src.engine"
+LOGGER_NAME = "pycloudkit"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(process)d] %(message)s"
+
+
+def set_log_level(level: Union[int, str], handler: Optional[logging.Handler] = None) -> logging.Logger:
+    """
+    Set the level of the pycloudkit loggers and make sure their records are printed.
+    Parameters:
+        level (Union[int, str]): A logging level, e.g. logging.DEBUG or "INFO".
+        handler (Optional[logging.Handler]): Where records go, stderr by default.
+            Installed once, later calls only change the level unless a handler is given.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if handler is not None or not logger.handlers:
+        handler = handler if handler is not None else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    return logger
@@ -0,0 +1,251 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from .types import *
+
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from sub-millisecond cache hits to slow requests
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Route label of requests that matched no route
+UNMATCHED = "<unmatched>"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names, rendered in the Prometheus text format.
+    """
+    kind: str = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self.lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def get(self, labels: Labels = ()) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = list(self.values.items())
+        return [f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}" for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, labels: Labels = ()) -> None:
+        self.inc(-amount, labels)
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self.lock:
+            self.values[labels] = value
+
+
+class CallbackGauge(Metric):
+    """
+    A gauge whose values are read from a callback when the metrics are rendered.
+    The callback returns a mapping of label values to values.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Dict[Labels, float]], labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}" for labels, value in self.callback().items()]
+
+
+class CallbackCounter(CallbackGauge):
+    """
+    A counter kept elsewhere, e.g. by a cache, read when the metrics are rendered.
+    """
+    kind = "counter"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # Per label values: the count of every bucket (not cumulative, the last one is +Inf), then sum and count
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def time(self, labels: Labels = ()) -> "Timer":
+        return Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = [(labels, list(entry)) for labels, entry in self.values.items()]
+        lines = []
+        for labels, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                bucket = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, bucket)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {entry[-1]}")
+        return lines
+
+
+class Timer:
+    """
+    Observes the seconds spent in a with block.
+    """
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, self.labels)
+
+
+class MetricsRegistry:
+    """
+    The metrics of one process, rendered together for a /metrics endpoint.
+    Asking twice for the same name returns the same metric.
+    """
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} is already registered as a {existing.kind}")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def callback_gauge(self, name: str, help: str, callback: Callable[[], Dict[Labels, float]], labels: Sequence[str] = ()) -> CallbackGauge:
+        return self.register(CallbackGauge(name, help, callback, labels))
+
+    def callback_counter(self, name: str, help: str, callback: Callable[[], Dict[Labels, float]], labels: Sequence[str] = ()) -> CallbackCounter:
+        return self.register(CallbackCounter(name, help, callback, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def body_size(body: Body) -> int:
+    """
+    The length of a response body, 0 for streamed bodies of unknown length.
+    """
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, FileBody) and body.length is not None:
+        return body.length
+    return 0
+
+
+class RequestMetrics:
+    """
+    Per-route request counts, latencies, requests in progress and bytes in and out.
+    """
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.requests = registry.counter("pycloudkit_requests_total", "Requests served.", ("method", "route", "status"))
+        self.latency = registry.histogram("pycloudkit_request_duration_seconds", "Time spent handling requests.", ("method", "route"))
+        self.in_flight = registry.gauge("pycloudkit_requests_in_flight", "Requests being handled.", ("method", "route"))
+        self.bytes_in = registry.counter("pycloudkit_request_bytes_total", "Request body bytes received.", ("method", "route"))
+        self.bytes_out = registry.counter("pycloudkit_response_bytes_total", "Response body bytes sent.", ("method", "route"))
+
+    def observe(self, labels: Labels, status_code: int, seconds: float, bytes_in: int, bytes_out: int) -> None:
+        self.requests.inc(1, labels + (str(status_code),))
+        self.latency.observe(seconds, labels)
+        if bytes_in:
+            self.bytes_in.inc(bytes_in, labels)
+        if bytes_out:
+            self.bytes_out.inc(bytes_out, labels)
+
+    async def track(self, handler: RequestHandler, request: RequestType) -> ResponseType:
+        """
+        Run a handler and record its request.
+        """
+        labels = (str(handler.method), handler.path)
+        self.in_flight.inc(1, labels)
+        started = time.perf_counter()
+        response: Optional[ResponseType] = None
+        try:
+            response = await handler.handle(request)
+            return response
+        finally:
+            self.in_flight.dec(1, labels)
+            if response is None:
+                self.observe(labels, 500, time.perf_counter() - started, len(request.body), 0)
+            else:
+                self.observe(labels, response.status_code, time.perf_counter() - started, len(request.body), body_size(response.body))
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional
+from .request import AsyncRequest
+
+
+class ConnectionPool:
+    """
+    A bounded pool of keep-alive connections to one server.
+    At most max_size connections are open at a time; callers beyond that wait for a free one.
+    Idle connections are health checked before reuse and dropped after idle_timeout seconds.
+    """
+    def __init__(self, host: str, port: int, max_size: int = 10, idle_timeout: float = 4.0, timeout: Optional[float] = None) -> None:
+        """
+        Parameters:
+            host (str): The server host.
+            port (int): The server port.
+            max_size (int): Maximum number of open connections.
+            idle_timeout (float): Seconds an idle connection is kept, keep it below the server's keep-alive timeout.
+            timeout (Optional[float]): Connect and read timeout for each request.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.host: str = host
+        self.port: int = port
+        self.max_size: int = max_size
+        self.idle_timeout: float = idle_timeout
+        self.timeout: Optional[float] = timeout
+        self.idle: Deque[AsyncRequest] = deque()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    def _check_loop(self) -> None:
+        # Connections and the semaphore belong to the loop they were created on
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            for connection in self.idle:
+                connection._abort()
+            self.idle.clear()
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(self.max_size)
+
+    async def acquire(self) -> AsyncRequest:
+        """
+        Take a healthy idle connection or open a new one.
+        """
+        self._check_loop()
+        await self.semaphore.acquire()
+        now = time.monotonic()
+        while self.idle:
+            connection = self.idle.pop()
+            if connection.is_connected() and now - connection.last_used < self.idle_timeout:
+                return connection
+            connection._abort()
+        return AsyncRequest(self.host, self.port, self.timeout)
+
+    def release(self, connection: AsyncRequest, reusable: bool = True) -> None:
+        """
+        Return a connection to the pool.
+        Connections that are broken, closed by the server or belong to another loop are dropped.
+        """
+        if reusable and connection.is_connected() and connection.loop is self.loop:
+            self.idle.append(connection)
+        else:
+            connection._abort()
+        self.semaphore.release()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncRequest]:
+        connection = await self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, reusable=False)
+            raise
+        self.release(connection)
+
+    async def close(self) -> None:
+        while self.idle:
+            await self.idle.pop().close()
+
+    def __len__(self) -> int:
+        return len(self.idle)
@@ -0,0 +1,311 @@
+import asyncio
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import AsyncIterator, Optional, Tuple
+from .types import *
+from .utils import to_bytes
+
+SERVER_NAME: str = "PyCloudKit"
+# Bytes read at a time from streamed response bodies without chunked framing
+STREAM_READ_SIZE: int = 64 * 1024
+# Largest request body accepted by default, larger ones are answered with 413
+MAX_BODY_SIZE: int = 16 * 1024 * 1024
+
+
+class HTTPParseError(Exception):
+    """
+    Raised when a HTTP message can not be parsed.
+    Carries the status code that should be sent back to the peer.
+    """
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RequestHead:
+    """
+    The request line and headers of a HTTP/1.x request.
+    """
+    __slots__ = ("method", "target", "version", "headers")
+
+    def __init__(self, method: str, target: str, version: str, headers: Headers) -> None:
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+
+    def __str__(self) -> str:
+        return f"RequestHead(method={self.method}, target={self.target}, version={self.version})"
+
+
+def parse_head(data: bytes) -> RequestHead:
+    """
+    Parse a request head (request line + headers, without the final empty line).
+    Parameters:
+        data (bytes): The raw head.
+    """
+    lines = data.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPParseError(400, f"Malformed request line: {lines[0]!r}")
+    if not version.startswith("HTTP/1."):
+        raise HTTPParseError(505, f"Unsupported protocol version: {version}")
+    headers = Headers()
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep or not name or name[-1] in " \t":
+            raise HTTPParseError(400, f"Malformed header line: {line!r}")
+        headers[name] = value.strip()
+    return RequestHead(method, target, version, headers)
+
+
+async def read_head(reader: asyncio.StreamReader) -> Optional[RequestHead]:
+    """
+    Read a request head from the stream.
+    Returns None if the client closed the connection before sending a request.
+    """
+    try:
+        data = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if not error.partial.strip():
+            return None
+        raise HTTPParseError(400, "Incomplete request head")
+    except asyncio.LimitOverrunError:
+        raise HTTPParseError(431, "Request head too large")
+    # RFC 9112 2.2: ignore empty lines received before the request line
+    data = data.lstrip(b"\r\n")
+    if not data:
+        return await read_head(reader)
+    return parse_head(data[:-4])
+
+
+async def read_body(reader: asyncio.StreamReader, headers: Headers, max_size: int = MAX_BODY_SIZE) -> bytes:
+    """
+    Read a request body framed by Content-Length or chunked transfer encoding.
+    Parameters:
+        reader (asyncio.StreamReader): The connection stream.
+        headers (Headers): The request headers.
+        max_size (int): Largest body accepted, 0 for no limit.
+    """
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        return await read_chunked(reader, max_size)
+    size = content_length(headers, max_size)
+    if size is None:
+        return b""
+    try:
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        raise HTTPParseError(400, "Incomplete request body")
+
+
+def content_length(headers: Headers, max_size: int = MAX_BODY_SIZE) -> Optional[int]:
+    """
+    The Content-Length of a request, None if there is none.
+    Raises HTTPParseError for malformed values and bodies larger than max_size.
+    """
+    length = headers.get("Content-Length")
+    if length is None:
+        return None
+    try:
+        size = int(length)
+    except ValueError:
+        raise HTTPParseError(400, f"Invalid Content-Length: {length}")
+    if size < 0:
+        raise HTTPParseError(400, f"Invalid Content-Length: {length}")
+    if max_size and size > max_size:
+        raise HTTPParseError(413, f"Request body larger than {max_size} bytes")
+    return size
+
+
+async def read_chunked(reader: asyncio.StreamReader, max_size: int = 0) -> bytes:
+    chunks = []
+    size = 0
+    async for chunk in iterate_chunked(reader):
+        size += len(chunk)
+        if max_size and size > max_size:
+            raise HTTPParseError(413, f"Request body larger than {max_size} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def iterate_chunked(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """
+    Read a chunked body a chunk at a time as it arrives.
+    """
+    try:
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            size = int(line.split(b";", 1)[0], 16)
+            if size == 0:
+                # Skip trailers
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return
+            yield await reader.readexactly(size)
+            await reader.readexactly(2)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        raise HTTPParseError(400, "Malformed chunked body")
+
+
+async def read_response_head(reader: asyncio.StreamReader) -> Tuple[int, Headers, bool]:
+    """
+    Read the status line and headers of a response.
+    Returns the status code, the headers and whether the server keeps the connection open.
+    """
+    try:
+        data = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPParseError(502, "Response head too large")
+    lines = data[:-4].decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/1."):
+        raise HTTPParseError(502, f"Malformed status line: {lines[0]!r}")
+    version = parts[0]
+    try:
+        status_code = int(parts[1])
+    except ValueError:
+        raise HTTPParseError(502, f"Malformed status line: {lines[0]!r}")
+    headers = Headers()
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name] = value.strip()
+    connection = headers.get("Connection", "").lower()
+    keep_alive = "keep-alive" in connection if version == "HTTP/1.0" else "close" not in connection
+    return status_code, headers, keep_alive
+
+
+def response_has_body(status_code: int, method: str) -> bool:
+    return not (status_code in (204, 304) or 100 <= status_code < 200 or method == "HEAD")
+
+
+async def read_response(reader: asyncio.StreamReader, method: str = "GET") -> Tuple[ResponseType, bool]:
+    """
+    Read a response from the stream.
+    Returns the response and whether the server keeps the connection open.
+    """
+    status_code, headers, keep_alive = await read_response_head(reader)
+    if not response_has_body(status_code, method):
+        body = b""
+    elif "chunked" in headers.get("Transfer-Encoding", "").lower():
+        body = await read_chunked(reader)
+    elif headers.get("Content-Length") is not None:
+        body = await reader.readexactly(int(headers["Content-Length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return ResponseType(status_code, headers, body), keep_alive
+
+
+async def iterate_response_body(reader: asyncio.StreamReader, headers: Headers) -> AsyncIterator[bytes]:
+    """
+    Read a response body a piece at a time as it arrives, e.g. a stream of events.
+    """
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        async for data in iterate_chunked(reader):
+            yield data
+        return
+    length = headers.get("Content-Length")
+    if length is None:
+        # The body ends with the connection
+        while data := await reader.read(STREAM_READ_SIZE):
+            yield data
+        return
+    remaining = int(length)
+    while remaining > 0:
+        data = await reader.read(min(remaining, STREAM_READ_SIZE))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", remaining)
+        remaining -= len(data)
+        yield data
+
+
+_date_cache: Tuple[int, str] = (0, "")
+
+def http_date() -> str:
+    """
+    The current date in IMF-fixdate format, cached for one second.
+    """
+    global _date_cache
+    now = int(time.time())
+    if _date_cache[0] != now:
+        _date_cache = (now, formatdate(now, usegmt=True))
+    return _date_cache[1]
+
+
+def status_line(status_code: int) -> bytes:
+    try:
+        phrase = HTTPStatus(status_code).phrase
+    except ValueError:
+        phrase = ""
+    return f"HTTP/1.1 {status_code} {phrase}\r\n".encode("latin-1")
+
+
+def is_streaming(body: Body) -> bool:
+    """
+    Whether a body is sent from a file or an iterable rather than from memory.
+    """
+    return not isinstance(body, (bytes, bytearray, memoryview, str))
+
+
+def serialize_head(response: ResponseType, content_length: Optional[int], keep_alive: bool = False, chunked: bool = True) -> bytes:
+    """
+    Serialize the status line and headers of a response.
+    Parameters:
+        response (ResponseType): The response.
+        content_length (Optional[int]): The body length, None if it is not known up front.
+        keep_alive (bool): Whether the connection stays open after this response.
+        chunked (bool): Whether a body of unknown length is sent chunked, otherwise it ends with the connection.
+    """
+    lines = [f"Server: {SERVER_NAME}", f"Date: {http_date()}"]
+    for key, value in response.headers.items():
+        lower = key.lower()
+        if lower in ("content-length", "connection", "transfer-encoding", "server", "date"):
+            continue
+        lines.append(f"{key}: {value}")
+    if content_length is None:
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+    elif response.status_code not in (204, 304) and response.status_code >= 200:
+        lines.append(f"Content-Length: {content_length}")
+    lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    return b"".join((status_line(response.status_code), "\r\n".join(lines).encode("latin-1"), b"\r\n\r\n"))
+
+
+def encode_chunk(data: bytes) -> bytes:
+    return b"%x\r\n%s\r\n" % (len(data), data)
+
+
+LAST_CHUNK: bytes = b"0\r\n\r\n"
+
+
+async def iterate_body(body: Body) -> AsyncIterator[bytes]:
+    """
+    Iterate a streaming body, whether it is an iterable or an async iterable.
+    """
+    if hasattr(body, "__aiter__"):
+        async for data in body:
+            yield to_bytes(data)
+    else:
+        for data in body:
+            yield to_bytes(data)
+
+
+def serialize_response(response: ResponseType, keep_alive: bool = False, head_only: bool = False) -> bytes:
+    """
+    Serialize a response with an in-memory body into HTTP/1.1 wire format.
+    The body is framed with Content-Length.
+    Parameters:
+        response (ResponseType): The response to serialize.
+        keep_alive (bool): Whether the connection stays open after this response.
+        head_only (bool): Answer a HEAD request, the Content-Length of the body is sent without the body.
+    """
+    body = to_bytes(response.body)
+    if response.status_code in (204, 304):
+        body = b""
+    head = serialize_head(response, len(body), keep_alive)
+    return head if head_only else head + body
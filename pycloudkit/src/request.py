@@ -1,43 +1,166 @@
 from __future__ import annotations
 import asyncio
-from http.client import HTTPConnection
+import logging
+import os
+import time
+import zlib
 from http.server import BaseHTTPRequestHandler
-from typing import Self, Optional, List, Dict
+from typing import Any, Self, Mapping, Optional, List, Dict
 from .types import *
 from .utils import *
+from .protocol import HTTPParseError, MAX_BODY_SIZE, content_length, read_response, read_response_head, response_has_body, iterate_response_body, is_streaming, iterate_body, encode_chunk, LAST_CHUNK
+from .router import Router, MethodNotAllowed
+from .metrics import UNMATCHED, body_size
+from .compression import Compressor, decompress, ENCODINGS
 
-class AsyncRequest:
+logger = logging.getLogger(__name__)
+
+ACCEPT_ENCODING = "Accept-Encoding: gzip, deflate"
 
-    def __init__(self, host: str, port: int) -> None:
+# Methods that can be sent again after a connection error without repeating a side effect
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+class AsyncRequest:
+    """
+    A persistent HTTP/1.1 connection to a server.
+    Reads and writes go through asyncio streams and never block the event loop.
+    Asks for gzip or deflate responses and decompresses them transparently.
+    """
+    def __init__(self, host: str, port: int, timeout: Optional[float] = None, compression: bool = True) -> None:
         self.host: str = host
         self.port: int = port
-        self.client: Optional[HTTPConnection] = None
+        self.timeout: Optional[float] = timeout
+        self.compression: bool = compression
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.keep_alive: bool = True
+        self.requests: int = 0
+        self.last_used: float = 0.0
 
     async def _start(self) -> None:
-        self.client = HTTPConnection(self.host, self.port)
-        # print(f"Client connected {self.client}")
-        await asyncio.to_thread(self.client.connect)
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        self.loop = asyncio.get_running_loop()
+        self.keep_alive = True
+        self.requests = 0
+        self.last_used = time.monotonic()
 
     async def start(self) -> None:
         await self._start()
 
-    async def get(self, path: str) -> bytes:
-        await asyncio.to_thread(self.client.request, 'GET', encode_uri_params(path))
-        return self.client.getresponse().read()
+    def is_connected(self) -> bool:
+        """
+        Whether the connection can be used for another request.
+        Detects connections closed by the peer and connections opened on another event loop.
+        """
+        if self.writer is None or self.reader is None or not self.keep_alive:
+            return False
+        try:
+            if self.loop is not asyncio.get_running_loop():
+                return False
+        except RuntimeError:
+            return False
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> ResponseType:
+        """
+        Send a request and read the whole response.
+        An idempotent request that fails on a reused connection before any response arrived is retried once on a fresh connection.
+        Other methods are never sent twice, since the first attempt may already have reached the server.
+        """
+        reused = self.is_connected()
+        if not reused:
+            await self._start()
+        try:
+            return await self._request(method, path, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            self._abort()
+            if not reused or method.upper() not in IDEMPOTENT_METHODS or (isinstance(error, asyncio.IncompleteReadError) and error.partial):
+                raise
+        await self._start()
+        return await self._request(method, path, body, headers)
+
+    async def _send(self, method: str, path: str, body: bytes, headers: Optional[Dict[str, str]], compression: bool) -> None:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        if headers:
+            lines.extend(f"{key}: {value}" for key, value in headers.items())
+        if compression and not (headers and any(key.lower() == "accept-encoding" for key in headers)):
+            lines.append(ACCEPT_ENCODING)
+        self.writer.write("\r\n".join(lines).encode("latin-1") + b"\r\n\r\n" + body)
+        await self.writer.drain()
+
+    async def _request(self, method: str, path: str, body: bytes, headers: Optional[Dict[str, str]]) -> ResponseType:
+        await self._send(method, path, body, headers, self.compression)
+        response, self.keep_alive = await asyncio.wait_for(read_response(self.reader, method), self.timeout)
+        self.requests += 1
+        self.last_used = time.monotonic()
+        encoding = response.headers.get("Content-Encoding")
+        if encoding is not None and self.compression and response.body:
+            try:
+                response.body = decompress(response.body, encoding)
+            except zlib.error as error:
+                raise HTTPParseError(502, f"Malformed {encoding} body: {error}")
+            if encoding.strip().lower() in ENCODINGS + ("x-gzip",):
+                del response.headers["Content-Encoding"]
+                response.headers["Content-Length"] = str(len(response.body))
+        return response
+
+    async def stream(self, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> ResponseType:
+        """
+        Send a request and return the response once its head arrived, with the body
+        as an async iterator of bytes read as they arrive, e.g. for long-lived event streams.
+        The body must be read to the end before the connection is used again. It is not decompressed.
+        """
+        if not self.is_connected():
+            await self._start()
+        await self._send(method, path, body, headers, False)
+        status_code, response_headers, self.keep_alive = await asyncio.wait_for(read_response_head(self.reader), self.timeout)
+        self.requests += 1
+        self.last_used = time.monotonic()
+        if response_has_body(status_code, method):
+            return ResponseType(status_code, response_headers, iterate_response_body(self.reader, response_headers))
+        return ResponseType(status_code, response_headers, iterate_body([]))
+
+    async def get(self, path: str, params: Optional[Mapping[str, Any]] = None) -> bytes:
+        """
+        Send a GET request. Characters the target can not carry are percent-encoded,
+        params are encoded with encode_query and appended to its query.
+        """
+        target = encode_target(path)
+        if params:
+            target += ('&' if '?' in target else '?') + encode_query(params)
+        return (await self.request('GET', target)).body
 
     async def post(self, path: str, data: bytes) -> bytes:
-        await asyncio.to_thread(self.client.request, 'POST', path, body=data)
-        return self.client.getresponse().read()
-    
+        return (await self.request('POST', path, data)).body
+
+    def _abort(self) -> None:
+        if self.writer is not None:
+            try:
+                self.writer.transport.abort()
+            except RuntimeError:
+                # The event loop the connection was opened on is already closed
+                pass
+        self.reader = self.writer = None
+
     async def close(self) -> None:
-        await asyncio.to_thread(self.client.close)
+        if self.writer is None:
+            return
+        if not self.is_connected():
+            return self._abort()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        self.reader = self.writer = None
 
     def __enter__(self) -> Self:
-        asyncio.run(self._start())
+        # The connection is opened lazily by the first request, on the loop that makes it
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        asyncio.run(self.close())
+        self._abort()
 
     async def __aenter__(self) -> Self:
         await self._start()
@@ -47,37 +170,70 @@ class AsyncRequest:
         await self.close()
 
 
-def create_async_request_handler(handlers: List[RequestHandler]) -> type[create_async_request_handler.AsyncRequestHandler]:
+def default_response(filename: str) -> ResponseType:
+    return ResponseType(404, {'Content-Type': 'text/plain; charset=utf-8'}, f"Path: {filename} not found".encode("utf-8"))
+
+
+async def dispatch(router: Router, method: HTTPMethod, path: str, headers: Dict[str, str], body: bytes) -> ResponseType:
+    """
+    Find the handler for a request and run it.
+    Parameters:
+        router (Router): The compiled routes.
+        method (HTTPMethod): The request method.
+        path (str): The raw request target, including the query string.
+        headers (Dict[str, str]): The request headers.
+        body (bytes): The request body.
+    """
+    raw_path, params = parse_path(path)
+    filename = decode_uri_component(raw_path)
+    try:
+        handler, path_params = router.resolve(method, raw_path)
+    except MethodNotAllowed as error:
+        handler, response = None, ResponseType(405, {'Content-Type': 'text/plain', 'Allow': ', '.join(error.allowed)}, f"Method {method} not allowed for {filename}".encode("utf-8"))
+    else:
+        response = default_response(filename) if handler is None else None
+    metrics = router.metrics
+    if handler is None:
+        if metrics is not None:
+            metrics.observe((str(method), UNMATCHED), response.status_code, 0.0, len(body), body_size(response.body))
+        return response
+    if path_params:
+        params.update(path_params)
+    request = RequestType(status_code=200, headers=headers, body=body, params=params, path=filename)
+    if metrics is None:
+        return await handler.handle(request=request)
+    return await metrics.track(handler, request)
+
+
+def create_async_request_handler(router: Router, keep_alive_timeout: Optional[float] = None, max_requests: int = 0, compressor: Optional[Compressor] = None, max_body_size: int = MAX_BODY_SIZE) -> type[create_async_request_handler.AsyncRequestHandler]:
+    """
+    Create a BaseHTTPRequestHandler class for the http.server engine.
+    Parameters:
+        router (Router): The compiled routes.
+        keep_alive_timeout (Optional[float]): Idle seconds before a persistent connection is closed.
+        max_requests (int): Requests served per connection before it is closed, 0 for no limit.
+        compressor (Optional[Compressor]): Compresses responses for clients that accept it.
+        max_body_size (int): Larger request bodies are answered with 413, 0 for no limit.
+    """
     class AsyncRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        timeout = keep_alive_timeout
+        # Head and body are written separately, Nagle would hold the body back until the client's delayed ACK
+        disable_nagle_algorithm = True
+
         def __init__(self, request, client_address, server):
             """
             :param request: The request object
             :param client_address: The client address
             :param server: The server object
             """
-            self.__init_handlers(handlers)  # Call the __init__ method of the current class
+            self.router = router
+            self.requests_served = 0
             super().__init__(request, client_address, server)
 
-        def __init_handlers(self, handlers: List[RequestHandler]) -> None:
-            self.handlers = handlers
+        def log_message(self, format: str, *args) -> None:
+            logger.debug("%s - " + format, self.address_string(), *args)
 
-        def handle_default_request(self):
-            filename, _ = parse_path(path=self.path)
-            self.send_response(404)
-            self.send_header('Content-type', 'text/plain')
-            self.send_header("Content-Encoding", "utf-8")
-            self.end_headers()
-            self.wfile.write(f"Path: {filename} not found".encode("utf-8"))
-
-        def get_handler(self, path: str, method: HTTPMethod) -> Optional[RequestHandler]:
-            _any_handler = None
-            for handler in self.handlers:
-                if handler.path == path and handler.method == method:
-                    return handler
-                elif handler.path == 'any' and handler.method == method:
-                    _any_handler = handler
-            return _any_handler
-        
         def send_headers(self, headers: Dict[str, str]) -> None:
             """
             Send the provided headers in the HTTP response.
@@ -97,29 +253,83 @@ def create_async_request_handler(handlers: List[RequestHandler]) -> type[create_
             try:
                 self.wfile.write(body)
             except ConnectionAbortedError:
-                print("Client has closed the connection, skipping response")
+                logger.debug("Client has closed the connection, skipping response")
 
-        async def process_request(self, handler: RequestHandler, request: RequestType) -> None:
-            response: ResponseType = await handler.handle(request=RequestType(status_code=200, headers=self.headers, body=request.body, params=request.params, path=request.path))
-            response.headers["Connection"] = "close"
+        async def process_request(self, response: ResponseType) -> None:
+            self.requests_served += 1
+            if max_requests and self.requests_served >= max_requests:
+                response.headers["Connection"] = "close"
+            if is_streaming(response.body):
+                return await self.process_stream(response)
+            body = to_bytes(response.body)
+            response.headers["Content-Length"] = str(len(body))
             self.send_response(response.status_code)
             self.send_headers(response.headers)
-            self.send_body(to_bytes(response.body))
+            self.send_body(body)
+
+        async def process_stream(self, response: ResponseType) -> None:
+            """
+            Send a file or iterable body without holding it in memory.
+            Files go through socket.sendfile, iterables are sent chunked.
+            """
+            body = response.body
+            try:
+                if isinstance(body, FileBody):
+                    with open(body.path, "rb") as file:
+                        count = body.length if body.length is not None else max(os.fstat(file.fileno()).st_size - body.offset, 0)
+                        response.headers["Content-Length"] = str(count)
+                        self.send_response(response.status_code)
+                        self.send_headers(response.headers)
+                        if count:
+                            self.connection.sendfile(file, body.offset, count)
+                    return
+                chunked = self.request_version != "HTTP/1.0"
+                if chunked:
+                    response.headers["Transfer-Encoding"] = "chunked"
+                else:
+                    response.headers["Connection"] = "close"
+                    self.close_connection = True
+                self.send_response(response.status_code)
+                self.send_headers(response.headers)
+                async for data in iterate_body(body):
+                    if data:
+                        self.wfile.write(encode_chunk(data) if chunked else data)
+                if chunked:
+                    self.wfile.write(LAST_CHUNK)
+            except ConnectionError:
+                self.close_connection = True
+            except Exception:
+                # The head is already sent, closing without the last chunk marks the body as incomplete
+                logger.exception("Error streaming a response body")
+                self.close_connection = True
+
+        def read_body(self) -> bytes:
+            """
+            Read a request body framed by Content-Length, rejecting the same headers as the asyncio engine.
+            """
+            size = content_length(self.headers, max_body_size)
+            if size is None:
+                return b""
+            body = self.rfile.read(size)
+            if len(body) < size:
+                raise HTTPParseError(400, "Incomplete request body")
+            return body
 
         async def handle_request(self, method: HTTPMethod) -> None:
             """
             Handle an HTTP request.
             """
+            try:
+                body = self.read_body()
+            except HTTPParseError as error:
+                # The stream position is unknown after a framing error
+                self.close_connection = True
+                return await self.process_request(ResponseType(error.status_code, {'Content-Type': 'text/plain', 'Connection': 'close'}, str(error).encode("utf-8")))
             # Обрабатываем запрос
-            filename, params = parse_path(path=decode_uri_params(self.path))
-            handler = self.get_handler(filename, method)
-            request = RequestType(status_code=200, headers=self.headers, body=b"", params=params, path=filename)
-            if method == HTTPMethod.POST:
-                request.body = self.rfile.read(int(self.headers['Content-Length']))
-            if handler:
-                return await self.process_request(handler, request)
-            # Отправляем ответ неизвестного запроса
-            self.handle_default_request()
+            response = await dispatch(self.router, method, self.path, self.headers, body)
+            if compressor is not None:
+                response = compressor.compress(response, self.headers, self.path)
+            await self.process_request(response)
 
         def do_GET(self):
             asyncio.run(self.handle_request(HTTPMethod.GET))
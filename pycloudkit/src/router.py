@@ -0,0 +1,169 @@
+import os
+from typing import Dict, List, Optional, Tuple
+from .types import *
+from .metrics import RequestMetrics
+from .utils import decode_uri_component
+
+ANY_PATH = 'any'
+
+
+class MethodNotAllowed(Exception):
+    """
+    Raised when a path is routed but not for the requested method.
+    """
+    def __init__(self, allowed: List[str]) -> None:
+        super().__init__(f"Allowed methods: {', '.join(allowed)}")
+        self.allowed = allowed
+
+
+def split_segments(path: str) -> List[str]:
+    """
+    The segments of a path after its leading "/". A trailing "/" gives a last empty segment.
+    """
+    return (path[1:] if path.startswith("/") else path).split("/")
+
+
+def unsafe_rest(value: str) -> bool:
+    """
+    Whether a {name:path} capture is an absolute path or climbs with "..", which would escape the
+    directory it is joined onto.
+    """
+    parts = value.replace("\\", "/").split("/")
+    return value.startswith(("/", "\\")) or os.path.isabs(value) or ".." in parts
+
+
+class _Node:
+    __slots__ = ("children", "param", "param_name", "rest_name", "rest", "handlers")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _Node] = {}
+        self.param: Optional[_Node] = None
+        self.param_name: str = ""
+        self.rest: Optional[_Node] = None
+        self.rest_name: str = ""
+        self.handlers: Dict[str, RequestHandler] = {}
+
+
+class Router:
+    """
+    Maps (method, path) to handlers, compiled once when the server starts.
+    Static paths are a single dict lookup. Patterns such as "/objects/{key}" live in a
+    segment trie, "{name:path}" matches the rest of the path, possibly empty, but never an absolute
+    path or one with ".." segments. Static segments win over parameters. Trailing slashes are significant.
+    Handlers registered with path 'any' catch requests no other route matches for their method.
+    Middleware hooks are composed into every handler as it is added.
+    With metrics, dispatch() records every request it routes.
+    """
+    def __init__(self, handlers: Optional[List[RequestHandler]] = None, before: Optional[List[BeforeHook]] = None, after: Optional[List[AfterHook]] = None, metrics: Optional[RequestMetrics] = None) -> None:
+        self.before: List[BeforeHook] = list(before or [])
+        self.after: List[AfterHook] = list(after or [])
+        self.metrics: Optional[RequestMetrics] = metrics
+        self.static: Dict[str, Dict[str, RequestHandler]] = {}
+        self.root: _Node = _Node()
+        self.fallback: Dict[str, RequestHandler] = {}
+        for handler in handlers or []:
+            self.add(handler)
+
+    def add(self, handler: RequestHandler) -> None:
+        """
+        Register a handler. The first handler registered for a method and path wins.
+        """
+        method = str(handler.method)
+        handler = handler.with_middleware(self.before, self.after)
+        if handler.path == ANY_PATH:
+            self.fallback.setdefault(method, handler)
+        elif "{" not in handler.path:
+            self.static.setdefault(handler.path, {}).setdefault(method, handler)
+        else:
+            self._node_for(handler.path).handlers.setdefault(method, handler)
+
+    def _node_for(self, pattern: str) -> _Node:
+        node = self.root
+        segments = split_segments(pattern)
+        for index, segment in enumerate(segments):
+            if segment.startswith("{") and segment.endswith("}"):
+                name, _, kind = segment[1:-1].partition(":")
+                if kind == "path":
+                    if index != len(segments) - 1:
+                        raise ValueError(f"{{{name}:path}} must be the last segment of {pattern}")
+                    if node.rest is None:
+                        node.rest, node.rest_name = _Node(), name
+                    elif node.rest_name != name:
+                        raise ValueError(f"Conflicting parameter names in {pattern}")
+                    return node.rest
+                if kind:
+                    raise ValueError(f"Unknown parameter type {kind} in {pattern}")
+                if node.param is None:
+                    node.param, node.param_name = _Node(), name
+                elif node.param_name != name:
+                    raise ValueError(f"Conflicting parameter names in {pattern}")
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+        return node
+
+    def _match(self, node: _Node, segments: List[str], index: int, params: Dict[str, str], method: Optional[str]) -> Optional[_Node]:
+        """
+        The node of the first route matching the segments that has a handler for method, or any handler if method is None.
+        """
+        if index == len(segments):
+            if node.handlers if method is None else method in node.handlers:
+                return node
+            # "/files" matches "/files/{name:path}" with an empty name
+            rest = node.rest
+            if rest is not None and (rest.handlers if method is None else method in rest.handlers):
+                params[node.rest_name] = ""
+                return rest
+            return None
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, params, method)
+            if found is not None:
+                return found
+        if node.param is not None and segment:
+            found = self._match(node.param, segments, index + 1, params, method)
+            if found is not None:
+                params[node.param_name] = segment
+                return found
+        rest = node.rest
+        if rest is not None and (rest.handlers if method is None else method in rest.handlers):
+            value = "/".join(segments[index:])
+            if unsafe_rest(value):
+                return None
+            params[node.rest_name] = value
+            return rest
+        return None
+
+    def resolve(self, method: str, path: str) -> Tuple[Optional[RequestHandler], Dict[str, str]]:
+        """
+        Find the handler for a request and the path parameters it captured.
+        The path is percent-encoded as it came in the request, path parameters are decoded.
+        A static route without a handler for the method does not hide a pattern that has one.
+        Returns (None, {}) if nothing matches, raises MethodNotAllowed if the path
+        is routed for other methods only.
+        """
+        params: Dict[str, str] = {}
+        segments = split_segments(path)
+        if "%" in path:
+            # Segments are decoded one by one, an encoded "/" stays inside its segment
+            segments = [decode_uri_component(segment) for segment in segments]
+            path = None if any("/" in segment for segment in segments) else "/" + "/".join(segments)
+        static = self.static.get(path)
+        if static is not None:
+            handler = static.get(method)
+            if handler is not None:
+                return handler, params
+        node = self._match(self.root, segments, 0, params, method)
+        if node is not None:
+            return node.handlers[method], params
+        handler = self.fallback.get(method)
+        if handler is not None:
+            return handler, {}
+        allowed = set(static or ())
+        node = self._match(self.root, segments, 0, {}, None)
+        if node is not None:
+            allowed.update(node.handlers)
+        if allowed:
+            raise MethodNotAllowed(sorted(allowed))
+        return None, {}
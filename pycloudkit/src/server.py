@@ -1,22 +1,91 @@
 import asyncio
 import http.server
+import logging
+import socket
+import threading
 from http import HTTPMethod
 from typing import Callable, List, Literal, Optional
 from .request import create_async_request_handler, RequestHandler
+from .types import BeforeHook, AfterHook, ResponseType, check_coroutine
+from .router import Router
+from .engine import AsyncioEngine, ENGINE_ASYNCIO, ENGINE_HTTP_SERVER
+from .workers import Supervisor
+from .metrics import CONTENT_TYPE_PROMETHEUS, MetricsRegistry, RequestMetrics
+from .compression import Compressor, COMPRESSION_MIN_SIZE
+from .protocol import MAX_BODY_SIZE
+
+logger = logging.getLogger(__name__)
 
 class AsyncServer:
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(self, host: str, port: int, engine: Literal['asyncio', 'http.server'] = ENGINE_ASYNCIO, keep_alive_timeout: Optional[float] = 5.0, max_requests: int = 1000, workers: int = 1, reuse_port: bool = False, shutdown_timeout: float = 10.0, metrics_path: Optional[str] = "/metrics", compression: bool = True, compression_min_size: int = COMPRESSION_MIN_SIZE, max_body_size: int = MAX_BODY_SIZE) -> None:
+        """
+        Parameters:
+            workers (int): Serve from this many forked worker processes sharing the port, 1 serves in this process.
+            reuse_port (bool): Workers bind their own sockets with SO_REUSEPORT instead of inheriting one.
+            shutdown_timeout (float): Seconds requests in progress get to finish when the server stops.
+            metrics_path (Optional[str]): Where Prometheus metrics are served, None disables them.
+            compression (bool): Compress responses with gzip or deflate for clients that accept it.
+            compression_min_size (int): Smaller response bodies are never compressed.
+            max_body_size (int): Larger request bodies are answered with 413, 0 for no limit.
+        """
+        if engine not in (ENGINE_ASYNCIO, ENGINE_HTTP_SERVER):
+            raise ValueError(f"Unknown engine: {engine}")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
         self.host: str = host
         self.port: int = port
-        self.server: Optional[http.server.HTTPServer] = None
+        self.engine: str = engine
+        self.keep_alive_timeout: Optional[float] = keep_alive_timeout
+        self.max_requests: int = max_requests
+        self.workers: int = workers
+        self.reuse_port: bool = reuse_port
+        self.shutdown_timeout: float = shutdown_timeout
+        self.max_body_size: int = max_body_size
+        self.server: Optional[http.server.HTTPServer | AsyncioEngine | Supervisor] = None
         self.task: Optional[asyncio.Task] = None
         self.handlers: List[RequestHandler] = []
+        self.router: Optional[Router] = None
+        self.before_hooks: List[BeforeHook] = []
+        self.after_hooks: List[AfterHook] = []
+        self.metrics_path: Optional[str] = metrics_path
+        self.metrics: MetricsRegistry = MetricsRegistry()
+        self.request_metrics: Optional[RequestMetrics] = RequestMetrics(self.metrics) if metrics_path is not None else None
+        self.compressor: Optional[Compressor] = Compressor(compression_min_size) if compression else None
+        self.stopped: threading.Event = threading.Event()
+        self._serving_thread: Optional[threading.Thread] = None
         self.__post_init__()
-        print(f'Start server on http://{self.host}:{self.port}')
+        logger.info("Start server on http://%s:%s", self.host, self.port)
 
     def __post_init__(self):
         pass
 
+    def __post_stop__(self):
+        """
+        Called once the server stopped serving, e.g. to flush pending state.
+        With workers, called in every worker and in the supervisor.
+        """
+        pass
+
+    def __pre_stop__(self):
+        """
+        Called when the server is asked to stop, before requests in progress are drained,
+        e.g. to end long-lived streaming responses. With workers, called in every worker too.
+        """
+        pass
+
+    def __pre_fork__(self):
+        """
+        Called in the supervisor before the workers are forked, e.g. to close resources
+        that must not be shared between processes.
+        """
+        pass
+
+    def __post_fork__(self):
+        """
+        Called in every worker process before it starts serving, e.g. to reopen connections.
+        """
+        pass
+
     def route(self, path: str, method: Literal[HTTPMethod.GET, HTTPMethod.POST] = HTTPMethod.GET) -> None:
         def decorator(func: Callable[[RequestHandler], RequestHandler]) -> Callable[[RequestHandler], RequestHandler]:
             handler = RequestHandler(func, method, path)
@@ -31,11 +100,78 @@ class AsyncServer:
             return func
         return decorator
 
+    def before_request(self, func: BeforeHook) -> BeforeHook:
+        """
+        Register a coroutine run before every routed handler, taking the request.
+        Returning a response skips the handler, returning None continues.
+        """
+        check_coroutine(func, (1,), "before_request hook")
+        self.before_hooks.append(func)
+        return func
+
+    def after_request(self, func: AfterHook) -> AfterHook:
+        """
+        Register a coroutine run after every routed handler, taking the request and the response.
+        Returning a response replaces it, returning None keeps it.
+        """
+        check_coroutine(func, (2,), "after_request hook")
+        self.after_hooks.append(func)
+        return func
+
+    async def render_metrics(self) -> ResponseType:
+        """
+        The metrics of this process in the Prometheus text format.
+        With workers, every worker reports its own.
+        """
+        return ResponseType(200, {'Content-Type': CONTENT_TYPE_PROMETHEUS}, self.metrics.render())
+
     def start(self) -> None:
-        self.server = http.server.HTTPServer((self.host, self.port), create_async_request_handler(self.handlers))
+        self.stopped.clear()
+        self._serving_thread = threading.current_thread()
+        # Routes and middleware are compiled once, handlers added after start() are not served
+        handlers = list(self.handlers)
+        if self.metrics_path is not None:
+            # Appended last, so a user route on the same path wins
+            handlers.append(RequestHandler(self.render_metrics, HTTPMethod.GET, self.metrics_path))
+        self.router = Router(handlers, self.before_hooks, self.after_hooks, self.request_metrics)
+        try:
+            if self.workers > 1:
+                self.server = Supervisor(self, self.workers, self.reuse_port, self.shutdown_timeout)
+                self.server.run()
+            else:
+                self.serve()
+        finally:
+            self.__post_stop__()
+            self.stopped.set()
+
+    def serve(self, sock: Optional[socket.socket] = None) -> None:
+        """
+        Serve requests in this process until the server is stopped.
+        Parameters:
+            sock (Optional[socket.socket]): A listening socket to serve, host and port are bound by default.
+        """
+        if self.engine == ENGINE_ASYNCIO:
+            self.server = AsyncioEngine(self.host, self.port, self.router, self.keep_alive_timeout, self.max_requests, sock, self.shutdown_timeout, self.compressor, self.max_body_size)
+            self.server.run()
+            return
+        # Persistent connections would starve other clients on a single thread
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port), create_async_request_handler(self.router, self.keep_alive_timeout, self.max_requests, self.compressor, self.max_body_size), bind_and_activate=sock is None)
+        if sock is not None:
+            self.server.socket.close()
+            self.server.socket = sock
         self.server.serve_forever()
 
-    def stop(self) -> None:
-        self.server.shutdown()
-        self.server.server_close()
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Stop the server and wait until it finished shutting down,
+        unless called from the serving thread itself.
+        """
+        self.__pre_stop__()
+        if isinstance(self.server, (AsyncioEngine, Supervisor)):
+            self.server.stop()
+        else:
+            self.server.shutdown()
+            self.server.server_close()
+        if threading.current_thread() is not self._serving_thread:
+            self.stopped.wait(timeout)
 
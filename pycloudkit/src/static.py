@@ -0,0 +1,115 @@
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from .types import *
+from .filemanager import FileIsDirectoryError, PathOutsideRootError, saferealpath
+
+
+def file_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range against a file size.
+    Returns the (start, end) of the range with an inclusive end, None if it can not be satisfied.
+    Raises ValueError for a malformed or multi-part range, which is answered with the whole file.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(f"Unsupported range: {value}")
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        # A suffix range, the last n bytes
+        length = int(last)
+        if length <= 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start > end and last:
+        raise ValueError(f"Invalid range: {value}")
+    if start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+def not_modified(headers: Dict[str, str], etag: str, mtime: int) -> bool:
+    """
+    Evaluate If-None-Match, or If-Modified-Since when there is no If-None-Match.
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def serve_file(path: str, headers: Optional[Dict[str, str]] = None, content_type: Optional[str] = None) -> ResponseType:
+    """
+    Respond with a file without reading it into memory.
+    Answers conditional GETs (ETag, Last-Modified) with 304 and single byte ranges with 206.
+    Parameters:
+        path (str): The file to serve.
+        headers (Optional[Dict[str, str]]): The request headers.
+        content_type (Optional[str]): The Content-Type, guessed from the file name by default.
+    Raises FileNotFoundError if the file does not exist and FileIsDirectoryError for directories.
+    """
+    st = os.stat(path)
+    if stat.S_ISDIR(st.st_mode):
+        raise FileIsDirectoryError(f"File {path} is a directory")
+    headers = headers if headers is not None else {}
+    etag = file_etag(st)
+    mtime = int(st.st_mtime)
+    last_modified = formatdate(mtime, usegmt=True)
+    response_headers = {
+        'Content-Type': content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Accept-Ranges': 'bytes',
+    }
+    if not_modified(headers, etag, mtime):
+        del response_headers['Content-Type']
+        return ResponseType(304, response_headers, b"")
+    size = st.st_size
+    range_header = headers.get("Range")
+    if_range = headers.get("If-Range")
+    if range_header is not None and size and (if_range is None or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            pass
+        else:
+            if byte_range is None:
+                return ResponseType(416, {'Content-Range': f"bytes */{size}", 'Content-Type': 'text/plain'}, b"Range not satisfiable")
+            start, end = byte_range
+            response_headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+            return ResponseType(206, response_headers, FileBody(path, start, end - start + 1))
+    return ResponseType(200, response_headers, FileBody(path, 0, size))
+
+
+def serve_file_from(root: str, path: str, headers: Optional[Dict[str, str]] = None, content_type: Optional[str] = None) -> ResponseType:
+    """
+    Respond with a file under a root directory, e.g. from a path parameter of the request, see serve_file.
+    Paths that resolve outside the root, through "..", an absolute path or a symbolic link, are answered with 403,
+    missing files and directories with 404.
+    Parameters:
+        root (str): The directory files are served from.
+        path (str): The file, relative to root.
+        headers (Optional[Dict[str, str]]): The request headers.
+        content_type (Optional[str]): The Content-Type, guessed from the file name by default.
+    """
+    try:
+        return serve_file(saferealpath(path, root), headers, content_type)
+    except PathOutsideRootError:
+        return ResponseType(403, {'Content-Type': 'text/plain'}, b"Forbidden")
+    except (FileNotFoundError, NotADirectoryError, FileIsDirectoryError):
+        return ResponseType(404, {'Content-Type': 'text/plain'}, b"File not found")
@@ -1,9 +1,51 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable, Dict
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import copy
 import inspect
 from http import HTTPMethod, HTTPStatus
 
+class Headers(Dict[str, str]):
+    """
+    A case-insensitive header mapping.
+    Header names are stored lowercased.
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__()
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __getitem__(self, key: str) -> str:
+        return super().__getitem__(key.lower())
+
+    def __setitem__(self, key: str, value: str) -> None:
+        super().__setitem__(key.lower(), value)
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key.lower())
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and super().__contains__(key.lower())
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        return super().get(key.lower(), default)
+
+
+@dataclass
+class FileBody:
+    """
+    A response body sent from a file without reading it into memory,
+    with os.sendfile where the platform and the connection allow it.
+    """
+    path: str
+    offset: int = 0
+    length: Optional[int] = None  # None sends the rest of the file
+
+
+# bytes and str are sent with Content-Length, iterables and async iterables of bytes are streamed chunked
+Body = Union[bytes, str, FileBody, Iterable[bytes], AsyncIterable[bytes]]
+
+
 @dataclass
 class ResponseType:
     """
@@ -12,7 +54,7 @@ class ResponseType:
     """
     status_code: int
     headers: Dict[str, str]
-    body: bytes
+    body: Body
     def __str__(self) -> str:
         return f"Response(status_code={self.status_code}, headers={self.headers}, body={self.body})"
 
@@ -27,24 +69,79 @@ class RequestType(ResponseType):
     def __str__(self) -> str:
         return f"Request(status_code={self.status_code}, headers={self.headers}, body={self.body}, params={self.params})"
 
+BeforeHook = Callable[[RequestType], Awaitable[Optional[ResponseType]]]
+AfterHook = Callable[[RequestType, ResponseType], Awaitable[Optional[ResponseType]]]
+
+
+def check_coroutine(func: Callable, counts: Tuple[int, ...], what: str) -> int:
+    """
+    Validate a coroutine function and return its number of parameters.
+    Raises ValueError if func is not a coroutine function or takes a number of parameters not in counts.
+    """
+    if not inspect.iscoroutinefunction(func):
+        raise ValueError(f"{what} must be a coroutine function")
+    count = len(inspect.signature(func).parameters)
+    if count not in counts:
+        raise ValueError(f"{what} must have {' or '.join(map(str, counts))} parameters")
+    return count
+
+
+def compose(call: Callable[[RequestType], Awaitable[ResponseType]], before: List[BeforeHook], after: List[AfterHook]) -> Callable[[RequestType], Awaitable[ResponseType]]:
+    """
+    Wrap a handler call in middleware.
+    Before hooks run in order, the first one returning a response skips the rest and the handler.
+    After hooks run in order on every response and may replace it by returning a new one.
+    """
+    before = tuple(before)
+    after = tuple(after)
+
+    async def chain(request: RequestType) -> ResponseType:
+        for hook in before:
+            response = await hook(request)
+            if response is not None:
+                break
+        else:
+            response = await call(request)
+        for hook in after:
+            replaced = await hook(request, response)
+            if replaced is not None:
+                response = replaced
+        return response
+    return chain
+
+
 class RequestHandler:
     def __init__(self, func: Callable[[RequestType], ResponseType], method: HTTPMethod = HTTPMethod.GET, path: str="/") -> None:
+        """
+        Parameters:
+            func (Callable): A coroutine function taking the request, or no parameters.
+            method (HTTPMethod): The request method.
+            path (str): The routed path.
+        Raises ValueError for an invalid func, the signature is checked once here and not per request.
+        """
         self.func = func
         self.method = method
         self.path = path
+        self.call: Callable[[RequestType], Awaitable[ResponseType]] = self.compile(func)
+
+    @staticmethod
+    def compile(func: Callable) -> Callable[[RequestType], Awaitable[ResponseType]]:
+        if check_coroutine(func, (1, 0), "func") == 1:
+            return func
+
+        async def call(request: RequestType) -> ResponseType:
+            return await func()
+        return call
+
+    def with_middleware(self, before: List[BeforeHook], after: List[AfterHook]) -> "RequestHandler":
+        """
+        A copy of this handler whose call runs the given hooks around it.
+        """
+        if not before and not after:
+            return self
+        handler = copy.copy(self)
+        handler.call = compose(self.call, before, after)
+        return handler
 
-    async def check_signature(self) -> None:
-        if not inspect.iscoroutinefunction(self.func):
-            raise ValueError("func must be a coroutine function")
-        if len(inspect.signature(self.func).parameters) != 1 and len(inspect.signature(self.func).parameters) != 0:
-            raise ValueError("func must have 1 or 0 parameters")
-    
     async def handle(self, request: RequestType) -> ResponseType:
-        await self.check_signature()
-        result = None
-        func_params = inspect.signature(self.func).parameters
-        if len(func_params) == 1:
-            result = await self.func(request)
-        elif len(func_params) == 0:
-            result = await self.func()
-        return result
\ No newline at end of file
+        return await self.call(request)
@@ -1,36 +1,176 @@
-from typing import Dict, List, Optional, Tuple
+import codecs
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
-def encode_uri_params(value: str) -> str:
-    return value.replace('"', "%22").replace("'", "%27").replace(' ', "%20").replace("[", "%5B").replace("]", "%5D").replace(",", "%2C").replace("+", "%2B").replace(":", "%3A").replace(";","%3B").replace("@","%40").replace("$","%24").replace("{","%7B").replace("}","%7D")
+# RFC 3986 unreserved characters, never percent-encoded
+_UNRESERVED = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+_PATH_SAFE = _UNRESERVED + b"/"
+# Characters a request target may carry as they are, "%" keeps escapes that are already there.
+# "+" is encoded, the query decoder reads a bare "+" as a space.
+_TARGET_SAFE = _UNRESERVED + b"!$&'()*,;=:@/?%"
 
-def decode_uri_params(value: str) -> str:
-    return value.replace("%22", '"').replace("%27", "'").replace("%20", " ").replace("%5B", "[").replace("%5D", "]").replace("%2C", ",").replace("%3D", "=").replace("%2B", "+").replace("%3A", ":").replace("%3B", ";").replace("%40", "@").replace("%24", "$").replace("%7B", "{").replace("%7D", "}")
 
-def parse_path(path: str) -> Tuple[str, Dict[str, str]]:
-    filename = path
-    params: Dict[str, str] = {}
-    if '?' in filename:
-        filename, params_str = filename.split('?')
-        params = parse_query_string(params_str)
-    return filename, params
+def _encode_table(safe: bytes) -> Tuple[str, ...]:
+    return tuple(chr(byte) if byte in safe else f"%{byte:02X}" for byte in range(256))
 
-def to_bytes(value: str | bytes) -> bytes:
-    if isinstance(value, str):
-        return value.encode("utf-8")
-    return value
 
-def parse_query_string(query_string: str) -> Dict[str, str]:
-    params: Dict[str, str] = {}
+# Encoded form of every byte, indexed by the byte
+_COMPONENT_TABLE = _encode_table(_UNRESERVED)
+_PATH_TABLE = _encode_table(_PATH_SAFE)
+_TARGET_TABLE = _encode_table(_TARGET_SAFE)
+# The byte of every two digit escape, in either case
+_HEX_BYTES: Dict[bytes, bytes] = {
+    f"{a}{b}".encode(): bytes([int(a + b, 16)]) for a in "0123456789abcdefABCDEF" for b in "0123456789abcdefABCDEF"
+}
+
+
+def _encode(value: str, safe: bytes, table: Tuple[str, ...]) -> str:
+    data = value.encode("utf-8")
+    if not data.translate(None, safe):
+        return value
+    return "".join([table[byte] for byte in data])
+
+
+def encode_uri_component(value: str) -> str:
+    """
+    Percent-encode the UTF-8 bytes of a value, all but the unreserved characters, for a path segment or a query.
+    """
+    return _encode(value, _UNRESERVED, _COMPONENT_TABLE)
+
+
+def encode_path(path: str) -> str:
+    """
+    Percent-encode a path, keeping its "/" separators.
+    """
+    return _encode(path, _PATH_SAFE, _PATH_TABLE)
+
+
+def encode_target(target: str) -> str:
+    """
+    Percent-encode the characters a request target can not carry, e.g. spaces, quotes and non-ASCII text.
+    Delimiters and escapes are left as they are, encoding a target twice does not change it.
+    """
+    return _encode(target, _TARGET_SAFE, _TARGET_TABLE)
+
+
+def decode_uri_component(value: str, plus: bool = False) -> str:
+    """
+    Decode the percent escapes of a value as UTF-8. Malformed escapes are kept as they are,
+    invalid UTF-8 is replaced with U+FFFD.
+    Parameters:
+        value (str): The encoded value.
+        plus (bool): Decode "+" as a space, as in query strings.
+    """
+    if plus and "+" in value:
+        value = value.replace("+", " ")
+    if "%" not in value:
+        return value
+    data = value.encode("utf-8")
+    try:
+        # Every %XX becomes the \xXX escape of a bytes literal and is decoded in C, backslashes are doubled to stay literal
+        data = codecs.escape_decode(data.replace(b"\\", b"\\\\").replace(b"%", b"\\x"))[0]
+    except ValueError:
+        # A malformed escape, kept as it is
+        parts = data.split(b"%")
+        decoded = [parts[0]]
+        for part in parts[1:]:
+            byte = _HEX_BYTES.get(part[:2])
+            if byte is None:
+                decoded.append(b"%" + part)
+            else:
+                decoded.append(byte)
+                decoded.append(part[2:])
+        data = b"".join(decoded)
+    return data.decode("utf-8", "replace")
+
+
+class QueryParams(Dict[str, str]):
+    """
+    Decoded query parameters. Indexing gives the last value of a name,
+    get_all every value of a name given more than once.
+    """
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = ()) -> None:
+        super().__init__()
+        # Only names given more than once, all their values in order
+        self.lists: Dict[str, List[str]] = {}
+        for key, value in pairs:
+            self.add(key, value)
+
+    def add(self, key: str, value: str) -> None:
+        if key in self:
+            self.lists.setdefault(key, [super().__getitem__(key)]).append(value)
+        super().__setitem__(key, value)
+
+    def __setitem__(self, key: str, value: str) -> None:
+        super().__setitem__(key, value)
+        self.lists.pop(key, None)
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.lists.pop(key, None)
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def get_all(self, key: str) -> List[str]:
+        values = self.lists.get(key)
+        if values is not None:
+            return list(values)
+        return [super().__getitem__(key)] if key in self else []
+
+    def pairs(self) -> Iterator[Tuple[str, str]]:
+        """
+        Every (name, value), repeated names once per value.
+        """
+        for key, value in self.items():
+            for item in self.lists.get(key, (value,)):
+                yield key, item
+
+
+def parse_query_string(query_string: str) -> QueryParams:
+    """
+    Decode an application/x-www-form-urlencoded query. Pairs are split on "&" and their first "=",
+    a name without "=" has an empty value and empty pairs are skipped.
+    """
+    params = QueryParams()
     for param in query_string.split('&'):
-        key, value = param.split('=')
-        params[key] = value
+        if not param:
+            continue
+        key, _, value = param.partition('=')
+        params.add(decode_uri_component(key, True), decode_uri_component(value, True))
     return params
 
-def make_json(src: str, params: Optional[List[str]] = None) -> str:
-    if params is None:
-        return src
-    if src.count("$") != len(params):
-        raise Exception("Incorrect number of params")
-    for i in range(len(params)):
-        src = src.replace(f"${i}", params[i])
-    return src
\ No newline at end of file
+
+def encode_query(params: Mapping[str, Any] | Iterable[Tuple[str, Any]]) -> str:
+    """
+    Encode query parameters, parse_query_string decodes them back.
+    Values are converted with str, a list or tuple value gives the name once per item.
+    """
+    if isinstance(params, QueryParams):
+        pairs = params.pairs()
+    elif isinstance(params, Mapping):
+        pairs = params.items()
+    else:
+        pairs = params
+    parts: List[str] = []
+    for key, value in pairs:
+        name = encode_uri_component(str(key))
+        for item in value if isinstance(value, (list, tuple)) else (value,):
+            parts.append(f"{name}={encode_uri_component(item if isinstance(item, str) else str(item))}")
+    return '&'.join(parts)
+
+
+def parse_path(path: str) -> Tuple[str, QueryParams]:
+    """
+    Split a request target on its first "?" into the path and the decoded query parameters.
+    The path is left percent-encoded, its segments are decoded one by one when it is routed,
+    so an encoded "/" never becomes a separator.
+    """
+    filename, _, query = path.partition('?')
+    return filename, parse_query_string(query) if query else QueryParams()
+
+
+def to_bytes(value: str | bytes) -> bytes:
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return value
@@ -0,0 +1,169 @@
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+from .engine import AsyncioEngine
+
+# Workers that exit sooner than this after they started are restarted after this delay
+RESTART_DELAY: float = 1.0
+LISTEN_BACKLOG: int = 1024
+
+logger = logging.getLogger(__name__)
+
+
+class Supervisor:
+    """
+    Serves an AsyncServer from forked worker processes sharing one port,
+    either through a listening socket inherited from the supervisor or through SO_REUSEPORT.
+    Workers that exit are restarted. stop() shuts the workers down gracefully.
+    """
+    def __init__(self, server: Any, workers: int, reuse_port: bool = False, shutdown_timeout: float = 10.0) -> None:
+        """
+        Parameters:
+            server (AsyncServer): The server every worker runs.
+            workers (int): The number of worker processes.
+            reuse_port (bool): Let each worker bind its own socket with SO_REUSEPORT, so the kernel
+                balances connections, instead of sharing one inherited listening socket.
+            shutdown_timeout (float): Seconds workers get to finish requests in progress before they are killed.
+        """
+        if not hasattr(os, "fork"):
+            raise ValueError("Worker processes require os.fork")
+        if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+            raise ValueError("SO_REUSEPORT is not supported on this platform")
+        self.server = server
+        self.workers: int = workers
+        self.reuse_port: bool = reuse_port
+        self.shutdown_timeout: float = shutdown_timeout
+        self.sock: Optional[socket.socket] = None
+        # Running workers, mapped to their start time
+        self.pids: Dict[int, float] = {}
+        self.stopping: threading.Event = threading.Event()
+
+    def run(self) -> None:
+        """
+        Start the workers and supervise them until stop() is called.
+        """
+        if not self.reuse_port:
+            self.sock = socket.create_server((self.server.host, self.server.port), backlog=LISTEN_BACKLOG)
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        self.server.__pre_fork__()
+        try:
+            for _ in range(self.workers):
+                self.spawn()
+            self.supervise()
+        finally:
+            self.terminate()
+            if self.sock is not None:
+                self.sock.close()
+            if previous is not None:
+                signal.signal(signal.SIGTERM, previous)
+
+    def spawn(self) -> None:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # A SIGTERM between fork and the worker installing its handler would run the supervisor's
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker(blocked)
+        self.pids[pid] = time.monotonic()
+        signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+        if self.stopping.is_set():
+            self.kill(pid, signal.SIGTERM)
+
+    def run_worker(self, mask: set) -> None:
+        """
+        The body of a worker process, never returns.
+        """
+        code = 0
+        try:
+            self.pids = {}
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop_worker())
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+            self.server.__post_fork__()
+            sock = self.sock
+            if sock is None:
+                sock = socket.create_server((self.server.host, self.server.port), backlog=LISTEN_BACKLOG, reuse_port=True)
+            try:
+                self.server.serve(sock)
+            finally:
+                self.server.__post_stop__()
+        except BaseException:
+            logger.exception("Worker %s failed", os.getpid())
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def stop_worker(self) -> None:
+        # Not run in the signal handler itself, the hook may need locks the interrupted code holds
+        threading.Thread(target=self.server.__pre_stop__, daemon=True).start()
+        engine = self.server.server
+        if isinstance(engine, AsyncioEngine):
+            engine.stop()
+        elif engine is not None and engine is not self:
+            # shutdown() waits for serve_forever(), which runs on this thread
+            threading.Thread(target=engine.shutdown, daemon=True).start()
+        else:
+            os._exit(0)
+
+    def supervise(self) -> None:
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                return
+            except KeyboardInterrupt:
+                self.stop()
+                continue
+            started = self.pids.pop(pid, None)
+            if started is None or self.stopping.is_set():
+                continue
+            logger.warning("Worker %s exited with code %s, restarting", pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < RESTART_DELAY:
+                self.stopping.wait(RESTART_DELAY)
+            if not self.stopping.is_set():
+                self.spawn()
+
+    def stop(self) -> None:
+        """
+        Ask all workers to finish their requests in progress and exit. Safe to call from any thread.
+        """
+        self.stopping.set()
+        for pid in list(self.pids):
+            self.kill(pid, signal.SIGTERM)
+
+    def terminate(self) -> None:
+        """
+        Stop the workers and wait for them, killing those still running after shutdown_timeout.
+        """
+        self.stop()
+        deadline = time.monotonic() + self.shutdown_timeout + 1.0
+        while self.pids:
+            for pid in list(self.pids):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    self.pids.pop(pid, None)
+            if self.pids and time.monotonic() > deadline:
+                for pid in list(self.pids):
+                    self.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.01)
+
+    @staticmethod
+    def kill(pid: int, signum: int) -> None:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
@@ -1,30 +1,37 @@
-from pycloudkit.src.utils import encode_uri_params
+import logging
+import os
 from ...src.filemanager import *
 from ...src.types import *
+from ...src.static import serve_file
+from .listing import render_listing, listing_etag, parse_page, LISTING_PAGE_SIZE
 
+logger = logging.getLogger(__name__)
 
-def anyhandlerfile(path: str, rootpath: str) -> ResponseType:
-    absolute_path = getabsolutepath(path, rootpath)
-    content: bytes = b''
+
+def anyhandlerfile(path: str, rootpath: str, request: Optional[RequestType] = None, page_size: int = LISTING_PAGE_SIZE) -> ResponseType:
+    """
+    Serve a file, or a listing for a directory.
+    Files are streamed from disk. Pass the request to answer Range and conditional requests
+    and to select a page of large directories with ?page=N.
+    Paths that resolve outside rootpath are answered with 403.
+    """
+    rootpath = os.path.realpath(rootpath)
+    try:
+        absolute_path = saferealpath(path, rootpath)
+    except PathOutsideRootError:
+        logger.debug('Path %s is outside of %s', path, rootpath)
+        return ResponseType(status_code=403, headers={'Content-Type': 'text/plain'}, body=b'Forbidden')
     try:
-        content = getcontent(absolute_path)
-        return ResponseType(status_code=200, headers={'Content-Type': 'application/octet-stream'}, body=content)
-    except FileNotFoundError:
-        print(f'File {absolute_path} not found')
+        return serve_file(absolute_path, request.headers if request is not None else None, 'application/octet-stream')
+    except (FileNotFoundError, NotADirectoryError):
+        logger.debug('File %s not found', absolute_path)
         return ResponseType(status_code=404, headers={'Content-Type': 'text/plain'}, body=b'File not found')
     except FileIsDirectoryError:
-        explorer_html_path = getabsolutepath(os.path.join(os.path.dirname(__file__), 'explorer.html'))
-        content = getcontent(explorer_html_path)
+        page = parse_page(request.params.get('page') if request is not None else None)
         try:
-            files = listfiles(absolute_path)
+            etag = listing_etag(absolute_path, rootpath, page, page_size)
+            content = render_listing(absolute_path, rootpath, page, page_size)
         except PermissionError:
             return ResponseType(status_code=403, headers={'Content-Type': 'text/plain'}, body=b'Permission denied')
-        parent = os.path.dirname(absolute_path)
-        
-        content += f'<button onclick="redirect(\'{encode_uri_params(parent)}\')"><img style="width: 30px; height: 30px; vertical-align: middle" src="https://img.icons8.com/?size=100&id=71cUHRMvCNMk&format=png&color=000000"/>..</button><br/>'.encode()
-        
-        for file in files:
-            content += f'<button onclick="redirect(\'{encode_uri_params(os.path.relpath(os.path.join(absolute_path, file), rootpath)).replace('\\', '/').lstrip(rootpath)}\')"><img style="width: 30px; height: 30px; vertical-align: middle" src="https://img.icons8.com/?size=100&id=71cUHRMvCNMk&format=png&color=000000"/>{os.path.relpath(os.path.join(absolute_path, file), rootpath)}</button><br/>'.encode()
-    return ResponseType(status_code=200, headers={'Content-Type': 'text/html'}, body=content)
-
- 
+    # The ETag lets the server cache the compressed page
+    return ResponseType(status_code=200, headers={'Content-Type': 'text/html', 'ETag': etag}, body=content)
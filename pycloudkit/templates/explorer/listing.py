@@ -0,0 +1,153 @@
+import html
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from ...src.utils import encode_path
+
+# Entries shown per page of a directory listing
+LISTING_PAGE_SIZE: int = 1000
+# Number of directories whose listings are kept in memory
+LISTING_CACHE_SIZE: int = 64
+
+ICON = '<img style="width: 30px; height: 30px; vertical-align: middle" src="https://img.icons8.com/?size=100&id=71cUHRMvCNMk&format=png&color=000000"/>'
+ROW = '<button onclick="redirect(\'{link}\')">' + ICON + '{name}</button><br/>'
+
+
+@lru_cache(maxsize=1)
+def load_template() -> bytes:
+    """
+    The explorer page, read from disk once.
+    """
+    with open(os.path.join(os.path.dirname(__file__), 'explorer.html'), 'rb') as file:
+        return file.read()
+
+
+def render_row(relative: str) -> str:
+    link = encode_path(relative.replace('\\', '/'))
+    return ROW.format(link=html.escape(link), name=html.escape(relative, quote=False))
+
+
+def scan_directory(path: str) -> List[str]:
+    """
+    The entry names of a directory, in directory order.
+    """
+    with os.scandir(path) as entries:
+        return [entry.name for entry in entries]
+
+
+class Listing:
+    """
+    The entries of one directory as of its mtime, with pages rendered on first use.
+    """
+    __slots__ = ("mtime", "names", "pages")
+
+    def __init__(self, mtime: int, names: List[str]) -> None:
+        self.mtime = mtime
+        self.names = names
+        self.pages: Dict[Tuple[str, int, int], str] = {}
+
+
+class ListingCache:
+    """
+    Directory listings, keyed by directory and invalidated when the directory mtime changes.
+    Holds the most recently used max_size directories.
+    """
+    def __init__(self, max_size: int = LISTING_CACHE_SIZE) -> None:
+        self.max_size: int = max_size
+        self.entries: OrderedDict[str, Listing] = OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+    def get(self, path: str) -> Listing:
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            listing = self.entries.get(path)
+            if listing is not None and listing.mtime == mtime:
+                self.entries.move_to_end(path)
+                return listing
+        listing = Listing(mtime, scan_directory(path))
+        with self.lock:
+            self.entries[path] = listing
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return listing
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+listing_cache = ListingCache()
+
+
+def page_count(listing: Listing, page_size: int) -> int:
+    return max((len(listing.names) + page_size - 1) // page_size, 1)
+
+
+def render_page(listing: Listing, path: str, rootpath: str, page: int, page_size: int) -> str:
+    key = (rootpath, page, page_size)
+    rendered = listing.pages.get(key)
+    if rendered is None:
+        names = listing.names[(page - 1) * page_size:page * page_size]
+        # Entry paths are shown relative to rootpath
+        prefix = os.path.relpath(path, rootpath)
+        if prefix != os.curdir:
+            names = [os.path.join(prefix, name) for name in names]
+        rendered = listing.pages[key] = ''.join(map(render_row, names))
+    return rendered
+
+
+def render_listing(path: str, rootpath: str, page: int = 1, page_size: int = LISTING_PAGE_SIZE) -> bytes:
+    """
+    Render one page of a directory listing in a single join.
+    Parameters:
+        path (str): The absolute directory path.
+        rootpath (str): The root the explorer serves, links are relative to it.
+        page (int): The 1-based page number.
+        page_size (int): Entries per page.
+    Raises PermissionError if the directory can not be read.
+    """
+    path = os.path.normpath(path)
+    listing = listing_cache.get(path)
+    pages = page_count(listing, page_size)
+    page = min(max(page, 1), pages)
+    # The root links to itself, never above it
+    parent = os.curdir if path == os.path.normpath(rootpath) else os.path.relpath(os.path.dirname(path), rootpath)
+    parts = [
+        ROW.format(link=html.escape(encode_path('' if parent == os.curdir else parent.replace('\\', '/'))), name='..'),
+        render_page(listing, path, rootpath, page, page_size),
+    ]
+    if pages > 1:
+        parts.append(render_pager(page, pages))
+    return load_template() + ''.join(parts).encode()
+
+
+def listing_etag(path: str, rootpath: str, page: int = 1, page_size: int = LISTING_PAGE_SIZE) -> str:
+    """
+    The ETag of a listing page, it changes with the directory. Take it before rendering the page,
+    so a page rendered after a change is never cached under the tag of the old directory.
+    """
+    listing = listing_cache.get(os.path.normpath(path))
+    # Out of range pages are rendered as the first or last page and get its tag
+    page = min(max(page, 1), page_count(listing, page_size))
+    return f'"{listing.mtime:x}-{page:x}-{page_size:x}-{zlib.crc32(rootpath.encode()):x}"'
+
+
+def render_pager(page: int, pages: int) -> str:
+    links = []
+    if page > 1:
+        links.append(f'<a href="?page={page - 1}">Previous</a>')
+    links.append(f'<span>Page {page} of {pages}</span>')
+    if page < pages:
+        links.append(f'<a href="?page={page + 1}">Next</a>')
+    return '<div>' + ' '.join(links) + '</div>'
+
+
+def parse_page(value: Optional[str]) -> int:
+    try:
+        return int(value) if value else 1
+    except ValueError:
+        return 1
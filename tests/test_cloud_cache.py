@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import AsyncCloudDatabase, CloudDatabase, Encoded
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = CloudDatabase(str(tmp_path / "cloud.db"))
+    yield database
+    database.close()
+
+
+def stored(database: CloudDatabase, key: str):
+    row = database.database.execute("SELECT value FROM objects WHERE key = ?", (key,)).fetchone()
+    return database.decode(row[0])
+
+
+def test_changing_a_set_value_does_not_change_reads(database):
+    value = [1]
+    database.set("k", value)
+    value.append(2)
+    assert database.get("k") == [1]
+    database.get("k").append(99)
+    assert database.get("k") == [1] == stored(database, "k")
+
+
+def test_changing_set_many_values_does_not_change_reads(database):
+    items = {"a": {"n": 1}, "b": [1]}
+    database.set_many(items, ttl=60)
+    items["a"]["n"] = 2
+    items["b"].append(2)
+    assert database.get_many(["a", "b"]) == {"a": {"n": 1}, "b": [1]}
+
+
+def test_values_read_from_sqlite_are_not_shared(database):
+    database.set("k", {"tags": ["a"]})
+    database.cache.clear()
+    database.get("k")["tags"].append("b")
+    database.get_many(["k"])["k"]["tags"].append("c")
+    assert database.get("k") == {"tags": ["a"]}
+
+
+def test_loaded_values_are_not_shared(database):
+    database.set("k", [1])
+    database.cache.clear()
+    database.load()
+    database.get("k").append(2)
+    assert database.get("k") == [1]
+
+
+def test_immutable_values_are_cached_decoded(database):
+    database.set("s", "text")
+    database.set("i", 7)
+    assert database.get("s") == "text" and database.get("i") == 7
+    assert database.cache.get("s") == "text"
+
+
+def test_async_reads_are_not_shared(database):
+    async def run():
+        async_database = AsyncCloudDatabase(database, readers=2)
+        try:
+            value = [1]
+            await async_database.set("k", value)
+            value.append(2)
+            (await async_database.get("k")).append(3)
+            database.cache.clear()
+            (await async_database.get("k")).append(4)
+            # Read on a reader connection, which caches the stored form
+            assert type(database.cache.get("k")) is Encoded
+            return await async_database.get("k")
+        finally:
+            async_database.close()
+
+    assert asyncio.run(run()) == [1]
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import CloudServer
+from pycloudkit.cloud.src.wire import CONTENT_TYPE_JSON
+from pycloudkit.src.request import dispatch
+from pycloudkit.src.router import Router
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = CloudServer("127.0.0.1", 0, str(tmp_path / "cloud.db"), metrics_path=None)
+    yield server
+    server.async_database.close()
+    server.database.close()
+
+
+def call(server: CloudServer, method: str, target: str, body: bytes = b"", headers=None):
+    async def run():
+        return await dispatch(Router(server.handlers), method, target, headers or {}, body)
+
+    return asyncio.run(run())
+
+
+def post(server: CloudServer, path: str, message, content_type: str = CONTENT_TYPE_JSON):
+    body = message if isinstance(message, bytes) else json.dumps(message).encode()
+    return call(server, "POST", path, body, {"Content-Type": content_type} if content_type else {})
+
+
+def test_batch_round_trip(server):
+    assert post(server, "/mset", {"items": {"a": 1, "b": [2, 3]}}).status_code == 200
+    response = post(server, "/mget", {"keys": ["a", "b", "c"]})
+    assert response.status_code == 200 and json.loads(response.body) == {"a": 1, "b": [2, 3]}
+    assert post(server, "/mdelete", {"keys": ["a"]}).status_code == 200
+    assert json.loads(post(server, "/mget", {"keys": ["a", "b"]}).body) == {"b": [2, 3]}
+
+
+@pytest.mark.parametrize("path, message", [
+    ("/mget", {"keys": [[1], 2]}),
+    ("/mget", {"keys": "a"}),
+    ("/mget", {}),
+    ("/mdelete", {"keys": [1]}),
+    ("/mdelete", {"keys": {"a": 1}}),
+    ("/mset", {"items": {"$dict": [[1, 2]]}}),
+    ("/mset", {"items": [["a", 1]]}),
+    ("/mset", {"items": {"a": 1}, "ttl": -1}),
+    ("/mget", [1, 2]),
+    ("/mget", b"not json"),
+])
+@pytest.mark.parametrize("content_type", [CONTENT_TYPE_JSON, None])
+def test_batch_requests_are_validated(server, path, message, content_type):
+    response = post(server, path, message, content_type)
+    assert response.status_code == 400
+    assert "error" in json.loads(response.body)
+    assert server.database.database.execute("SELECT COUNT(*) FROM objects").fetchone() == (0,)
+
+
+@pytest.mark.parametrize("path", ["/get", "/set", "/mget"])
+def test_malformed_structured_bodies(server, path):
+    assert post(server, path, b'{"key": {"$dict": [[[1], 2]]}, "keys": {"$tuple": 1}}').status_code == 400
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/get", b"not a literal"),
+    ("/get", b"[1, 2]"),
+    ("/set", b"{'key': 'a'"),
+    ("/set", b"{'key': 'a', 'value': 1}"),
+])
+def test_malformed_legacy_bodies(server, path, body):
+    assert post(server, path, body, None).status_code == 400
+
+
+def test_legacy_bodies(server):
+    assert post(server, "/set", b"{'key': 'a', 'value': '[1, 2]'}", None).status_code == 200
+    assert post(server, "/get", b"{'key': 'a'}", None).body == b"[1, 2]"
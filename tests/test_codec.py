@@ -0,0 +1,69 @@
+import pytest
+
+from pycloudkit.cloud.src.codec import (TAG_DICT, TAG_INT8, TAG_INT32, TAG_LIST, TAG_OBJECT, TAG_STR, CodecError, binary_codec,
+                                        register_class, text_codec)
+
+
+class Vector:
+    def __init__(self, x: float, y: float) -> None:
+        self.x = x
+        self.y = y
+
+    def __eq__(self, other) -> bool:
+        return type(other) is Vector and vars(self) == vars(other)
+
+
+register_class(Vector, "tests.Vector")
+
+
+VALUES = [
+    None, True, False, 0, -1, 127, -128, 128, 2 ** 31, -(2 ** 63), 2 ** 64, -(2 ** 100), 1.5, float("inf"),
+    "", "text", "ünïcødé" * 50, b"", b"\x00\xff", bytearray(b"ab"),
+    [], [1, "a", None], list(range(20)), [0.5] * 10, [2 ** 70] * 10, (1, (2, 3)),
+    {}, {"a": 1, "b": [1, 2]}, {1: "int key", (1, 2): "tuple key", None: b""},
+    Vector(1.0, 2.0), {"nested": [Vector(0, 0), {"v": Vector(1, 1)}]},
+]
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_binary_round_trip(value):
+    decoded = binary_codec.decode(binary_codec.encode(value))
+    assert decoded == value and type(decoded) is type(value)
+
+
+def test_packed_lists_round_trip():
+    assert binary_codec.decode(binary_codec.encode([1, 2] * 10)) == [1, 2] * 10
+    assert binary_codec.decode(binary_codec.encode([0.25] * 9)) == [0.25] * 9
+
+
+def test_text_round_trip():
+    for value in (1, "a", [1, (2, 3)], {"a": b"x"}, Vector(1.0, 2.0)):
+        assert text_codec.decode(text_codec.encode(value)) == value
+
+
+def corrupt_inputs():
+    valid = binary_codec.encode({"a": [1, 2 ** 40, "x" * 200, Vector(1, 2)]})
+    yield from (valid[:end] for end in range(1, len(valid)))
+    yield valid + b"\x00"
+    yield b""
+    yield b"\x63\x00"
+    yield bytes((1, 0xFF))
+    yield bytes((1, TAG_STR, 2, 0xFF, 0xFE))
+    # An unhashable dict key
+    yield bytes((1, TAG_DICT, 1, TAG_LIST, 0, TAG_INT32)) + b"\x00" * 4
+    # An object whose class name is not a string, and one that is not registered
+    yield bytes((1, TAG_OBJECT, TAG_LIST, 0, TAG_LIST, 0))
+    yield bytes((1, TAG_OBJECT, TAG_STR, 1)) + b"X" + bytes((TAG_DICT, 0))
+    # An object state that is not a dict
+    yield bytes((1, TAG_OBJECT, TAG_STR, 12)) + b"tests.Vector" + bytes((TAG_LIST, 1, TAG_INT8, 5))
+
+
+@pytest.mark.parametrize("data", list(corrupt_inputs()))
+def test_binary_rejects_corrupt_input(data):
+    with pytest.raises(CodecError):
+        binary_codec.decode(data)
+
+
+def test_binary_rejects_deep_nesting():
+    with pytest.raises(CodecError):
+        binary_codec.decode(bytes((1,)) + bytes((TAG_LIST, 1)) * 100000 + bytes((TAG_LIST, 0)))
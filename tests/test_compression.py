@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from pycloudkit.src.compression import Compressor, decompress
+from pycloudkit.src.static import serve_file
+from pycloudkit.src.types import FileBody, ResponseType
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture
+def compressor():
+    return Compressor()
+
+
+def test_compresses_text(compressor):
+    body = b"hello world " * 1000
+    response = compressor.compress(ResponseType(200, {"Content-Type": "text/plain"}, body), GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert decompress(response.body, "gzip") == body
+
+
+def test_compresses_small_text_files(compressor, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"text " * 2000)
+    response = compressor.compress(serve_file(str(path)), GZIP, "/a.txt")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert decompress(response.body, "gzip") == path.read_bytes()
+
+
+@pytest.mark.parametrize("content_type", ["application/octet-stream", "application/x-zstd", "application/vnd.rar", "image/png"])
+def test_skips_compressed_and_opaque_types(compressor, content_type):
+    response = ResponseType(200, {"Content-Type": content_type}, b"x" * 4096)
+    assert compressor.compress(response, GZIP) is response
+
+
+def test_large_files_are_sent_as_they_are(compressor, tmp_path):
+    path = tmp_path / "large.txt"
+    path.write_bytes(b"a" * (compressor.max_file_size + 1))
+    response = serve_file(str(path))
+    assert compressor.compress(response, GZIP, "/large.txt") is response
+    assert isinstance(response.body, FileBody)
+
+
+def test_downloads_keep_sendfile(compressor, tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(os.urandom(3 * 1024 * 1024))
+    response = serve_file(str(path), content_type="application/octet-stream")
+    assert compressor.compress(response, GZIP, "/data.bin") is response
+
+
+def test_large_bodies_are_compressed_off_the_event_loop(monkeypatch):
+    compressor = Compressor(offload_size=4096)
+    threads = []
+    compress = compressor.compress
+
+    def record(*args):
+        threads.append(threading.current_thread())
+        return compress(*args)
+
+    monkeypatch.setattr(compressor, "compress", record)
+
+    async def run():
+        small = await compressor.compress_async(ResponseType(200, {}, b"small " * 200), GZIP)
+        large = await compressor.compress_async(ResponseType(200, {}, b"large " * 2000), GZIP)
+        return small, large
+
+    small, large = asyncio.run(run())
+    assert threads[0] is threading.main_thread() and threads[1] is not threading.main_thread()
+    assert decompress(small.body, "gzip") == b"small " * 200
+    assert decompress(large.body, "gzip") == b"large " * 2000
@@ -0,0 +1,104 @@
+import asyncio
+import socket
+from http import HTTPMethod
+
+import pytest
+
+from pycloudkit.src.engine import AsyncioEngine
+from pycloudkit.src.protocol import read_response
+from pycloudkit.src.router import Router
+from pycloudkit.src.types import FileBody, RequestHandler, ResponseType
+
+
+def serve(routes, exchange, **options):
+    """
+    Run an AsyncioEngine for the routes and call exchange with a connection to it.
+    """
+    async def run():
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        engine = AsyncioEngine("127.0.0.1", 0, Router(routes), sock=sock, shutdown_timeout=1, **options)
+        task = asyncio.create_task(engine.serve())
+        reader, writer = await asyncio.open_connection(sock=socket.create_connection(sock.getsockname()))
+        try:
+            return await asyncio.wait_for(exchange(reader, writer), 5)
+        finally:
+            writer.close()
+            engine.stop()
+            await task
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def routes(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"file body")
+
+    async def memory(request):
+        return ResponseType(200, {}, b"memory body")
+
+    async def file(request):
+        return ResponseType(200, {}, FileBody(str(path)))
+
+    async def stream(request):
+        return ResponseType(200, {}, (part for part in (b"stream ", b"body")))
+
+    async def echo(request):
+        return ResponseType(200, {}, request.body)
+
+    return [RequestHandler(memory, HTTPMethod.GET, "/memory"), RequestHandler(memory, HTTPMethod.HEAD, "/memory"),
+            RequestHandler(file, HTTPMethod.GET, "/file"), RequestHandler(file, HTTPMethod.HEAD, "/file"),
+            RequestHandler(stream, HTTPMethod.GET, "/stream"), RequestHandler(stream, HTTPMethod.HEAD, "/stream"),
+            RequestHandler(echo, HTTPMethod.POST, "/echo")]
+
+
+@pytest.mark.parametrize("path, body", [("/memory", b"memory body"), ("/file", b"file body"), ("/stream", b"stream body"), ("/x", None)])
+def test_head_then_get_on_one_connection(routes, path, body):
+    async def exchange(reader, writer):
+        writer.write(f"HEAD {path} HTTP/1.1\r\n\r\nGET {path} HTTP/1.1\r\n\r\n".encode())
+        head, head_keep_alive = await read_response(reader, "HEAD")
+        get, _ = await read_response(reader, "GET")
+        return head, head_keep_alive, get
+
+    head, keep_alive, get = serve(routes, exchange)
+    assert keep_alive and head.body == b""
+    if body is None:
+        assert head.status_code == get.status_code == 404
+    else:
+        assert head.status_code == get.status_code == 200
+        assert get.body == body
+    if "Content-Length" in get.headers:
+        assert head.headers["Content-Length"] == get.headers["Content-Length"]
+
+
+def test_head_without_a_route_is_not_allowed(routes):
+    async def exchange(reader, writer):
+        writer.write(b"HEAD /echo HTTP/1.1\r\n\r\nGET /memory HTTP/1.1\r\n\r\n")
+        return (await read_response(reader, "HEAD"))[0], (await read_response(reader, "GET"))[0]
+
+    head, get = serve(routes, exchange)
+    assert head.status_code == 405 and head.body == b""
+    assert get.status_code == 200 and get.body == b"memory body"
+
+
+def test_request_body_limit(routes):
+    async def exchange(reader, writer):
+        writer.write(b"POST /echo HTTP/1.1\r\nContent-Length: 4\r\n\r\nbody")
+        small = (await read_response(reader))[0]
+        writer.write(b"POST /echo HTTP/1.1\r\nContent-Length: 9\r\n\r\n")
+        large, keep_alive = await read_response(reader)
+        return small, large, keep_alive
+
+    small, large, keep_alive = serve(routes, exchange, max_body_size=8)
+    assert small.status_code == 200 and small.body == b"body"
+    assert large.status_code == 413 and not keep_alive
+
+
+def test_chunked_request_body_limit(routes):
+    async def exchange(reader, writer):
+        writer.write(b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nabcde\r\n5\r\nfghij\r\n0\r\n\r\n")
+        return (await read_response(reader))[0]
+
+    assert serve(routes, exchange, max_body_size=8).status_code == 413
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from pycloudkit.src.types import FileBody, RequestType
+from pycloudkit.templates.explorer.explorer import anyhandlerfile
+from pycloudkit.templates.explorer.listing import listing_etag, render_listing
+
+
+@pytest.fixture
+def root(tmp_path):
+    shared = tmp_path / "shared"
+    (shared / "sub").mkdir(parents=True)
+    for i in range(5):
+        (shared / f"file{i}.txt").write_bytes(b"x")
+    (tmp_path / "secret.txt").write_bytes(b"outside")
+    return str(shared)
+
+
+def request(page=None) -> RequestType:
+    return RequestType(status_code=200, headers={}, body=b"", path="/", params={} if page is None else {"page": page})
+
+
+def test_serves_files_and_listings(root):
+    response = anyhandlerfile("file1.txt", root, request())
+    assert response.status_code == 200 and isinstance(response.body, FileBody)
+    assert anyhandlerfile("", root, request()).status_code == 200
+    assert anyhandlerfile("sub", root, request()).status_code == 200
+    assert anyhandlerfile("missing", root, request()).status_code == 404
+
+
+@pytest.mark.parametrize("path", ["..", "../secret.txt", "sub/../../secret.txt", "/etc", "/etc/hostname"])
+def test_rejects_paths_outside_the_root(root, path):
+    assert anyhandlerfile(path, root, request()).status_code == 403
+
+
+def test_root_listing_does_not_link_above_the_root(root):
+    content = render_listing(os.path.realpath(root), os.path.realpath(root))
+    assert "redirect('..')" not in content.decode()
+
+
+def test_etag_of_out_of_range_pages(root):
+    real = os.path.realpath(root)
+    last = listing_etag(real, real, 3, 2)
+    assert listing_etag(real, real, 99, 2) == last
+    assert listing_etag(real, real, 0, 2) == listing_etag(real, real, -4, 2) == listing_etag(real, real, 1, 2)
+    assert anyhandlerfile("", root, request("99"), 2).headers["ETag"] == last
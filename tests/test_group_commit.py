@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import CloudDatabase, CloudServer
+
+
+def query(path, sql: str) -> list:
+    # Another connection only sees committed rows
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+
+def committed(path) -> dict:
+    return dict(query(path, "SELECT key, value FROM objects"))
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cloud.db")
+
+
+def test_flush_by_size(path):
+    database = CloudDatabase(path, durability="group", flush_size=3, flush_interval=60)
+    try:
+        database.set("a", 1)
+        database.set_many({"b": 2})
+        assert committed(path) == {}
+        database.delete("missing")
+        assert set(committed(path)) == {"a", "b"}
+    finally:
+        database.close()
+
+
+def test_flush_by_interval(path):
+    database = CloudDatabase(path, durability="group", flush_size=1000, flush_interval=0.05)
+    try:
+        database.set("a", 1)
+        assert wait_for(lambda: "a" in committed(path))
+    finally:
+        database.close()
+
+
+def test_flush_on_stop(path):
+    server = CloudServer("127.0.0.1", 0, path, metrics_path=None, durability="group", flush_size=1000, flush_interval=60)
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    assert wait_for(lambda: server.server is not None and server.server.server is not None)
+    server.database.set("a", 1)
+    assert committed(path) == {}
+    server.stop()
+    thread.join(5)
+    try:
+        assert "a" in committed(path)
+    finally:
+        server.async_database.close()
+        server.database.close()
+
+
+@pytest.mark.parametrize("durability", ["group", "strict"])
+def test_failed_write_leaves_nothing_behind(path, durability, monkeypatch):
+    database = CloudDatabase(path, durability=durability, flush_size=1000, flush_interval=60, changelog_size=100)
+    try:
+        database.set("kept", 1)
+        log = database._log
+
+        def fail(rows):
+            # The rows of the batch are already written when the change log fails
+            if len(rows) > 1:
+                raise sqlite3.OperationalError("disk I/O error")
+            log(rows)
+
+        monkeypatch.setattr(database, "_log", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            database.set_many({"a": 1, "b": 2})
+        database.set("after", 3)
+        database.flush()
+        assert set(committed(path)) == {"kept", "after"}
+        assert query(path, "SELECT key FROM changes ORDER BY seq") == [("kept",), ("after",)]
+        assert database.get("a", None) is None
+    finally:
+        database.close()
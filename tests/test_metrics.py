@@ -0,0 +1,128 @@
+import http.client
+import re
+import threading
+import time
+from http import HTTPMethod
+
+import pytest
+
+from pycloudkit.src.metrics import CONTENT_TYPE_PROMETHEUS, Histogram, MetricsRegistry
+from pycloudkit.src.server import AsyncServer
+from pycloudkit.src.types import ResponseType
+
+
+def start(server: AsyncServer) -> int:
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while getattr(server.server, "server", None) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server.server.server.sockets[0].getsockname()[1]
+
+
+def get(port: int, path: str):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """
+    The value of the sample with exactly these labels, in any order.
+    """
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if match is None or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        if found == labels:
+            return float(match.group(3))
+    raise KeyError(f"{name} {labels}")
+
+
+@pytest.fixture
+def port():
+    server = AsyncServer("127.0.0.1", 0)
+
+    @server.route("/objects/{key}")
+    async def objects(request):
+        return ResponseType(200, {}, request.params["key"].encode())
+
+    @server.route("/fail")
+    async def fail(request):
+        raise RuntimeError("handler failed")
+
+    port = start(server)
+    yield port
+    server.stop()
+
+
+def test_requests_are_labelled_by_route(port):
+    for key in ("a", "b", "c"):
+        assert get(port, f"/objects/{key}")[0] == 200
+    assert get(port, "/fail")[0] == 500
+    status, headers, body = get(port, "/metrics")
+    assert status == 200 and headers["Content-Type"] == CONTENT_TYPE_PROMETHEUS
+    text = body.decode()
+    assert sample(text, "pycloudkit_requests_total", method="GET", route="/objects/{key}", status="200") == 3
+    assert sample(text, "pycloudkit_requests_total", method="GET", route="/fail", status="500") == 1
+    assert sample(text, "pycloudkit_response_bytes_total", method="GET", route="/objects/{key}") == 3
+    assert sample(text, "pycloudkit_requests_in_flight", method="GET", route="/objects/{key}") == 0
+    assert "/objects/a" not in text
+
+
+def test_unmatched_requests_share_one_series(port):
+    for path in ("/missing", "/scanner/probe.php", "/objects"):
+        assert get(port, path)[0] == 404
+    text = get(port, "/metrics")[2].decode()
+    assert sample(text, "pycloudkit_requests_total", method="GET", route="<unmatched>", status="404") == 3
+    assert "probe" not in text and "/missing" not in text
+
+
+def test_latency_histogram(port):
+    for _ in range(4):
+        get(port, "/objects/a")
+    text = get(port, "/metrics")[2].decode()
+    labels = {"method": "GET", "route": "/objects/{key}"}
+    assert "# TYPE pycloudkit_request_duration_seconds histogram" in text
+    buckets = [float(value) for value in re.findall(r'pycloudkit_request_duration_seconds_bucket\{method="GET",route="/objects/\{key\}",le="[^"]+"\} (\S+)', text)]
+    assert buckets == sorted(buckets) and buckets[-1] == 4
+    assert sample(text, "pycloudkit_request_duration_seconds_bucket", le="+Inf", **labels) == 4
+    assert sample(text, "pycloudkit_request_duration_seconds_count", **labels) == 4
+    assert sample(text, "pycloudkit_request_duration_seconds_sum", **labels) > 0
+
+
+def test_metrics_can_be_disabled():
+    server = AsyncServer("127.0.0.1", 0, metrics_path=None)
+    port = start(server)
+    try:
+        assert get(port, "/metrics")[0] == 404
+    finally:
+        server.stop()
+
+
+def test_histogram_rendering():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, ("get",))
+    assert registry.histogram("latency_seconds", "Latency.", ("op",)) is histogram
+    assert registry.render().splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{op="get",le="0.1"} 2',
+        'latency_seconds_bucket{op="get",le="1"} 3',
+        'latency_seconds_bucket{op="get",le="+Inf"} 4',
+        'latency_seconds_sum{op="get"} 2.65',
+        'latency_seconds_count{op="get"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("hits_total", "Hits.", ("path",)).inc(1, ('a"b\\c\n',))
+    assert 'hits_total{path="a\\"b\\\\c\\n"} 1' in registry.render()
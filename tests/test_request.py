@@ -0,0 +1,105 @@
+import asyncio
+import http.server
+import socket
+import threading
+from http import HTTPMethod
+
+import pytest
+
+from pycloudkit.src.protocol import MAX_BODY_SIZE
+from pycloudkit.src.request import AsyncRequest, create_async_request_handler
+from pycloudkit.src.router import Router
+from pycloudkit.src.types import RequestHandler, ResponseType
+
+
+async def drop_second_request(received):
+    """
+    A server that answers the first request on each connection and closes the connection after reading the second one.
+    """
+    async def handle(reader, writer):
+        for answer in (True, False):
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            received.append(head.split(b" ")[0].decode())
+            if answer:
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def send_twice(method):
+    async def run():
+        received = []
+        server = await drop_second_request(received)
+        request = AsyncRequest("127.0.0.1", server.sockets[0].getsockname()[1], timeout=5)
+        try:
+            assert (await request.request(method, "/", b"x")).status_code == 200
+            try:
+                return (await request.request(method, "/", b"x")).status_code, received
+            except (ConnectionError, asyncio.IncompleteReadError):
+                return None, received
+        finally:
+            request._abort()
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("method", ["GET", "PUT", "DELETE"])
+def test_idempotent_requests_are_retried_on_a_fresh_connection(method):
+    assert send_twice(method) == (200, [method] * 3)
+
+
+@pytest.mark.parametrize("method", ["POST", "PATCH"])
+def test_other_requests_are_sent_once(method):
+    assert send_twice(method) == (None, [method] * 2)
+
+
+@pytest.fixture
+def http_server():
+    async def echo(request):
+        return ResponseType(200, {}, request.body)
+
+    router = Router([RequestHandler(echo, HTTPMethod.POST, "/echo"), RequestHandler(echo, HTTPMethod.GET, "/echo")])
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), create_async_request_handler(router))
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def exchange(port: int, data: bytes) -> bytes:
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as connection:
+        connection.sendall(data)
+        connection.shutdown(socket.SHUT_WR)
+        response = b""
+        while chunk := connection.recv(65536):
+            response += chunk
+        return response
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "", "1.5"])
+def test_http_server_rejects_malformed_content_length(http_server, length):
+    response = exchange(http_server, f"POST /echo HTTP/1.1\r\nContent-Length: {length}\r\n\r\nbody".encode())
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Connection: close" in response
+
+
+def test_http_server_rejects_incomplete_body(http_server):
+    response = exchange(http_server, b"POST /echo HTTP/1.1\r\nContent-Length: 10\r\n\r\nbody")
+    assert response.startswith(b"HTTP/1.1 400 ")
+
+
+def test_http_server_reads_framed_and_missing_bodies(http_server):
+    assert exchange(http_server, b"POST /echo HTTP/1.1\r\nContent-Length: 4\r\nConnection: close\r\n\r\nbody").endswith(b"\r\n\r\nbody")
+    assert exchange(http_server, b"GET /echo HTTP/1.1\r\nConnection: close\r\n\r\n").startswith(b"HTTP/1.1 200 ")
+
+
+def test_http_server_rejects_large_bodies(http_server):
+    response = exchange(http_server, f"POST /echo HTTP/1.1\r\nContent-Length: {MAX_BODY_SIZE + 1}\r\n\r\nbody".encode())
+    assert response.startswith(b"HTTP/1.1 413 ")
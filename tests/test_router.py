@@ -0,0 +1,107 @@
+import asyncio
+from http import HTTPMethod
+
+import pytest
+
+from pycloudkit.src.request import dispatch
+from pycloudkit.src.router import MethodNotAllowed, Router
+from pycloudkit.src.types import RequestHandler, ResponseType
+from pycloudkit.src.utils import encode_uri_component
+
+
+async def handle(request):
+    return None
+
+
+def router(*routes) -> Router:
+    return Router([RequestHandler(handle, method, path) for method, path in routes])
+
+
+def resolved(router: Router, method: str, path: str):
+    handler, params = router.resolve(method, path)
+    return (handler.path if handler is not None else None), params
+
+
+def test_static_and_pattern_routes():
+    routes = router((HTTPMethod.GET, "/ping"), (HTTPMethod.GET, "/objects/{key}"), (HTTPMethod.GET, "/objects/{key}/meta"))
+    assert resolved(routes, "GET", "/ping") == ("/ping", {})
+    assert resolved(routes, "GET", "/objects/a") == ("/objects/{key}", {"key": "a"})
+    assert resolved(routes, "GET", "/objects/a/meta") == ("/objects/{key}/meta", {"key": "a"})
+    assert resolved(routes, "GET", "/missing") == (None, {})
+
+
+def test_static_route_for_another_method_falls_through_to_patterns():
+    routes = router((HTTPMethod.POST, "/objects/batch"), (HTTPMethod.GET, "/objects/{key}"))
+    assert resolved(routes, "GET", "/objects/batch") == ("/objects/{key}", {"key": "batch"})
+    assert resolved(routes, "POST", "/objects/batch") == ("/objects/batch", {})
+    with pytest.raises(MethodNotAllowed) as error:
+        routes.resolve("DELETE", "/objects/batch")
+    assert error.value.allowed == ["GET", "POST"]
+
+
+def test_pattern_without_the_method_does_not_hide_another_pattern():
+    routes = router((HTTPMethod.POST, "/objects/{key}/meta"), (HTTPMethod.GET, "/objects/{key}/{field}"))
+    assert resolved(routes, "GET", "/objects/a/meta") == ("/objects/{key}/{field}", {"key": "a", "field": "meta"})
+    with pytest.raises(MethodNotAllowed) as error:
+        routes.resolve("PUT", "/objects/a/meta")
+    assert error.value.allowed == ["POST"]
+
+
+def test_fallback_before_method_not_allowed():
+    routes = router((HTTPMethod.POST, "/objects"), (HTTPMethod.GET, "any"))
+    assert resolved(routes, "GET", "/objects") == ("any", {})
+
+
+def test_rest_parameter():
+    routes = router((HTTPMethod.GET, "/f/{p:path}"))
+    assert resolved(routes, "GET", "/f/a/b.txt") == ("/f/{p:path}", {"p": "a/b.txt"})
+    assert resolved(routes, "GET", "/f/a/") == ("/f/{p:path}", {"p": "a/"})
+    assert resolved(routes, "GET", "/f/") == ("/f/{p:path}", {"p": ""})
+    assert resolved(routes, "GET", "/f") == ("/f/{p:path}", {"p": ""})
+    assert resolved(routes, "GET", "/g") == (None, {})
+
+
+def test_root_rest_parameter():
+    routes = router((HTTPMethod.GET, "/{p:path}"))
+    assert resolved(routes, "GET", "/") == ("/{p:path}", {"p": ""})
+    assert resolved(routes, "GET", "/docs/a") == ("/{p:path}", {"p": "docs/a"})
+
+
+@pytest.mark.parametrize("path", ["/f//etc/hostname", "/f/../secret", "/f/a/../../secret", "/f/a/..", "/f/..\\secret"])
+def test_rest_parameter_rejects_escaping_captures(path):
+    routes = router((HTTPMethod.GET, "/f/{p:path}"))
+    assert resolved(routes, "GET", path) == (None, {})
+
+
+def test_trailing_slashes_are_significant():
+    routes = router((HTTPMethod.GET, "/objects/{key}"), (HTTPMethod.GET, "/dirs/{key}/"))
+    assert resolved(routes, "GET", "/objects/a/") == (None, {})
+    assert resolved(routes, "GET", "/objects/") == (None, {})
+    assert resolved(routes, "GET", "/dirs/a/") == ("/dirs/{key}/", {"key": "a"})
+    assert resolved(routes, "GET", "/dirs/a") == (None, {})
+
+
+def test_segments_are_decoded_after_splitting():
+    routes = router((HTTPMethod.GET, "/objects/{key}"), (HTTPMethod.GET, "/objects/a/b"), (HTTPMethod.GET, "/a b"))
+    assert resolved(routes, "GET", "/objects/a%2Fb") == ("/objects/{key}", {"key": "a/b"})
+    assert resolved(routes, "GET", "/objects/a/b") == ("/objects/a/b", {})
+    assert resolved(routes, "GET", "/objects/%61%20b") == ("/objects/{key}", {"key": "a b"})
+    assert resolved(routes, "GET", "/a%20b") == ("/a b", {})
+    assert resolved(routes, "GET", "/objects%2Fa") == (None, {})
+
+
+@pytest.mark.parametrize("path", ["/f/%2e%2e%2fsecret", "/f/%2e%2e/secret", "/f/%2Fetc/hostname", "/f/a%2F..%2F..%2Fsecret"])
+def test_encoded_escaping_captures_are_rejected(path):
+    routes = router((HTTPMethod.GET, "/f/{p:path}"))
+    assert resolved(routes, "GET", path) == (None, {})
+
+
+def test_dispatch_routes_encoded_slashes():
+    async def echo(request):
+        return ResponseType(200, {}, f"{request.params['key']}|{request.params.get('v')}|{request.path}".encode())
+
+    routes = Router([RequestHandler(echo, HTTPMethod.GET, "/objects/{key}")])
+    target = "/objects/" + encode_uri_component("a/b c") + "?v=" + encode_uri_component("x&y")
+    response = asyncio.run(dispatch(routes, HTTPMethod.GET, target, {}, b""))
+    assert response.status_code == 200
+    assert response.body == b"a/b c|x&y|/objects/a/b c"
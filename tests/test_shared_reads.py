@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import AsyncCloudDatabase, CloudDatabase, CloudServer
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cloud.db")
+
+
+def workers(path, count: int, **options):
+    """
+    Databases opened like the connections of count CloudServer workers on one file.
+    """
+    databases = [CloudDatabase(path, shared=True, **options) for _ in range(count)]
+    return databases, [AsyncCloudDatabase(database, readers=2) for database in databases]
+
+
+def close(databases, async_databases):
+    for async_database in async_databases:
+        async_database.close()
+    for database in databases:
+        database.close()
+
+
+def test_workers_do_not_build_a_cache(path):
+    server = CloudServer("127.0.0.1", 0, path, workers=2, metrics_path=None)
+    try:
+        assert server.database.shared and server.database.cache.max_bytes == 0
+    finally:
+        server.async_database.close()
+        server.database.close()
+
+
+@pytest.mark.parametrize("durability", ["strict", "group"])
+def test_read_your_writes(path, durability):
+    databases, async_databases = workers(path, 1, durability=durability, flush_interval=60)
+    database = async_databases[0]
+
+    async def run():
+        values = []
+        for i in range(20):
+            await database.set("k", [i])
+            values.append(await database.get("k"))
+            await database.set_many({"k": [i, i]})
+            values.append((await database.get_many(["k"]))["k"])
+        await database.delete("k")
+        values.append(await database.get("k", None))
+        return values
+
+    try:
+        expected = [value for i in range(20) for value in ([i], [i, i])] + [None]
+        assert asyncio.run(run()) == expected
+    finally:
+        close(databases, async_databases)
+
+
+def test_reads_see_the_commits_of_other_workers(path):
+    # The default cache, readers must not fill it or read from it
+    databases, (first, second) = workers(path, 2)
+
+    async def run():
+        results = []
+        for i in range(20):
+            await first.set("k", i)
+            # Readers run concurrently on both workers
+            values = await asyncio.gather(*[database.get("k") for database in (first, second) for _ in range(4)])
+            results.append(set(values) == {i})
+            await second.set("k", -i)
+            results.append(await first.get("k") == -i)
+        return results
+
+    try:
+        assert all(asyncio.run(run()))
+    finally:
+        close(databases, [first, second])
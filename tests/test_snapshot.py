@@ -0,0 +1,79 @@
+import struct
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import CloudDatabase
+from pycloudkit.cloud.src.snapshot import SnapshotError, SnapshotReader, SnapshotWriter
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / "data.snap")
+    with SnapshotWriter(path) as writer:
+        writer.write("alpha", b"\x00", None)
+        writer.write("beta", "'text'", None)
+    return path
+
+
+def corrupt(path: str, offset: int, data: bytes) -> None:
+    with open(path, "r+b") as file:
+        file.seek(offset)
+        file.write(data)
+
+
+def record_offset(path: str, index: int) -> int:
+    with SnapshotReader(path) as reader:
+        return reader._offset(index)
+
+
+def test_roundtrip_through_a_database(tmp_path):
+    source = CloudDatabase(str(tmp_path / "a.db"))
+    source.set_many({"a": [1, 2], "b": {"c": "d"}, "é": "text"})
+    path = str(tmp_path / "a.snap")
+    assert source.export_snapshot(path) == 3
+    with SnapshotReader(path) as reader:
+        assert list(reader.items()) == [("a", [1, 2]), ("b", {"c": "d"}), ("é", "text")]
+        assert reader.get("b") == {"c": "d"} and "a" in reader and "z" not in reader
+    target = CloudDatabase(str(tmp_path / "b.db"))
+    assert target.import_snapshot(path) == 3
+    assert target.get_many(["a", "b", "é"]) == {"a": [1, 2], "b": {"c": "d"}, "é": "text"}
+    source.close()
+    target.close()
+
+
+def test_invalid_utf8_key_raises_snapshot_error(snapshot):
+    # The first byte of the key "alpha"
+    corrupt(snapshot, record_offset(snapshot, 0) + struct.calcsize("<BIId"), b"\xff")
+    with SnapshotReader(snapshot) as reader:
+        with pytest.raises(SnapshotError):
+            list(reader.records())
+
+
+def test_invalid_utf8_text_value_raises_snapshot_error(snapshot):
+    corrupt(snapshot, record_offset(snapshot, 1) + struct.calcsize("<BIId") + len("beta"), b"\xff")
+    with SnapshotReader(snapshot) as reader:
+        with pytest.raises(SnapshotError):
+            reader.get("beta")
+
+
+def test_record_lengths_past_the_records_raise_snapshot_error(snapshot):
+    corrupt(snapshot, record_offset(snapshot, 0) + 1, struct.pack("<I", 1 << 30))
+    with SnapshotReader(snapshot) as reader:
+        with pytest.raises(SnapshotError):
+            reader.get("alpha")
+
+
+def test_offsets_outside_the_file_raise_snapshot_error(snapshot):
+    with SnapshotReader(snapshot) as reader:
+        index_offset = reader.index_offset
+    corrupt(snapshot, index_offset, struct.pack("<Q", 1 << 40))
+    with SnapshotReader(snapshot) as reader:
+        with pytest.raises(SnapshotError):
+            list(reader.records())
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "bad.snap"
+    path.write_bytes(b"x" * 100)
+    with pytest.raises(SnapshotError):
+        SnapshotReader(str(path))
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from pycloudkit.src.filemanager import PathOutsideRootError, saferealpath
+from pycloudkit.src.static import serve_file_from
+from pycloudkit.src.types import FileBody
+
+
+@pytest.fixture
+def root(tmp_path):
+    public = tmp_path / "public"
+    (public / "docs").mkdir(parents=True)
+    (public / "docs" / "a.txt").write_bytes(b"inside")
+    (tmp_path / "secret.txt").write_bytes(b"outside")
+    return str(public)
+
+
+def test_serves_files_under_the_root(root):
+    response = serve_file_from(root, "docs/a.txt")
+    assert response.status_code == 200
+    assert isinstance(response.body, FileBody)
+    assert response.body.path == os.path.join(os.path.realpath(root), "docs", "a.txt")
+
+
+@pytest.mark.parametrize("path", ["../secret.txt", "docs/../../secret.txt", "/etc/hostname", "../../../../etc/hostname"])
+def test_rejects_paths_outside_the_root(root, path):
+    assert serve_file_from(root, path).status_code == 403
+    with pytest.raises(PathOutsideRootError):
+        saferealpath(path, root)
+
+
+def test_rejects_symbolic_links_out_of_the_root(root):
+    os.symlink(os.path.join(root, "..", "secret.txt"), os.path.join(root, "link.txt"))
+    assert serve_file_from(root, "link.txt").status_code == 403
+
+
+@pytest.mark.parametrize("path", ["missing.txt", "docs", "docs/a.txt/x", ""])
+def test_missing_files_and_directories(root, path):
+    assert serve_file_from(root, path).status_code == 404
+
+
+def test_root_prefix_is_not_containment(root):
+    # A sibling whose name starts with the root's name is still outside
+    os.mkdir(root + "2")
+    with open(os.path.join(root + "2", "b.txt"), "wb") as file:
+        file.write(b"sibling")
+    assert serve_file_from(root, "../public2/b.txt").status_code == 403
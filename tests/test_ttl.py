@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import CloudDatabase
+from pycloudkit.src.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def metrics():
+    return MetricsRegistry()
+
+
+@pytest.fixture
+def database(tmp_path, metrics):
+    database = CloudDatabase(str(tmp_path / "cloud.db"), metrics=metrics, sweep_interval=0.05)
+    yield database
+    database.close()
+
+
+def rows(database: CloudDatabase) -> list:
+    return [row[0] for row in database.database.execute("SELECT key FROM objects ORDER BY key")]
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_expired_keys_are_hidden_before_they_are_swept(database, monkeypatch, cached):
+    # Keep the sweeper from running
+    monkeypatch.setattr(database, "_schedule", lambda expires_at: None)
+    database.set("a", 1, ttl=0.05)
+    database.set_many({"b": 2, "c": 3}, ttl=0.05)
+    database.set("kept", 4)
+    if not cached:
+        database.cache.clear()
+    time.sleep(0.1)
+    assert not database.exists("a")
+    assert database.scan() == ([("kept", 4)], None)
+    assert database.scan(keys_only=True) == (["kept"], None)
+    assert rows(database) == ["a", "b", "c", "kept"]
+    assert database.get("a", None) is None
+    assert database.get_many(["b", "kept"]) == {"kept": 4}
+    assert rows(database) == ["c", "kept"]
+    assert database.expired == {"sweep": 0, "read": 2}
+    assert database.sweep() is None
+    assert rows(database) == ["kept"]
+    assert database.expired == {"sweep": 1, "read": 2}
+
+
+def test_sweeper_removes_expired_keys(database):
+    database.set("a", 1, ttl=0.05)
+    database.set("b", 2, ttl=60)
+    deadline = time.monotonic() + 5
+    while rows(database) != ["b"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert rows(database) == ["b"]
+    assert database.expired["sweep"] == 1
+
+
+def test_setting_a_key_again_removes_its_ttl(database):
+    database.set("a", 1, ttl=0.05)
+    database.set("a", 2)
+    time.sleep(0.1)
+    assert database.sweep() is None
+    assert database.get("a") == 2
+
+
+def test_expired_keys_counters_by_reason(database, metrics, monkeypatch):
+    monkeypatch.setattr(database, "_schedule", lambda expires_at: None)
+    database.set_many({"a": 1, "b": 2, "c": 3}, ttl=0.05)
+    time.sleep(0.1)
+    database.get("a", None)
+    database.sweep()
+    text = metrics.render()
+    assert 'pycloudkit_expired_keys_total{reason="read"} 1' in text
+    assert 'pycloudkit_expired_keys_total{reason="sweep"} 2' in text
+
+
+@pytest.mark.parametrize("ttl", [0, -1, "1", True])
+def test_invalid_ttl(database, ttl):
+    with pytest.raises(ValueError):
+        database.set("a", 1, ttl=ttl)
@@ -0,0 +1,103 @@
+import random
+import urllib.parse
+
+import pytest
+
+from pycloudkit.src.utils import (
+    QueryParams, decode_uri_component, encode_path, encode_query, encode_target, encode_uri_component,
+    parse_path, parse_query_string,
+)
+
+FUZZ_ALPHABET = "aZ09 -._~!*'();:@&=+$,/?#[]%\"{}<>\\^`|\n\x00é€😀"
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randrange(length)))
+
+
+@pytest.mark.parametrize("value", ["", "plain", "a b", "a+b", "100%", "a/b?c=d&e", "clé € 😀", "\x00\n", "\\x41"])
+def test_component_roundtrip(value):
+    encoded = encode_uri_component(value)
+    assert encoded == urllib.parse.quote(value, safe="~")
+    assert decode_uri_component(encoded) == value
+    assert decode_uri_component(encoded, plus=True) == value
+
+
+def test_component_fuzz():
+    rng = random.Random(0)
+    for _ in range(5000):
+        value = random_text(rng, 24)
+        encoded = encode_uri_component(value)
+        assert encoded == urllib.parse.quote(value, safe="~"), value
+        assert decode_uri_component(encoded) == value, value
+        assert decode_uri_component(value) == urllib.parse.unquote(value), value
+        assert decode_uri_component(value, plus=True) == urllib.parse.unquote_plus(value), value
+        assert encode_path(value) == urllib.parse.quote(value, safe="/~"), value
+        assert encode_target(encode_target(value)) == encode_target(value), value
+
+
+@pytest.mark.parametrize("value, decoded", [
+    ("%", "%"),
+    ("%4", "%4"),
+    ("%zz", "%zz"),
+    ("a%2", "a%2"),
+    ("%%41", "%A"),
+    ("%41%g1%42", "A%g1B"),
+    ("%e2%82%ac", "€"),
+    ("%FF", "�"),
+    ("\\%41", "\\A"),
+])
+def test_malformed_escapes(value, decoded):
+    assert decode_uri_component(value) == decoded
+    assert decode_uri_component(value) == urllib.parse.unquote(value)
+
+
+def test_plus_is_a_space_in_queries_only():
+    assert decode_uri_component("a+b") == "a+b"
+    assert decode_uri_component("a+b", plus=True) == "a b"
+    assert encode_target("/get?key=a b+c") == "/get?key=a%20b%2Bc"
+
+
+def test_parse_query_string():
+    params = parse_query_string("a=1&b=x=y&c&&a=2&d=%zz&e=%E2%82%AC+%2B&=empty")
+    assert params == {"a": "2", "b": "x=y", "c": "", "d": "%zz", "e": "€ +", "": "empty"}
+    assert params.get_all("a") == ["1", "2"]
+    assert params.get_all("c") == [""]
+    assert params.get_all("missing") == []
+
+
+def test_query_params_update_replaces_all_values():
+    params = parse_query_string("a=1&a=2")
+    params.update({"a": "3"})
+    assert params.get_all("a") == ["3"]
+    del params["a"]
+    assert params.get_all("a") == []
+    params = QueryParams([("t", "x"), ("t", "y"), ("u", "z")])
+    assert sorted(params.pairs()) == [("t", "x"), ("t", "y"), ("u", "z")]
+
+
+def test_query_fuzz_roundtrip():
+    rng = random.Random(1)
+    for _ in range(2000):
+        pairs = [(random_text(rng, 8), random_text(rng, 8)) for _ in range(rng.randrange(1, 5))]
+        query = encode_query(pairs)
+        assert sorted(parse_query_string(query).pairs()) == sorted(pairs), pairs
+        assert urllib.parse.parse_qsl(query, keep_blank_values=True) == pairs
+
+
+def test_encode_query_values():
+    assert encode_query({"l": [1, "two"], "b": True, "s": "a&b=c"}) == "l=1&l=two&b=True&s=a%26b%3Dc"
+    assert parse_query_string(encode_query(parse_query_string("t=1&t=2&u=3"))).get_all("t") == ["1", "2"]
+
+
+def test_parse_path():
+    assert parse_path("/x%20y/z?k=v?w&k2=%3D") == ("/x%20y/z", {"k": "v?w", "k2": "="})
+    assert parse_path("/plain") == ("/plain", {})
+    assert parse_path("/a?") == ("/a", {})
+
+
+def test_parse_path_keeps_encoded_slashes():
+    path, _ = parse_path("/objects/" + encode_uri_component("a/b") + "?x=%2F")
+    assert path == "/objects/a%2Fb"
+    assert parse_path("/files/%2e%2e%2fetc")[0] == "/files/%2e%2e%2fetc"
+    assert parse_query_string("x=%2F") == {"x": "/"}
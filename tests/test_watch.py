@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from pycloudkit.cloud.src.cloud import ChangeLogTrimmed, CloudClient, CloudDatabase, CloudError, CloudServer
+from pycloudkit.src.request import AsyncRequest
+
+
+def serve(path, **options):
+    server = CloudServer("127.0.0.1", 0, path, metrics_path=None, **options)
+    server.watch_heartbeat = 0.05
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while getattr(server.server, "server", None) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server, thread, server.server.server.sockets[0].getsockname()[1]
+
+
+@pytest.fixture
+def cloud(tmp_path):
+    server, thread, port = serve(str(tmp_path / "cloud.db"), changelog_size=10)
+    yield server, port
+    server.stop()
+    thread.join(5)
+    server.async_database.close()
+    server.database.close()
+
+
+def collect(port, count, **options):
+    async def run():
+        changes = []
+        async with CloudClient("127.0.0.1", port) as client:
+            async for change in client.watch(**options):
+                changes.append(change)
+                if len(changes) == count:
+                    return changes
+
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def stream(port, target, headers, until: bytes):
+    """
+    A streamed GET response read until it contains until.
+    """
+    async def run():
+        connection = AsyncRequest("127.0.0.1", port, 5)
+        try:
+            response = await connection.stream("GET", target, b"", headers)
+            data = b""
+            async for chunk in response.body:
+                data += chunk
+                if until in data:
+                    return response.status_code, data
+            return response.status_code, data
+        finally:
+            connection._abort()
+
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_change_log_is_off_by_default(tmp_path):
+    server = CloudServer("127.0.0.1", 0, str(tmp_path / "cloud.db"), metrics_path=None)
+    try:
+        assert server.database.changelog_size == 0
+        server.database.set("a", 1)
+        assert server.database.database.execute("SELECT COUNT(*) FROM changes").fetchone() == (0,)
+    finally:
+        server.async_database.close()
+        server.database.close()
+
+
+def test_watch_without_change_log_is_rejected(tmp_path):
+    server, thread, port = serve(str(tmp_path / "cloud.db"))
+    try:
+        with pytest.raises(CloudError) as error:
+            collect(port, 1)
+        assert error.value.status_code == 400
+    finally:
+        server.stop()
+        thread.join(5)
+        server.async_database.close()
+        server.database.close()
+
+
+def test_watch_resumes_after_since(cloud):
+    server, port = cloud
+    server.database.set("a", 1)
+    since = server.database.last_change()
+    server.database.set("b", 2)
+    server.database.delete("a")
+    changes = collect(port, 2, since=since)
+    assert [(change.op, change.key, change.value) for change in changes] == [("set", "b", 2), ("delete", "a", None)]
+    assert changes[0].seq == since + 1
+
+
+def test_watch_from_a_trimmed_change_is_gone(cloud):
+    server, port = cloud
+    for i in range(30):
+        server.database.set(f"k{i}", i)
+    with pytest.raises(ChangeLogTrimmed):
+        server.database.changes(1)
+    with pytest.raises(CloudError) as error:
+        collect(port, 1, since=1)
+    assert error.value.status_code == 410
+
+
+def test_event_stream_resumes_with_last_event_id(cloud):
+    server, port = cloud
+    server.database.set("a", 1)
+    last = server.database.last_change()
+    server.database.set("b", 2)
+    status, data = stream(port, "/watch", {"Accept": "text/event-stream", "Last-Event-ID": str(last)}, b"}\n\n")
+    assert status == 200
+    events = [event for event in data.decode().split("\n\n") if "data:" in event]
+    lines = events[0].split("\n")
+    assert lines[0] == f"id: {last + 1}"
+    assert json.loads(lines[1][len("data: "):]) == {"seq": last + 1, "op": "set", "key": "b", "value": 2}
@@ -0,0 +1,52 @@
+import pytest
+
+from pycloudkit.cloud.src.codec import CodecError, register_class, registered_class
+from pycloudkit.cloud.src.wire import json_wire
+
+
+class Point:
+    def __init__(self, x: int, y: int) -> None:
+        self.x = x
+        self.y = y
+
+
+class Unregistered:
+    pass
+
+
+register_class(Point, "tests.Point")
+
+
+def test_registered_class():
+    assert registered_class(Point).name == "tests.Point"
+    assert registered_class(Unregistered) is None
+
+
+def test_json_wire_roundtrips_registered_classes():
+    point = json_wire.loads(json_wire.dumps({"p": Point(1, 2), "t": (1, b"x")}))
+    assert type(point["p"]) is Point and vars(point["p"]) == {"x": 1, "y": 2}
+    assert point["t"] == (1, b"x")
+
+
+def test_json_wire_rejects_unregistered_classes():
+    with pytest.raises(CodecError):
+        json_wire.dumps(Unregistered())
+
+
+@pytest.mark.parametrize("data", [
+    b'{"key": {"$dict": [[[1], 2]]}}',
+    b'{"$dict": [1]}',
+    b'{"$dict": 5}',
+    b'{"$tuple": 5}',
+    b'{"$bytes": 5}',
+    b'{"$bytes": "***"}',
+    b'{"$object": []}',
+    b'{"$object": [["tests.Point"], {}]}',
+    b'{"$object": ["tests.Point", 5]}',
+    b'{"$object": ["missing.Class", {}]}',
+    b"[" * 100000,
+    b"not json",
+])
+def test_json_wire_rejects_malformed_messages(data):
+    with pytest.raises(ValueError):
+        json_wire.loads(data)
@@ -0,0 +1,97 @@
+import asyncio
+import http.client
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from pycloudkit.src import workers
+from pycloudkit.src.server import AsyncServer
+from pycloudkit.src.types import ResponseType
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="worker processes require os.fork")
+
+
+def get(port: int, path: str):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture
+def served(monkeypatch):
+    monkeypatch.setattr(workers, "RESTART_DELAY", 0.05)
+    server = AsyncServer("127.0.0.1", 0, workers=2, shutdown_timeout=5.0)
+
+    @server.route("/pid")
+    async def pid(request):
+        return ResponseType(200, {}, str(os.getpid()).encode())
+
+    @server.route("/slow")
+    async def slow(request):
+        await asyncio.sleep(0.3)
+        return ResponseType(200, {}, b"done")
+
+    thread = threading.Thread(target=server.start, daemon=True)
+    thread.start()
+    wait_for(lambda: getattr(server.server, "sock", None) is not None and len(server.server.pids) == 2)
+    port = server.server.sock.getsockname()[1]
+    yield server, port
+    server.stop()
+    thread.join(10)
+
+
+def test_requests_are_served_by_workers(served):
+    server, port = served
+    pids = set(server.server.pids)
+    for _ in range(10):
+        status, body = get(port, "/pid")
+        assert status == 200
+        assert int(body) in pids and int(body) != os.getpid()
+
+
+def test_killed_worker_is_restarted(served):
+    server, port = served
+    victim = next(iter(server.server.pids))
+    os.kill(victim, signal.SIGKILL)
+    wait_for(lambda: victim not in server.server.pids and len(server.server.pids) == 2)
+    replacement = set(server.server.pids)
+    assert victim not in replacement
+    for _ in range(10):
+        assert int(get(port, "/pid")[1]) in replacement
+
+
+def test_stop_finishes_requests_and_reaps_workers(served):
+    server, port = served
+    pids = list(server.server.pids)
+    results = []
+    request = threading.Thread(target=lambda: results.append(get(port, "/slow")))
+    request.start()
+    time.sleep(0.1)
+    server.stop(timeout=10)
+    request.join(5)
+    assert results == [(200, b"done")]
+    assert server.stopped.is_set()
+    assert server.server.pids == {}
+    assert not any(alive(pid) for pid in pids)